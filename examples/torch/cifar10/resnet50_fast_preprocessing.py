@@ -7,7 +7,7 @@ from torch.utils.data import DataLoader
 from tatau_core.nn.tatau.dataset import NumpyChunkedDataset
 from tatau_core.nn.torch import model
 from tatau_core.nn.torch.models.resnet import ResNet50
-from tatau_core.nn.torch.utils.fast_preprocessing import fast_collate, DataPrefetcher
+from tatau_core.nn.torch.utils.fast_preprocessing import fast_collate, create_prefetcher
 
 
 class Model(model.Model):
@@ -42,6 +42,6 @@ class Model(model.Model):
                     shuffle=True,
                     pin_memory=False,
                     collate_fn=fast_collate)
-        return DataPrefetcher(data_loader,
-                              normalize_mean=[0.4914 * 255, 0.4822 * 255, 0.4465 * 255],
-                              normalize_std=[0.2023 * 255, 0.1994 * 255, 0.2010 * 255])
+        return create_prefetcher(data_loader,
+                                 normalize_mean=[0.4914 * 255, 0.4822 * 255, 0.4465 * 255],
+                                 normalize_std=[0.2023 * 255, 0.1994 * 255, 0.2010 * 255])
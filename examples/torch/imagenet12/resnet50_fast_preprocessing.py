@@ -6,11 +6,11 @@ import torch.optim as optim
 from torch.nn import Module, Linear, Parameter, CrossEntropyLoss
 from torch.utils.data import DataLoader, ConcatDataset
 from torchvision import transforms
-from torchvision.datasets.folder import ImageFolder
 from torchvision.models.resnet import resnet50, BasicBlock, Bottleneck
 
+from tatau_core.nn.tatau.dataset import CachedImageFolder
 from tatau_core.nn.torch import model
-from tatau_core.nn.torch.utils.fast_preprocessing import fast_collate, DataPrefetcher
+from tatau_core.nn.torch.utils.fast_preprocessing import fast_collate, create_prefetcher
 
 logger = getLogger('tatau_core')
 
@@ -67,13 +67,15 @@ class Model(model.Model):
 
     def data_preprocessing(self, chunk_dirs: Iterable, batch_size, transform: callable) -> Iterable:
         data_loader = DataLoader(
-            dataset=ConcatDataset([ImageFolder(root=chunk_dir, transform=transform) for chunk_dir in chunk_dirs]),
+            # images are decoded once and cached resized to 256 short side
+            dataset=ConcatDataset([
+                CachedImageFolder(root=chunk_dir, transform=transform, decoded_size=256) for chunk_dir in chunk_dirs]),
             batch_size=batch_size,
             shuffle=True,
             pin_memory=False,
             num_workers=10,
             collate_fn=fast_collate)
-        return DataPrefetcher(data_loader,
-                              normalize_mean=[0.485 * 255, 0.456 * 255, 0.406 * 255],
-                              normalize_std=[0.229 * 255, 0.224 * 255, 0.225 * 255]
-                              )
+        return create_prefetcher(data_loader,
+                                 normalize_mean=[0.485 * 255, 0.456 * 255, 0.406 * 255],
+                                 normalize_std=[0.229 * 255, 0.224 * 255, 0.225 * 255]
+                                 )
@@ -1,4 +1,6 @@
 import argparse
+import json
+import logging
 import os
 import shutil
 import tempfile
@@ -10,7 +12,9 @@ import glob
 from producer import load_producer
 from tatau_core import settings
 from tatau_core.contract import NodeContractInfo, poa_wrapper
+from tatau_core.db import TransactionListener
 from tatau_core.models import TaskDeclaration, TrainModel, Dataset
+from tatau_core.models.progress import ProgressSnapshot
 from tatau_core.nn.tatau.model import Model, TrainProgress
 from tatau_core.utils.ipfs import IPFS
 from tatau_core.utils.logging import configure_logging
@@ -136,8 +140,10 @@ def white(text, on_color=None, attrs=None):
 
 
 def print_task_declaration(task_declaration):
-    data = task_declaration.progress_info
+    print_progress_info(task_declaration.progress_info)
 
+
+def print_progress_info(data):
     logger.info('\n\n\n\n\n')
 
     logger.info('-------------------------------------------------------------------------------------------')
@@ -197,8 +203,8 @@ def print_task_declaration(task_declaration):
             iteration += 1
 
     logger.info('-------------------------------------------------------------------------------------------')
-    if task_declaration.state == TaskDeclaration.State.COMPLETED:
-        logger.info('Result: {}'.format(yellow(task_declaration.weights_ipfs)))
+    if data['state'] == TaskDeclaration.State.COMPLETED:
+        logger.info('Result: {}'.format(yellow(data['weights_ipfs'])))
 
 
 def monitor_task(asset_id, producer):
@@ -214,6 +220,58 @@ def monitor_task(asset_id, producer):
             break
 
 
+class TaskWatcher(TransactionListener):
+    """
+    Keeps progress of task declarations in memory and updates it by transactions from valid transactions stream
+    """
+    def __init__(self, task_ids, producer, json_lines=False):
+        self.producer = producer
+        self.json_lines = json_lines
+        self.task_declarations = {}
+        self.snapshots = {}
+
+        for asset_id in task_ids:
+            self._update_task_declaration(asset_id)
+
+    def _update_task_declaration(self, asset_id):
+        task_declaration = TaskDeclaration.get(asset_id, db=self.producer.db, encryption=self.producer.encryption)
+        self.task_declarations[asset_id] = task_declaration
+
+        try:
+            snapshot = self.snapshots[asset_id]
+        except KeyError:
+            snapshot = self.snapshots[asset_id] = ProgressSnapshot.load(asset_id)
+
+        # new assignments become visible only after change of task declaration
+        snapshot.update(task_declaration)
+        self._print(asset_id)
+
+    def _print(self, asset_id):
+        data = self.task_declarations[asset_id].get_progress_info(snapshot=self.snapshots[asset_id])
+        if self.json_lines:
+            print(json.dumps(data, default=str), flush=True)
+        else:
+            print_progress_info(data)
+
+    def _process_tx(self, data):
+        asset_id = data['asset_id']
+        if asset_id in self.task_declarations:
+            self._update_task_declaration(asset_id)
+            return
+
+        for task_declaration_id, snapshot in self.snapshots.items():
+            task_declaration = self.task_declarations[task_declaration_id]
+            if snapshot.update_result(asset_id, db=task_declaration.db, encryption=task_declaration.encryption):
+                self._print(task_declaration_id)
+                return
+
+    def watch(self):
+        while True:
+            self.run_transaction_listener()
+            logger.info('Reconnect to transactions stream')
+            time.sleep(1)
+
+
 def load_wallet_credentials(account_address_var_name):
     address = os.getenv(account_address_var_name)
     if address is None:
@@ -233,7 +291,7 @@ def load_wallet_credentials(account_address_var_name):
 def main():
     parser = argparse.ArgumentParser(description='Produce Task')
 
-    parser.add_argument('-c', '--command', required=True, metavar='KEY', help='add|stop|cancel|issue|deposit|monitor')
+    parser.add_argument('-c', '--command', required=True, metavar='KEY', help='add|stop|cancel|issue|deposit|monitor|watch')
     parser.add_argument('-k', '--key', default="producer", metavar='KEY', help='RSA key name')
     parser.add_argument('-n', '--name', default='mnist_mlp', metavar='NAME', help='model name')
     parser.add_argument('-p', '--path', default='examples/torch/mnist/cnn.py', metavar='PATH', help='model path')
@@ -245,7 +303,9 @@ def main():
     parser.add_argument('-e', '--epochs', default=3, type=int, metavar='EPOCHS', help='epochs')
     parser.add_argument('-ei', '--epochs_in_iteration', default=1, type=int, metavar='EPOCHS IN ITERATION', help='epochs in iteration')
     parser.add_argument('-l', '--local', default=0, type=int, metavar='LOCAL', help='train model local')
-    parser.add_argument('-t', '--task', default=None, type=str, metavar='TASK_ID', help='task declaration asset id')
+    parser.add_argument('-t', '--task', default=None, type=str, metavar='TASK_ID',
+                        help='task declaration asset id, comma separated list of ids for watch')
+    parser.add_argument('-j', '--json', default=0, type=int, metavar='JSON', help='print json lines for watch')
     parser.add_argument('-eth', '--eth', default=None, type=float, metavar='ETH', help='ETH for deposit or issue')
 
     args = parser.parse_args()
@@ -286,6 +346,13 @@ def main():
         monitor_task(args.task, producer)
         return
 
+    if args.command == 'watch':
+        if args.json:
+            # keep stdout machine-readable
+            logging.disable(logging.INFO)
+        TaskWatcher(task_ids=args.task.split(','), producer=producer, json_lines=args.json).watch()
+        return
+
     if args.command == 'issue':
         if not args.eth:
             print('balance is not specified, arg: --eth')
@@ -3,6 +3,8 @@ from web3.personal import Personal
 from tatau_core import web3
 from .abi import abi
 from .contract import Contract
+from .reader import ContractReader
+from .transactions import NonceManager
 
 
 class NodeContractInfo:
@@ -11,6 +13,8 @@ class NodeContractInfo:
     _account = None
     _personal = None
     _contract = Contract()
+    _reader = ContractReader(_contract)
+    _nonce_manager = NonceManager()
 
     @classmethod
     def configure(cls, encrypted_key, password):
@@ -33,6 +37,18 @@ class NodeContractInfo:
     def get_contract(cls):
         return cls._contract
 
+    @classmethod
+    def get_reader(cls):
+        return cls._reader
+
+    @classmethod
+    def next_nonce(cls):
+        return cls._nonce_manager.next_nonce(cls._account.address)
+
+    @classmethod
+    def reset_nonce(cls):
+        cls._nonce_manager.reset()
+
     @classmethod
     def get_account_address(cls):
         return cls._account.address
@@ -5,6 +5,7 @@ from web3.contract import ImplicitContract
 
 from tatau_core import settings, web3
 from .abi import abi
+from .transactions import TransactionConfirmer
 
 
 class Contract:
@@ -48,40 +49,58 @@ class Contract:
         :param timeout: timeout seconds
         :return: receipt
         """
-        spent_time = 0
-        while spent_time < timeout:
-            receipt = web3.eth.waitForTransactionReceipt(tx_hash)
-            if len(receipt.logs) and receipt.logs[0].type == 'mined':
-                return receipt
-            time.sleep(1)
-            spent_time += 1
-        raise TimeoutError("Transaction timed out {}".format(receipt))
+        return TransactionConfirmer().wait(tx_hash, timeout=timeout)
+
+    @classmethod
+    def _transact_params(cls, value=None, nonce=None):
+        params = {}
+        if value is not None:
+            params['value'] = value
+        if nonce is not None:
+            params['nonce'] = nonce
+        return params
 
     @classmethod
     def _asset_id_2_job_id(cls, asset_id: str):
         return hashlib.sha256(asset_id.encode()).digest()
 
-    def issue_job(self, task_declaration_id: str, value: int):
+    @property
+    def address(self):
+        return self._ccontract.address
+
+    def encode_call(self, fn_name: str, task_declaration_id: str):
+        """
+        Encode call of contract method which takes job id as single argument
+        :param fn_name: contract method name
+        :param task_declaration_id: task declaration id
+        :return: hex encoded transaction data
+        """
+        _id = self._asset_id_2_job_id(task_declaration_id)
+        return self._ccontract.encodeABI(fn_name=fn_name, args=[_id])
+
+    def issue_job(self, task_declaration_id: str, value: int, nonce=None):
         """
         Issue Job
         :param task_declaration_id: task declaration asset id
         :param value: deposit amount
+        :param nonce: nonce of transaction, if None it will be taken from node
         :return: job id
         """
         _id = self._asset_id_2_job_id(task_declaration_id)
-        tx_hash = self._icontract.issueJob(_id, transact={'value': value})
+        tx_hash = self._icontract.issueJob(_id, transact=self._transact_params(value=value, nonce=nonce))
         self._wait_for_transaction_mined(tx_hash=tx_hash)
         return _id
 
-    def deposit(self, task_declaration_id: str, value: int):
+    def deposit(self, task_declaration_id: str, value: int, nonce=None):
         """
         Deposit Job
         :param task_declaration_id: task declaration id
         :param value: amount to deposit
+        :param nonce: nonce of transaction, if None it will be taken from node
         :return: receipt
         """
         _id = self._asset_id_2_job_id(task_declaration_id)
-        tx_hash = self._icontract.deposit(_id, transact={'value': value})
+        tx_hash = self._icontract.deposit(_id, transact=self._transact_params(value=value, nonce=nonce))
         return self._wait_for_transaction_mined(tx_hash=tx_hash)
 
     def get_job_balance(self, task_declaration_id: str):
@@ -106,25 +125,36 @@ class Contract:
         tx_hash = self._icontract.distribute(_id, workers, amounts)
         return self._wait_for_transaction_mined(tx_hash=tx_hash)
 
-    def distribute_async(self, task_declaration_id: str, workers: list, amounts: list):
+    def distribute_async(self, task_declaration_id: str, workers: list, amounts: list, nonce=None):
         """
         Payout workers
         :role: validator
         :param task_declaration_id: task declaration id
         :param workers: workers address list
         :param amounts: amounts list for each worker
+        :param nonce: nonce of transaction, if None it will be taken from node
         :return: tx_hash
         """
         _id = self._asset_id_2_job_id(task_declaration_id)
-        return self._icontract.distribute(_id, workers, amounts)
+        return self._icontract.distribute(_id, workers, amounts, transact=self._transact_params(nonce=nonce))
 
     def wait_for_transaction_mined(self, tx_hash):
         return self._wait_for_transaction_mined(tx_hash=tx_hash)
 
+    @classmethod
+    def watch_transaction(cls, tx_hash, timeout=120):
+        """
+        Watch transaction without blocking
+        :param tx_hash: transaction hash
+        :param timeout: timeout seconds
+        :return: future which result is receipt
+        """
+        return TransactionConfirmer().watch(tx_hash, timeout=timeout)
+
     @classmethod
     def is_transaction_mined(cls, tx_hash):
-        receipt = web3.eth.waitForTransactionReceipt(tx_hash)
-        if len(receipt.logs) and receipt.logs[0].type == 'mined':
+        receipt = web3.eth.getTransactionReceipt(tx_hash)
+        if receipt is not None and len(receipt.logs) and receipt.logs[0].type == 'mined':
             return True
         return False
 
@@ -139,6 +169,17 @@ class Contract:
         tx_hash = self._icontract.finishJob(_id)
         return self._wait_for_transaction_mined(tx_hash=tx_hash)
 
+    def finish_job_async(self, task_declaration_id: str, nonce=None):
+        """
+        Finish Job
+        :role: validator
+        :param task_declaration_id: task declaration id
+        :param nonce: nonce of transaction, if None it will be taken from node
+        :return: tx_hash
+        """
+        _id = self._asset_id_2_job_id(task_declaration_id)
+        return self._icontract.finishJob(_id, transact=self._transact_params(nonce=nonce))
+
     def does_job_exist(self, task_declaration_id: str):
         """
         Finish Job
@@ -1,13 +1,53 @@
+import time
+from collections import OrderedDict
+import concurrent.futures
 from logging import getLogger
 
 from hexbytes import HexBytes
 
-from tatau_core import web3
+from tatau_core import settings, web3
 from tatau_core.contract import NodeContractInfo
+from tatau_core.contract.transactions import TransactionConfirmer
 
 logger = getLogger('tatau_core')
 
 
+def _send(send_fn, **kwargs):
+    """
+    Send transaction with nonce from local sequence of account. It is used only by settlement of verifier (distribute
+    and finish), which sends several transactions without waiting. Producer processes may share account, so their
+    transactions get nonces from node.
+    """
+    try:
+        return send_fn(nonce=NodeContractInfo.next_nonce(), **kwargs)
+    except Exception:
+        # nonce may be not used, sync sequence with node
+        NodeContractInfo.reset_nonce()
+        raise
+
+
+def _watch(task_declaration, tx_hash):
+    future = NodeContractInfo.get_contract().watch_transaction(tx_hash)
+    # state of job is changed when transaction is mined
+    future.add_done_callback(lambda f: NodeContractInfo.get_reader().invalidate(task_declaration.asset_id))
+    return future
+
+
+def wait_for_transactions(futures, timeout=120):
+    """
+    Wait for mining of many transactions at once
+    :param futures: futures returned by finish_job and distribute, None values are ignored
+    :param timeout: seconds, TimeoutError is raised if some transactions are not mined during timeout
+    """
+    futures = [x for x in futures if x is not None]
+    _, not_done = concurrent.futures.wait(futures, timeout=timeout)
+    if len(not_done):
+        raise TimeoutError('{} transactions are not mined in {}s'.format(len(not_done), timeout))
+
+    for future in futures:
+        future.result()
+
+
 def issue_job(task_declaration, job_cost):
     logger.info('Issue job {} balance {}'.format(task_declaration, job_cost))
 
@@ -19,18 +59,27 @@ def issue_job(task_declaration, job_cost):
             task_declaration_id=task_declaration.asset_id,
             value=job_budget
         )
+        NodeContractInfo.get_reader().invalidate(task_declaration.asset_id)
 
 
 def does_job_exist(task_declaration):
-    return NodeContractInfo.get_contract().does_job_exist(task_declaration.asset_id)
+    return NodeContractInfo.get_reader().does_job_exist(task_declaration.asset_id)
 
 
 def does_job_finished(task_declaration):
-    return NodeContractInfo.get_contract().does_job_finished(task_declaration.asset_id)
+    return NodeContractInfo.get_reader().does_job_finished(task_declaration.asset_id)
 
 
 def get_job_balance(task_declaration):
-    return NodeContractInfo.get_contract().get_job_balance(task_declaration.asset_id)
+    return NodeContractInfo.get_reader().get_job_balance(task_declaration.asset_id)
+
+
+def prefetch_jobs(task_declarations, methods=None):
+    """
+    Read state of jobs by one batch request, following calls of does_job_exist, does_job_finished and
+    get_job_balance for these task declarations will be served from cache
+    """
+    NodeContractInfo.get_reader().prefetch([x.asset_id for x in task_declarations], methods=methods)
 
 
 def deposit(task_declaration, amount):
@@ -38,17 +87,36 @@ def deposit(task_declaration, amount):
 
     NodeContractInfo.unlock_account()
     NodeContractInfo.get_contract().deposit(task_declaration.asset_id, web3.toWei(str(amount), 'ether'))
+    NodeContractInfo.get_reader().invalidate(task_declaration.asset_id)
 
 
-def finish_job(task_declaration):
+def finish_job(task_declaration, wait=True):
+    """
+    :param wait: if False transaction is sent without waiting of mining
+    :return: future of transaction
+    """
     logger.info('Finish job {}'.format(task_declaration))
 
     NodeContractInfo.unlock_account()
-    NodeContractInfo.get_contract().finish_job(task_declaration.asset_id)
+    tx_hash = _send(NodeContractInfo.get_contract().finish_job_async, task_declaration_id=task_declaration.asset_id)
+    future = _watch(task_declaration, tx_hash)
+    if wait:
+        future.result()
+    return future
+
 
+def distribute(task_declaration, verification_assignment, wait=True):
+    """
+    Queue payments of workers for current iteration and flush queued payments of job.
 
-def distribute(task_declaration, verification_assignment):
-    from tatau_core.models import TaskAssignment, WorkerPayment
+    Payments of several iterations are paid by one transaction, queue is flushed when it has PAYOUT_BATCH_SIZE
+    payments or when oldest payment waits longer than PAYOUT_BATCH_LATENCY seconds. Queue is always flushed on last
+    iteration and when task is finished.
+
+    :param wait: if False transaction of last iteration is sent without waiting of mining
+    :return: future of transaction which is not mined yet or None
+    """
+    from tatau_core.models import TaskAssignment
 
     logger.info('Distribute {}'.format(task_declaration))
     iteration = task_declaration.current_iteration
@@ -83,36 +151,20 @@ def distribute(task_declaration, verification_assignment):
     for retry, value in distribute_transactions[str(iteration)].items():
         already_payed_workers += value['workers']
 
+    flush = task_declaration.last_iteration or task_declaration.in_finished_state
+
     distribute_data = distribute_transactions[str(iteration)][str(iteration_retry)]
     if distribute_data['transaction'] is not None:
-        tx_hash_str = distribute_data['transaction']
-        logger.info('Transaction for {} for iteration {} is {}'.format(
-            task_declaration, task_declaration.current_iteration, tx_hash_str))
-
-        tx_hash = HexBytes.fromhex(tx_hash_str)
-        if NodeContractInfo.get_contract().is_transaction_mined(tx_hash):
-            logger.info('Distribute for {} for iteration {} is mined'.format(
-                task_declaration, task_declaration.current_iteration))
-            return
-        else:
-            if task_declaration.last_iteration:
-                NodeContractInfo.get_contract().wait_for_transaction_mined(tx_hash)
-                logger.info('Distribute for {} for iteration {} is mined'.format(
-                    task_declaration, task_declaration.current_iteration))
-            else:
-                logger.info('Distribute for {} for iteration {} is not mined'.format(
-                    task_declaration, task_declaration.current_iteration))
-            return
+        logger.info('Distribute for {} for iteration {} is mined: {}'.format(
+            task_declaration, task_declaration.current_iteration, distribute_data['transaction']))
+        return None
 
-    if len(good_worker_ids) == 0:
-        logger.info('No targets for distribute')
-        return
-
-    worker_addresses = []
-    amounts = []
-    distribute_total_amount = 0.0
-    worker_payments = []
+    if 'payments' in distribute_data:
+        logger.info('Payments for {} for iteration {} are already queued'.format(
+            task_declaration, task_declaration.current_iteration))
+        return _flush_payouts(task_declaration, distribute_history, force=flush, wait=wait)
 
+    payments = []
     for task_assignment in task_declaration.get_task_assignments(states=(TaskAssignment.State.FINISHED,)):
         if task_assignment.worker.asset_id in fake_worker_ids:
             continue
@@ -120,47 +172,168 @@ def distribute(task_declaration, verification_assignment):
         if task_assignment.worker.asset_id in already_payed_workers:
             continue
 
-        worker_addresses.append(task_assignment.worker.account_address)
-        amounts.append(amount_for_worker)
-        distribute_total_amount += float(web3.fromWei(amount_for_worker, 'ether'))
+        payments.append({
+            'worker_id': task_assignment.worker.asset_id,
+            'address': task_assignment.worker.account_address,
+            'amount': amount_for_worker,
+            'tflops': task_assignment.train_result.tflops
+        })
+
+    if len(payments) == 0:
+        logger.info('No targets for distribute')
+    else:
+        # workers are marked as payed for this iteration when payments are queued, so they can't be queued twice
+        distribute_data['workers'] = good_worker_ids
+        distribute_data['payments'] = payments
+        distribute_data['queued_at'] = time.time()
+        distribute_history.save()
+
+        logger.info('Queue payments for {} for iteration {} worker addresses: {}'.format(
+            task_declaration, task_declaration.current_iteration, [x['address'] for x in payments]))
+
+    return _flush_payouts(task_declaration, distribute_history, force=flush, wait=wait)
+
+
+def flush_payouts(task_declaration, verification_assignment, force=False, wait=True):
+    """
+    Pay queued payments of job if batch thresholds are reached
+    :return: future of transaction which is not mined yet or None
+    """
+    return _flush_payouts(task_declaration, verification_assignment.distribute_history, force=force, wait=wait)
+
+
+def get_unpaid_amount(verification_assignment):
+    """
+    Amount of payments which are queued or sent but not mined yet, they are not subtracted from job balance yet
+    :return: amount in wei
+    """
+    return sum(
+        payment['amount']
+        for _, _, distribute_data in _unpaid_payouts(verification_assignment.distribute_history)
+        for payment in distribute_data['payments']
+    )
+
 
-        worker_payments.append(
-            WorkerPayment(
-                db=verification_assignment.db,
-                encryption=verification_assignment.encryption,
+def _unpaid_payouts(distribute_history):
+    """
+    :return: list of (iteration, iteration retry, distribute data) of payments which are not payed yet
+    """
+    unpaid = []
+    for iteration, iteration_data in distribute_history.distribute_transactions.items():
+        for iteration_retry, distribute_data in iteration_data.items():
+            if distribute_data['transaction'] is None and len(distribute_data.get('payments') or []):
+                unpaid.append((int(iteration), int(iteration_retry), distribute_data))
+    return unpaid
+
+
+def _settle_payouts(task_declaration, distribute_history):
+    """
+    Check transaction of sent payments. Payments are recorded as payed only when transaction is mined successfully,
+    payments of reverted transaction are queued again.
+    :return: future of transaction which is not mined yet or None
+    """
+    from tatau_core.models import WorkerPayment
+
+    sent = [x for x in _unpaid_payouts(distribute_history) if x[2].get('pending_transaction')]
+    if not len(sent):
+        return None
+
+    tx_hash_str = sent[0][2]['pending_transaction']
+    receipt = web3.eth.getTransactionReceipt(HexBytes.fromhex(tx_hash_str))
+    if not TransactionConfirmer.is_mined(receipt):
+        return _watch(task_declaration, HexBytes.fromhex(tx_hash_str))
+
+    reverted = receipt.get('status') == 0
+    for _, _, distribute_data in sent:
+        distribute_data['pending_transaction'] = None
+        if not reverted:
+            distribute_data['transaction'] = tx_hash_str
+    distribute_history.save()
+
+    if reverted:
+        logger.info('Distribute {} of {} is reverted, payments are queued again'.format(tx_hash_str, task_declaration))
+        return None
+
+    logger.info('Distribute {} of {} is mined'.format(tx_hash_str, task_declaration))
+    for iteration, iteration_retry, distribute_data in sent:
+        for payment in distribute_data['payments']:
+            tokens = float(web3.fromWei(payment['amount'], 'ether'))
+            logger.info('Save payments for worker: {}, tokens: {}'.format(payment['worker_id'], tokens))
+            WorkerPayment.create(
+                db=distribute_history.db,
+                encryption=distribute_history.encryption,
                 producer_id=task_declaration.producer_id,
-                worker_id=task_assignment.worker.asset_id,
+                worker_id=payment['worker_id'],
                 task_declaration_id=task_declaration.asset_id,
-                train_iteration=task_declaration.current_iteration,
-                train_iteration_retry=task_declaration.current_iteration_retry,
-                tflops=task_assignment.train_result.tflops,
-                tokens=float(web3.fromWei(amount_for_worker, 'ether'))
+                train_iteration=iteration,
+                train_iteration_retry=iteration_retry,
+                tflops=payment['tflops'],
+                tokens=tokens
             )
-        )
+    return None
+
+
+def _flush_payouts(task_declaration, distribute_history, force, wait):
+    # one transaction of job is sent at once, queued payments wait until sent transaction is mined
+    future = _settle_payouts(task_declaration, distribute_history)
+    if future is None:
+        future = _send_payouts(task_declaration, distribute_history, force)
+
+    if future is not None and task_declaration.last_iteration and wait:
+        logger.info('Wait for distribute of last iteration for task: {}'.format(task_declaration))
+        future.result()
+        _settle_payouts(task_declaration, distribute_history)
+        # payments which were queued while previous transaction was mined
+        return _flush_payouts(task_declaration, distribute_history, force=force, wait=wait)
+
+    return future
+
+
+def _send_payouts(task_declaration, distribute_history, force):
+    queued = _unpaid_payouts(distribute_history)
+    if not len(queued):
+        return None
+
+    # one transfer per worker address for all queued iterations
+    amounts = OrderedDict()
+    for _, _, distribute_data in queued:
+        for payment in distribute_data['payments']:
+            amounts[payment['address']] = amounts.get(payment['address'], 0) + payment['amount']
+
+    payments_count = sum(len(x[2]['payments']) for x in queued)
+    queued_time = time.time() - min(x[2]['queued_at'] for x in queued)
+    # workers check balance of job before iteration, it must not include payments which job can't pay after next
+    # iteration
+    balance_is_short = \
+        task_declaration.balance_in_wei - sum(amounts.values()) < task_declaration.iteration_cost_in_wei
+    if not force and not balance_is_short and payments_count < settings.PAYOUT_BATCH_SIZE \
+            and queued_time < settings.PAYOUT_BATCH_LATENCY:
+        logger.info('Payments of {} are queued: {} payments for {:.0f}s'.format(
+            task_declaration, payments_count, queued_time))
+        return None
+
+    worker_addresses = list(amounts.keys())
+    distribute_total_amount = float(web3.fromWei(sum(amounts.values()), 'ether'))
 
     NodeContractInfo.unlock_account()
 
-    logger.info('Job balance: {:.5f} ETH distribute: {:.5f} ETH worker addresses: {}'.format(
-        task_declaration.balance,  distribute_total_amount, worker_addresses))
+    logger.info('Job balance: {:.5f} ETH distribute: {:.5f} ETH iterations: {} worker addresses: {}'.format(
+        task_declaration.balance, distribute_total_amount, sorted(set(x[0] for x in queued)), worker_addresses))
 
-    tx_hash = NodeContractInfo.get_contract().distribute_async(
+    tx_hash = _send(
+        NodeContractInfo.get_contract().distribute_async,
         task_declaration_id=task_declaration.asset_id,
         workers=worker_addresses,
-        amounts=amounts
+        amounts=list(amounts.values())
     )
 
-    distribute_data['workers'] = good_worker_ids
-    distribute_data['transaction'] = ''.join('{:02x}'.format(x) for x in tx_hash)
-    distribute_history.save()
-
-    for worker_payment in worker_payments:
-        logger.info('Save payments for worker: {}, tokens: {}'.format(worker_payment.worker_id, worker_payment.tokens))
-        worker_payment.save()
+    NodeContractInfo.get_reader().invalidate(task_declaration.asset_id)
 
-    if task_declaration.last_iteration:
-        logger.info(
-            'Wait for distribute of last iteration for task: {} balance: {:.5f} ETH distribute: {:.5f} ETH'.format(
-                task_declaration, task_declaration.balance, distribute_total_amount))
-        NodeContractInfo.get_contract().wait_for_transaction_mined(tx_hash)
+    # payments are recorded as payed when transaction is mined
+    tx_hash_str = ''.join('{:02x}'.format(x) for x in tx_hash)
+    for _, _, distribute_data in queued:
+        distribute_data['pending_transaction'] = tx_hash_str
+    distribute_history.save()
 
     logger.info('Job {} distributed async'.format(task_declaration))
+    return _watch(task_declaration, tx_hash)
@@ -0,0 +1,132 @@
+import threading
+import time
+from logging import getLogger
+
+from eth_abi import decode_single
+
+from tatau_core import settings, web3
+from tatau_core.contract import rpc
+
+logger = getLogger('tatau_core')
+
+
+class ContractReader:
+    """
+    Batched and cached reads of job state from contract.
+
+    Calls for many jobs are sent to parity as one JSON-RPC batch of eth_call. Results are cached for "ttl" seconds,
+    positive results of doesJobExist and doesJobFinished never change, so they are cached permanently. Cache of job
+    must be invalidated after own transaction (issue, deposit, distribute, finish) to this job.
+    """
+
+    # contract method -> output type
+    methods = {
+        'getJobBalance': 'uint256',
+        'doesJobExist': 'bool',
+        'doesJobFinished': 'bool',
+    }
+
+    permanent_methods = ('doesJobExist', 'doesJobFinished')
+
+    def __init__(self, contract, ttl=None):
+        self._contract = contract
+        self.ttl = settings.CONTRACT_READ_CACHE_TTL if ttl is None else ttl
+
+        # (method, task declaration id) -> (value, expires_at)
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def _get_cached(self, key):
+        with self._lock:
+            value, expires_at = self._cache[key]
+            if expires_at is not None and expires_at < time.time():
+                del self._cache[key]
+                raise KeyError(key)
+
+            return value
+
+    def _set_cached(self, key, value):
+        method, _ = key
+        if method in self.permanent_methods and value:
+            expires_at = None
+        elif self.ttl > 0:
+            expires_at = time.time() + self.ttl
+        else:
+            return
+
+        with self._lock:
+            self._cache[key] = (value, expires_at)
+
+    def _call_batch(self, keys):
+        """
+        Perform eth_call for each (method, task declaration id) in one JSON-RPC batch request
+        :return: dict (method, task declaration id) -> decoded value
+        """
+        calls = []
+        for method, task_declaration_id in keys:
+            calls.append((
+                'eth_call',
+                [
+                    {
+                        'to': self._contract.address,
+                        'data': self._contract.encode_call(method, task_declaration_id)
+                    },
+                    'latest'
+                ]
+            ))
+
+        logger.debug('Read {} contract calls by batch'.format(len(calls)))
+        results = rpc.batch_request(calls)
+
+        values = {}
+        for key, result in zip(keys, results):
+            values[key] = decode_single(self.methods[key[0]], web3.toBytes(hexstr=result))
+        return values
+
+    def read(self, keys):
+        """
+        Read values of (method, task declaration id) keys, values which are absent in cache are read by one batch
+        :return: dict (method, task declaration id) -> value
+        """
+        values = {}
+        missed = []
+        for key in keys:
+            try:
+                values[key] = self._get_cached(key)
+            except KeyError:
+                if key not in missed:
+                    missed.append(key)
+
+        if len(missed):
+            for key, value in self._call_batch(missed).items():
+                self._set_cached(key, value)
+                values[key] = value
+
+        return values
+
+    def prefetch(self, task_declaration_ids, methods=None):
+        """
+        Load state of many jobs into cache by one batch request
+        """
+        methods = methods or self.methods.keys()
+        keys = [(method, x) for x in task_declaration_ids for method in methods]
+        if len(keys):
+            self.read(keys)
+
+    def _read_one(self, method, task_declaration_id):
+        key = (method, task_declaration_id)
+        return self.read([key])[key]
+
+    def get_job_balance(self, task_declaration_id: str):
+        return self._read_one('getJobBalance', task_declaration_id)
+
+    def does_job_exist(self, task_declaration_id: str):
+        return self._read_one('doesJobExist', task_declaration_id)
+
+    def does_job_finished(self, task_declaration_id: str):
+        return self._read_one('doesJobFinished', task_declaration_id)
+
+    def invalidate(self, task_declaration_id: str):
+        with self._lock:
+            for method in self.methods.keys():
+                self._cache.pop((method, task_declaration_id), None)
@@ -0,0 +1,45 @@
+import itertools
+
+import requests
+
+from tatau_core import settings
+
+_request_ids = itertools.count()
+
+
+def get_endpoint_uri():
+    return 'http://{}:{}'.format(settings.PARITY_HOST, settings.PARITY_JSONRPC_PORT)
+
+
+def batch_request(calls):
+    """
+    Send JSON-RPC calls to parity by one batch request
+    :param calls: list of (method, params)
+    :return: list of results in order of calls
+    """
+    request_ids = []
+    payload = []
+    for method, params in calls:
+        request_id = next(_request_ids)
+        request_ids.append(request_id)
+        payload.append({
+            'jsonrpc': '2.0',
+            'id': request_id,
+            'method': method,
+            'params': params
+        })
+
+    response = requests.post(get_endpoint_uri(), json=payload, timeout=60)
+    response.raise_for_status()
+
+    results = {}
+    for item in response.json():
+        if 'error' in item:
+            raise ValueError('JSON-RPC call is failed: {}'.format(item['error']))
+        results[item.get('id')] = item.get('result')
+
+    missed = [x for x in request_ids if x not in results]
+    if len(missed):
+        raise ValueError('No results for {} JSON-RPC calls'.format(len(missed)))
+
+    return [results[x] for x in request_ids]
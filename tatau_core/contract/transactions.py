@@ -0,0 +1,166 @@
+import threading
+import time
+from concurrent.futures import Future
+from logging import getLogger
+
+from hexbytes import HexBytes
+
+from tatau_core import settings, web3
+from tatau_core.contract import rpc
+from tatau_core.utils.signleton import singleton
+
+logger = getLogger('tatau_core')
+
+
+@singleton
+class TransactionConfirmer:
+    """
+    Confirms mining of many transactions at once.
+
+    Every watched transaction gets future which is resolved by receipt when transaction is mined, future of reverted
+    transaction raises RuntimeError. Background thread
+    listens new blocks by block filter and on each new block requests receipts of all pending transactions by one
+    JSON-RPC batch. Thread is stopped when there are no pending transactions.
+    """
+
+    def __init__(self):
+        # tx hash -> (future, deadline)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._block_filter = None
+        self._has_unchecked = False
+
+    def watch(self, tx_hash, timeout=120) -> Future:
+        """
+        Start watching of transaction
+        :param tx_hash: transaction hash
+        :param timeout: seconds, if transaction is not mined during timeout, future raises TimeoutError
+        :return: future which result is receipt
+        """
+        tx_hash = HexBytes(tx_hash).hex()
+        with self._lock:
+            if tx_hash in self._pending:
+                return self._pending[tx_hash][0]
+
+            future = Future()
+            future.set_running_or_notify_cancel()
+            self._pending[tx_hash] = (future, time.time() + timeout)
+            # transaction may be already mined, check it without waiting of new block
+            self._has_unchecked = True
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+        return future
+
+    def wait(self, tx_hash, timeout=120):
+        return self.watch(tx_hash, timeout=timeout).result()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not len(self._pending):
+                    self._thread = None
+                    return
+
+            try:
+                if self._has_new_block() or self._has_unchecked:
+                    self._has_unchecked = False
+                    self._check_pending()
+            except Exception as ex:
+                logger.info('Failed to check pending transactions: {}'.format(ex))
+                self._block_filter = None
+
+            self._expire_pending()
+            time.sleep(settings.CONTRACT_BLOCK_POLL_INTERVAL)
+
+    def _has_new_block(self):
+        if self._block_filter is None:
+            self._block_filter = web3.eth.filter('latest')
+            return True
+
+        return len(self._block_filter.get_new_entries()) > 0
+
+    @staticmethod
+    def is_mined(receipt):
+        if receipt is None or receipt.get('blockNumber') is None:
+            return False
+
+        # parity marks logs of transactions from pending block as "pending"
+        logs = receipt.get('logs') or []
+        return not len(logs) or logs[0].get('type', 'mined') == 'mined'
+
+    def _check_pending(self):
+        with self._lock:
+            tx_hashes = list(self._pending.keys())
+
+        if not len(tx_hashes):
+            return
+
+        receipts = rpc.batch_request([('eth_getTransactionReceipt', [x]) for x in tx_hashes])
+        for tx_hash, receipt in zip(tx_hashes, receipts):
+            if not self.is_mined(receipt):
+                continue
+
+            # formatted receipt, transaction stays pending if receipt is not read, so it is checked again or expires
+            try:
+                receipt = web3.eth.getTransactionReceipt(tx_hash)
+            except Exception as ex:
+                logger.info('Failed to get receipt of transaction {}: {}'.format(tx_hash, ex))
+                self._has_unchecked = True
+                continue
+
+            with self._lock:
+                future, _ = self._pending.pop(tx_hash)
+
+            # status is absent in receipts of blocks before byzantium
+            if receipt.get('status') == 0:
+                logger.info('Transaction {} is reverted'.format(tx_hash))
+                future.set_exception(RuntimeError('Transaction {} is reverted'.format(tx_hash)))
+                continue
+
+            logger.debug('Transaction {} is mined'.format(tx_hash))
+            future.set_result(receipt)
+
+    def _expire_pending(self):
+        now = time.time()
+        expired = []
+        with self._lock:
+            for tx_hash, (future, deadline) in list(self._pending.items()):
+                if deadline < now:
+                    del self._pending[tx_hash]
+                    expired.append((tx_hash, future))
+
+        for tx_hash, future in expired:
+            future.set_exception(TimeoutError('Transaction timed out {}'.format(tx_hash)))
+
+
+class NonceManager:
+    """
+    Local sequence of nonces of account, it allows to send several transactions without waiting of their receipts.
+    Sequence is synchronized with count of pending transactions of account, so transactions which were sent by other
+    processes are taken into account, but account must not send transactions concurrently from other processes.
+    """
+
+    def __init__(self):
+        self._next_nonce = None
+        self._lock = threading.Lock()
+
+    def next_nonce(self, address):
+        with self._lock:
+            transaction_count = web3.eth.getTransactionCount(address, 'pending')
+            if self._next_nonce is None or self._next_nonce < transaction_count:
+                self._next_nonce = transaction_count
+
+            nonce = self._next_nonce
+            self._next_nonce += 1
+            return nonce
+
+    def reset(self):
+        """
+        Should be called when transaction with taken nonce was not sent, otherwise following transactions stuck
+        """
+        with self._lock:
+            self._next_nonce = None
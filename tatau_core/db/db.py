@@ -112,11 +112,41 @@ class DB:
 
         return transaction
 
-    def get_transactions(self, asset_id):
+    def get_transaction(self, transaction_id):
         self.connect_to_mongodb()
+        return self._get_transaction(transaction_id)
+
+    def get_transactions(self, asset_id, skip=None):
+        """
+        Retrieves transactions of asset in order of commit.
+
+        If skip is specified, first "skip" transactions are not retrieved,
+        it allows to read only new transactions of asset.
+
+        Transactions, assets and metadata are loaded by batch queries instead of query per transaction.
+        """
+        self.connect_to_mongodb()
+        transaction_ids = list(query.get_txids_filtered(self.mongo_db, asset_id=asset_id, skip=skip))
+        if not len(transaction_ids):
+            return []
+
+        loaded_transactions = {x['id']: x for x in query.get_transactions(self.mongo_db, transaction_ids)}
+        loaded_metadata = {x['id']: x.get('metadata') for x in query.get_metadata(self.mongo_db, transaction_ids)}
+
         transactions = []
-        for transaction_id in query.get_txids_filtered(self.mongo_db, asset_id=asset_id):
-            transactions.append(self._get_transaction(transaction_id))
+        for transaction_id in transaction_ids:
+            transaction = loaded_transactions[transaction_id]
+            transaction['generation_time'] = transaction.pop('_id').generation_time
+
+            if transaction['operation'] == 'CREATE':
+                asset = query.get_asset(self.mongo_db, transaction_id)
+                if asset:
+                    transaction['asset'] = asset
+
+            if 'metadata' not in transaction:
+                transaction.update({'metadata': loaded_metadata.get(transaction_id)})
+
+            transactions.append(transaction)
         return transactions
 
     def retrieve_asset_ids(self, match, created_by_user=True, skip=None, limit=None):
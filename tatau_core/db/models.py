@@ -169,10 +169,19 @@ class Model(metaclass=ModelBase):
         return db.retrieve_asset_count(match=match, created_by_user=created_by_user)
 
     @classmethod
-    def get_history(cls, asset_id, db, encryption):
+    def get_history(cls, asset_id, db, encryption, skip=None):
         data = None
         created_at = None
-        for transaction in db.get_transactions(asset_id=asset_id):
+
+        if skip:
+            # CREATE transaction will be skipped, but initial data is required
+            transaction = db.get_transaction(asset_id)
+            data = transaction['asset']['data']
+            created_at = transaction['generation_time']
+            if data['asset_name'] != cls.get_asset_name():
+                raise exceptions.Asset.WrongType()
+
+        for transaction in db.get_transactions(asset_id=asset_id, skip=skip):
             if transaction['operation'] == 'CREATE':
                 data = transaction['asset']['data']
                 created_at = transaction['generation_time']
@@ -7,7 +7,7 @@ def get_transaction(db, transaction_id):
 
 def get_transactions(db, transaction_ids):
     try:
-        return db.transactions.find({'id': {'$in': transaction_ids}}, projection={'_id': False})
+        return db.transactions.find({'id': {'$in': transaction_ids}})
     except IndexError:
         pass
 
@@ -23,7 +23,7 @@ def get_asset(db, asset_id):
         pass
 
 
-def get_txids_filtered(db, asset_id, operation=None):
+def get_txids_filtered(db, asset_id, operation=None, skip=None):
     match_create = {
         'operation': 'CREATE',
         'id': asset_id
@@ -41,7 +41,13 @@ def get_txids_filtered(db, asset_id, operation=None):
         match = {'$or': [match_create, match_transfer]}
 
     pipeline = [
-        {'$match': match}
+        {'$match': match},
+        # history of asset in order of commit
+        {'$sort': {'_id': 1}}
     ]
+
+    if skip:
+        pipeline.append({'$skip': skip})
+
     cursor = db.transactions.aggregate(pipeline)
     return (elem['id'] for elem in cursor)
@@ -1,13 +1,20 @@
 import csv
+import hashlib
+import json
 import os
 import shutil
 import tempfile
+import threading
+from collections import OrderedDict
 from io import StringIO
 from logging import getLogger
+from multiprocessing.pool import ThreadPool
 
 import numpy as np
 
+from tatau_core import settings
 from tatau_core.db import models, fields
+from tatau_core.utils import packed_chunk
 from tatau_core.utils.file_downloader import FileDownloader
 from tatau_core.utils.ipfs import IPFS
 
@@ -84,75 +91,120 @@ class Dataset(models.Model):
 
         return cls.create(**kwargs)
 
+    @staticmethod
+    def _load_manifest(manifest_path):
+        try:
+            with open(manifest_path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    @staticmethod
+    def _save_manifest(manifest_path, manifest):
+        tmp_path = manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.rename(tmp_path, manifest_path)
+
     @classmethod
-    def _split_files(cls, x_path, y_path, minibatch_size, target_dir):
-        x_train = np.load(x_path)
-        y_train = np.load(y_path)
+    def _split_and_upload(cls, x_path, y_path, minibatch_size, work_dir, packed=False,
+                          pool_size=settings.DATASET_UPLOAD_POOL_SIZE):
+        """
+        Split dataset to chunks and upload each chunk to ipfs as soon as it is written. Source arrays are memory
+        mapped, so only chunks which are being written are loaded to memory. Uploaded chunks are recorded in manifest,
+        chunks from manifest are not uploaded again.
+        :param packed: write chunk as one compressed packed file instead of x.npy and y.npy
+        :return: multihash of directory of chunks
+        """
+        x_train = np.load(x_path, mmap_mode='r')
+        y_train = np.load(y_path, mmap_mode='r')
         batches = int(len(x_train) / minibatch_size)
         logger.info('Split dataset to {} batches'.format(batches))
-        name_format = '{{:0{}d}}'.format(len(str(batches)) + 1)
+        name_format = 'chunk_{{:0{}d}}'.format(len(str(batches)) + 1)
+
+        manifest_path = os.path.join(work_dir, 'manifest.json')
+        manifest = cls._load_manifest(manifest_path)
+        if len(manifest):
+            logger.info('Resume upload, {} chunks are already uploaded'.format(len(manifest)))
 
-        for batch_idx in range(0, batches):
+        manifest_lock = threading.Lock()
+        ipfs = IPFS()
+
+        def upload_chunk(batch_idx):
+            chunk_name = name_format.format(batch_idx)
             start_idx = batch_idx * minibatch_size
             end_idx = start_idx + minibatch_size
-            x_batch = x_train[start_idx: end_idx]
-            y_batch = y_train[start_idx: end_idx]
 
-            chunk_dir = os.path.join(target_dir, 'chunk_' + name_format.format(batch_idx))
+            chunk_dir = os.path.join(work_dir, chunk_name)
+            shutil.rmtree(chunk_dir, ignore_errors=True)
             os.mkdir(chunk_dir)
-
-            x_path = os.path.join(chunk_dir, 'x')
-            np.save(x_path, x_batch)
-
-            y_path = os.path.join(chunk_dir, 'y')
-            np.save(y_path, y_batch)
+            try:
+                if packed:
+                    packed_chunk.write_packed_chunk(
+                        os.path.join(chunk_dir, packed_chunk.FILE_NAME),
+                        OrderedDict([('x', x_train[start_idx: end_idx]), ('y', y_train[start_idx: end_idx])]),
+                        compression='auto'
+                    )
+                else:
+                    np.save(os.path.join(chunk_dir, 'x'), x_train[start_idx: end_idx])
+                    np.save(os.path.join(chunk_dir, 'y'), y_train[start_idx: end_idx])
+                multihash = ipfs.add_dir(chunk_dir, recursive=True).multihash
+            finally:
+                shutil.rmtree(chunk_dir)
+
+            with manifest_lock:
+                manifest[chunk_name] = multihash
+                cls._save_manifest(manifest_path, manifest)
+
+        with ThreadPool(pool_size) as p:
+            p.map(upload_chunk, [x for x in range(batches) if name_format.format(x) not in manifest])
+
+        return ipfs.make_dir(manifest).multihash
 
     @classmethod
-    def download_and_create(cls, x_train_url, y_train_url, x_test_url, y_test_url, minibatch_size, **kwargs):
+    def download_and_create(cls, x_train_url, y_train_url, x_test_url, y_test_url, minibatch_size, packed=False,
+                            **kwargs):
         logger.info('Creating dataset')
 
-        train_download_target_dir = tempfile.mkdtemp()
-        test_target_dir = tempfile.mkdtemp()
-        train_dir = tempfile.mkdtemp()
-        test_dir = tempfile.mkdtemp()
-        try:
-            x_train_path = os.path.join(train_download_target_dir, 'x_train')
-            y_train_path = os.path.join(train_download_target_dir, 'y_train')
-            x_test_path = os.path.join(test_target_dir, 'x_test')
-            y_test_path = os.path.join(test_target_dir, 'y_test')
-
-            download_list = [
-                FileDownloader.Params(url=x_train_url, target_path=x_train_path),
-                FileDownloader.Params(url=y_train_url, target_path=y_train_path),
-                FileDownloader.Params(url=x_test_url, target_path=x_test_path),
-                FileDownloader.Params(url=y_test_url, target_path=y_test_path),
-            ]
-            FileDownloader.download_all(download_list)
-
-            ipfs = IPFS()
-
-            cls._split_files(
-                x_path=x_test_path,
-                y_path=y_test_path,
-                minibatch_size=minibatch_size,
-                target_dir=test_dir
-            )
-            kwargs['test_dir_ipfs'] = ipfs.add_dir(test_dir, recursive=True).multihash
-            logger.info('Test part is uploaded: {}'.format(kwargs['test_dir_ipfs']))
-
-            cls._split_files(
-                x_path=x_train_path,
-                y_path=y_train_path,
-                minibatch_size=minibatch_size,
-                target_dir=train_dir
-            )
-
-            kwargs['train_dir_ipfs'] = ipfs.add_dir(train_dir, recursive=True).multihash
-            logger.info('Train part is uploaded: {}'.format(kwargs['train_dir_ipfs']))
-            return cls.create(**kwargs)
-        finally:
-            shutil.rmtree(test_target_dir)
-            shutil.rmtree(train_download_target_dir)
-            shutil.rmtree(train_dir)
-            shutil.rmtree(test_dir)
-
+        # work dir is kept if upload is failed, so next call with same arguments resumes it
+        work_key = json.dumps([x_train_url, y_train_url, x_test_url, y_test_url, minibatch_size, packed])
+        work_dir = os.path.join(settings.TATAU_DATASET_UPLOAD_DIR, hashlib.sha1(work_key.encode()).hexdigest())
+        train_dir = os.path.join(work_dir, 'train')
+        test_dir = os.path.join(work_dir, 'test')
+        os.makedirs(train_dir, exist_ok=True)
+        os.makedirs(test_dir, exist_ok=True)
+
+        x_train_path = os.path.join(work_dir, 'x_train')
+        y_train_path = os.path.join(work_dir, 'y_train')
+        x_test_path = os.path.join(work_dir, 'x_test')
+        y_test_path = os.path.join(work_dir, 'y_test')
+
+        download_list = [
+            FileDownloader.Params(url=x_train_url, target_path=x_train_path),
+            FileDownloader.Params(url=y_train_url, target_path=y_train_path),
+            FileDownloader.Params(url=x_test_url, target_path=x_test_path),
+            FileDownloader.Params(url=y_test_url, target_path=y_test_path),
+        ]
+        FileDownloader.download_all([x for x in download_list if not os.path.exists(x.target_path)])
+
+        kwargs['test_dir_ipfs'] = cls._split_and_upload(
+            x_path=x_test_path,
+            y_path=y_test_path,
+            minibatch_size=minibatch_size,
+            work_dir=test_dir,
+            packed=packed
+        )
+        logger.info('Test part is uploaded: {}'.format(kwargs['test_dir_ipfs']))
+
+        kwargs['train_dir_ipfs'] = cls._split_and_upload(
+            x_path=x_train_path,
+            y_path=y_train_path,
+            minibatch_size=minibatch_size,
+            work_dir=train_dir,
+            packed=packed
+        )
+        logger.info('Train part is uploaded: {}'.format(kwargs['train_dir_ipfs']))
+
+        dataset = cls.create(**kwargs)
+        shutil.rmtree(work_dir)
+        return dataset
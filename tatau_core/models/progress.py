@@ -0,0 +1,372 @@
+import datetime
+import os
+import pickle
+from collections import OrderedDict
+from logging import getLogger
+
+from tatau_core import settings
+from tatau_core.models.estimation import EstimationAssignment, EstimationResult
+from tatau_core.models.train import TaskAssignment, TrainResult
+from tatau_core.models.verification import VerificationAssignment, VerificationResult
+
+logger = getLogger('tatau_core')
+
+
+class HistoryReader:
+    """
+    Resumable reader of asset history, every call of read() yields only transactions which were not read before
+    """
+    def __init__(self, model_class, asset_id):
+        self.model_class = model_class
+        self.asset_id = asset_id
+        self.position = 0
+
+    def read(self, db, encryption):
+        for obj in self.model_class.get_history(self.asset_id, db=db, encryption=encryption, skip=self.position):
+            self.position += 1
+            yield obj
+
+
+class ProgressSnapshot:
+    """
+    Incremental progress record of task declaration.
+
+    Snapshot keeps already folded history of task declaration and results of all assignments, so update() processes
+    only transactions which were committed after previous update. Snapshot is persisted in PROGRESS_SNAPSHOTS_DIR with
+    version of its layout, snapshot of other version is discarded and history is folded again.
+    """
+
+    # increment when attributes of snapshot are changed
+    version = 2
+
+    def __init__(self, task_declaration_id):
+        self.task_declaration_id = task_declaration_id
+        self._task_declaration_reader = None
+
+        # loss, accuracy, weights of finished iterations
+        self._history = {}
+        # time and tflops of iterations, collected from results of workers and verifiers
+        self._iterations = {}
+
+        self._estimators = OrderedDict()
+        self._workers = OrderedDict()
+        self._verifiers = OrderedDict()
+        # result asset id -> estimator, worker or verifier
+        self._results = {}
+
+    @staticmethod
+    def _make_path(task_declaration_id):
+        return os.path.join(settings.PROGRESS_SNAPSHOTS_DIR, '{}.pkl'.format(task_declaration_id))
+
+    @classmethod
+    def load(cls, task_declaration_id):
+        path = cls._make_path(task_declaration_id)
+        if os.path.exists(path):
+            try:
+                with open(path, 'rb') as f:
+                    data = pickle.load(f)
+                if isinstance(data, tuple) and len(data) == 2 and data[0] == cls.version:
+                    return data[1]
+                logger.info('Progress snapshot {} is outdated'.format(path))
+            except Exception as ex:
+                logger.info('Progress snapshot {} is broken: {}'.format(path, ex))
+
+        return cls(task_declaration_id)
+
+    def save(self):
+        os.makedirs(settings.PROGRESS_SNAPSHOTS_DIR, exist_ok=True)
+        path = self._make_path(self.task_declaration_id)
+
+        # producer and manage-tasks may save snapshot simultaneously, so replace file atomically
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((self.version, self), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def _get_iteration(self, iteration):
+        try:
+            return self._iterations[iteration]
+        except KeyError:
+            self._iterations[iteration] = {
+                'start_time': None,
+                'end_time': None,
+                'spent_tflops': 0.0,
+                'cost': 0.0
+            }
+            return self._iterations[iteration]
+
+    def update(self, task_declaration):
+        self.update_task_declaration(task_declaration)
+        self.update_assignments(task_declaration)
+
+    def update_task_declaration(self, task_declaration):
+        if self._task_declaration_reader is None:
+            self._task_declaration_reader = HistoryReader(type(task_declaration), self.task_declaration_id)
+
+        for td in self._task_declaration_reader.read(task_declaration.db, task_declaration.encryption):
+            self._fold_task_declaration(td)
+
+    def update_assignments(self, task_declaration):
+        """
+        Register new assignments of task declaration and fold new transactions of their results
+        """
+        estimation_assignments = task_declaration.get_estimation_assignments(
+            states=(
+                EstimationAssignment.State.ESTIMATING,
+                EstimationAssignment.State.FINISHED
+            )
+        )
+
+        for estimation_assignment in estimation_assignments:
+            if estimation_assignment.asset_id not in self._estimators:
+                self._register(
+                    self._estimators, estimation_assignment.asset_id, estimation_assignment.estimator_id,
+                    HistoryReader(EstimationResult, estimation_assignment.estimation_result_id),
+                    current={
+                        'start_time': None,
+                        'end_time': None,
+                        'duration': None,
+                    }
+                )
+
+        task_assignments = task_declaration.get_task_assignments(
+            states=(TaskAssignment.State.TRAINING, TaskAssignment.State.FINISHED, TaskAssignment.State.TIMEOUT,
+                    TaskAssignment.State.FAKE_RESULTS, TaskAssignment.State.FORGOTTEN)
+        )
+
+        for task_assignment in task_assignments:
+            if task_assignment.asset_id not in self._workers:
+                worker = self._register(
+                    self._workers, task_assignment.asset_id, task_assignment.worker_id,
+                    HistoryReader(TrainResult, task_assignment.train_result_id)
+                )
+                worker['current'] = self._new_train_data(worker)
+
+        verification_assignments = task_declaration.get_verification_assignments(
+            states=(VerificationAssignment.State.VERIFYING, VerificationAssignment.State.FINISHED,
+                    VerificationAssignment.State.TIMEOUT, VerificationAssignment.State.FORGOTTEN)
+        )
+
+        for verification_assignment in verification_assignments:
+            if verification_assignment.asset_id not in self._verifiers:
+                verifier = self._register(
+                    self._verifiers, verification_assignment.asset_id, verification_assignment.verifier_id,
+                    HistoryReader(VerificationResult, verification_assignment.verification_result_id)
+                )
+                verifier['current'] = self._new_verification_data(verifier)
+
+        for result_asset_id in self._results.keys():
+            self.update_result(result_asset_id, task_declaration.db, task_declaration.encryption)
+
+    def _register(self, performers, assignment_id, performer_id, reader, current=None):
+        performers[assignment_id] = {
+            'assignment_id': assignment_id,
+            'performer_id': performer_id,
+            'reader': reader,
+            'finished': [],
+            'current': current
+        }
+        self._results[reader.asset_id] = performers[assignment_id]
+        return performers[assignment_id]
+
+    @property
+    def result_asset_ids(self):
+        return self._results.keys()
+
+    def update_result(self, asset_id, db, encryption):
+        """
+        Fold new transactions of result asset (EstimationResult, TrainResult or VerificationResult)
+        :return: False if result does not belong to task declaration
+        """
+        try:
+            performer = self._results[asset_id]
+        except KeyError:
+            return False
+
+        reader = performer['reader']
+        if reader.model_class is EstimationResult:
+            fold = self._fold_estimation_result
+        elif reader.model_class is TrainResult:
+            fold = self._fold_train_result
+        else:
+            fold = self._fold_verification_result
+
+        for result in reader.read(db, encryption):
+            fold(performer, result)
+        return True
+
+    def _fold_task_declaration(self, td):
+        if td.loss and td.accuracy and td.state in (td.State.VERIFY_IN_PROGRESS, td.State.COMPLETED):
+            if td.state == td.State.VERIFY_IN_PROGRESS:
+                iteration = td.current_iteration - 1
+            else:
+                iteration = td.current_iteration
+
+            self._history[iteration] = {
+                'loss': td.loss,
+                'accuracy': td.accuracy,
+                'weights_ipfs': td.weights_ipfs
+            }
+
+    # noinspection PyMethodMayBeStatic
+    def _fold_estimation_result(self, estimator, er):
+        if er.state not in [EstimationResult.State.IN_PROGRESS, EstimationResult.State.FINISHED]:
+            return
+
+        estimator_data = estimator['current']
+        estimator_data['estimator_id'] = estimator['performer_id']
+        estimator_data['assignment_id'] = er.estimation_assignment_id
+        estimator_data['state'] = er.state
+        estimator_data['tflops'] = er.tflops
+        estimator_data['cost'] = er.tflops * settings.TFLOPS_COST
+
+        if er.state == EstimationResult.State.IN_PROGRESS and estimator_data['start_time'] is None:
+            estimator_data['start_time'] = er.modified_at
+
+        if er.state == EstimationResult.State.FINISHED:
+            estimator_data['end_time'] = er.modified_at
+
+    @staticmethod
+    def _new_train_data(worker):
+        return {
+            'worker_id': worker['performer_id'],
+            'assignment_id': worker['assignment_id'],
+            'start_time': None,
+            'end_time': None,
+            'duration': None,
+            'weights_ipfs': None,
+            'error': None
+        }
+
+    def _fold_train_result(self, worker, tr):
+        if tr.state not in (TrainResult.State.IN_PROGRESS, TrainResult.State.FINISHED):
+            return
+
+        train_data = worker['current']
+        train_data['state'] = tr.state
+        train_data['current_iteration'] = tr.current_iteration
+        train_data['progress'] = tr.progress
+        train_data['spent_tflops'] = tr.tflops
+        train_data['cost'] = tr.tflops * settings.TFLOPS_COST
+        train_data['loss'] = tr.loss
+        train_data['accuracy'] = tr.accuracy
+
+        iteration = self._get_iteration(tr.current_iteration)
+
+        if tr.state == TrainResult.State.IN_PROGRESS and train_data['start_time'] is None:
+            train_data['start_time'] = tr.modified_at
+            # update start time of iteration
+            if iteration['start_time'] is None or iteration['start_time'] > train_data['start_time']:
+                iteration['start_time'] = train_data['start_time']
+
+        if tr.state == TrainResult.State.FINISHED:
+            train_data['end_time'] = tr.modified_at
+            train_data['weights_ipfs'] = tr.weights_ipfs
+            train_data['error'] = tr.error
+
+            # update tflops
+            iteration['spent_tflops'] += train_data['spent_tflops']
+            iteration['cost'] += train_data['cost']
+
+            # save train data and refresh for next iteration
+            worker['finished'].append(train_data)
+            worker['current'] = self._new_train_data(worker)
+
+    @staticmethod
+    def _new_verification_data(verifier, weights_ipfs=None, error=None):
+        return {
+            'verifier_id': verifier['performer_id'],
+            'assignment_id': verifier['assignment_id'],
+            'start_time': None,
+            'end_time': None,
+            'duration': None,
+            'results': [],
+            'weights_ipfs': weights_ipfs,
+            'error': error
+        }
+
+    def _fold_verification_result(self, verifier, vr):
+        if vr.state not in (VerificationResult.State.IN_PROGRESS,
+                            VerificationResult.State.VERIFICATION_FINISHED,
+                            VerificationResult.State.FINISHED):
+            return
+
+        verification_data = verifier['current']
+        verification_data['state'] = vr.state
+        verification_data['current_iteration'] = vr.current_iteration
+        verification_data['progress'] = vr.progress
+        verification_data['spent_tflops'] = vr.tflops
+        verification_data['cost'] = vr.tflops * settings.TFLOPS_COST
+
+        if vr.state == VerificationResult.State.IN_PROGRESS and verification_data['start_time'] is None:
+            verification_data['start_time'] = vr.modified_at
+
+        if vr.state == VerificationResult.State.VERIFICATION_FINISHED:
+            results = vr.result
+
+            # keep fake workers in result from previous iteration retry
+            for prev_result in verification_data['results']:
+                found = False
+                for current_result in results:
+                    if prev_result['worker_id'] == current_result['worker_id']:
+                        found = True
+                        break
+                if not found:
+                    results.append(prev_result)
+
+            verification_data['results'] = results
+            verification_data['weights_ipfs'] = vr.weights_ipfs
+
+        if vr.state == VerificationResult.State.FINISHED:
+            verification_data['end_time'] = vr.modified_at
+
+            # update end time of iteration
+            iteration = self._get_iteration(vr.current_iteration)
+            if iteration['end_time'] is None or iteration['end_time'] < verification_data['end_time']:
+                iteration['end_time'] = verification_data['end_time']
+
+            # save verification data and refresh for next iteration
+            verifier['finished'].append(verification_data)
+            verifier['current'] = self._new_verification_data(
+                verifier, weights_ipfs=vr.weights_ipfs, error=vr.error)
+
+    @staticmethod
+    def _with_duration(record):
+        record = dict(record)
+        if record['start_time'] is not None:
+            end_time = record['end_time'] or datetime.datetime.utcnow().replace(tzinfo=record['start_time'].tzinfo)
+            record['duration'] = (end_time - record['start_time']).total_seconds()
+        return record
+
+    @classmethod
+    def _group_by_iteration(cls, performers):
+        info = {}
+        for performer in performers.values():
+            records = list(performer['finished'])
+            if performer['current'].get('state'):
+                # iteration is in progress
+                records.append(performer['current'])
+
+            for record in records:
+                record = cls._with_duration(record)
+                try:
+                    info[record['current_iteration']].append(record)
+                except KeyError:
+                    info[record['current_iteration']] = [record]
+        return info
+
+    def fill(self, data):
+        """
+        Fill "history", "estimators", "workers" and "verifiers" of progress info
+        """
+        for iteration, value in self._history.items():
+            history_data = dict(value)
+            history_data.update(self._get_iteration(iteration))
+            history_data['duration'] = None
+            data['history'][iteration] = history_data
+
+        for estimator in self._estimators.values():
+            data['estimators'].append(self._with_duration(estimator['current']))
+
+        data['workers'].update(self._group_by_iteration(self._workers))
+        data['verifiers'].update(self._group_by_iteration(self._verifiers))
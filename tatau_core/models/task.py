@@ -6,11 +6,12 @@ from tatau_core import settings, web3
 from tatau_core.contract import poa_wrapper
 from tatau_core.db import models, fields
 from tatau_core.models.dataset import Dataset
-from tatau_core.models.estimation import EstimationAssignment, EstimationResult
+from tatau_core.models.estimation import EstimationAssignment
 from tatau_core.models.nodes import ProducerNode
-from tatau_core.models.train import TaskAssignment, TrainResult
+from tatau_core.models.progress import ProgressSnapshot
+from tatau_core.models.train import TaskAssignment
 from tatau_core.models.train_model import TrainModel
-from tatau_core.models.verification import VerificationAssignment, VerificationResult
+from tatau_core.models.verification import VerificationAssignment
 from tatau_core.utils import cached_property
 
 logger = getLogger('tatau_core')
@@ -235,246 +236,34 @@ class TaskDeclaration(models.Model):
             'issue_required': issue_required
         }
 
-    def _add_history_info(self, data):
-        for td in TaskDeclaration.get_history(self.asset_id, db=self.db, encryption=self.encryption):
-            if td.loss and td.accuracy and td.state in (TaskDeclaration.State.VERIFY_IN_PROGRESS,
-                                                        TaskDeclaration.State.COMPLETED):
-                if td.state == TaskDeclaration.State.VERIFY_IN_PROGRESS:
-                    iteration = td.current_iteration - 1
-                else:
-                    iteration = td.current_iteration
-
-                data['history'][iteration] = {
-                    'loss': td.loss,
-                    'accuracy': td.accuracy,
-                    'spent_tflops': 0.0,
-                    'cost': 0.0,
-                    'start_time': None,
-                    'end_time': None,
-                    'duration': None,
-                    'weights_ipfs': td.weights_ipfs
-                }
-
-    def _add_estimation_info(self, data):
-        estimation_assignments = self.get_estimation_assignments(
-            states=(
-                EstimationAssignment.State.ESTIMATING,
-                EstimationAssignment.State.FINISHED
-            )
-        )
-
-        for estimation_assignment in estimation_assignments:
-            history = EstimationResult.get_history(
-                estimation_assignment.estimation_result_id, db=self.db, encryption=self.encryption)
-
-            estimator_data = {
-                'start_time': None,
-                'end_time': None,
-                'duration': None,
-            }
-
-            for er in history:
-                if er.state not in [EstimationResult.State.IN_PROGRESS, EstimationResult.State.FINISHED]:
-                    continue
-
-                estimator_data['estimator_id'] = estimation_assignment.estimator_id
-                estimator_data['assignment_id'] = er.estimation_assignment_id
-                estimator_data['state'] = er.state
-                estimator_data['tflops'] = er.tflops
-                estimator_data['cost'] = er.tflops * settings.TFLOPS_COST
-
-                if er.state == EstimationResult.State.IN_PROGRESS and estimator_data['start_time'] is None:
-                    estimator_data['start_time'] = er.modified_at
-
-                if er.state == EstimationResult.State.FINISHED:
-                    estimator_data['end_time'] = er.modified_at
-
-                end_time = estimator_data['end_time'] or datetime.datetime.utcnow().replace(
-                    tzinfo=er.modified_at.tzinfo)
-
-                estimator_data['duration'] = (end_time - estimator_data['start_time']).total_seconds()
-
-            data['estimators'].append(estimator_data)
-
-    def _add_train_info(self, data):
-        task_assignments = self.get_task_assignments(
-            states=(TaskAssignment.State.TRAINING, TaskAssignment.State.FINISHED, TaskAssignment.State.TIMEOUT,
-                    TaskAssignment.State.FAKE_RESULTS, TaskAssignment.State.FORGOTTEN)
-        )
-
-        train_info = data['workers']
-
-        for task_assignment in task_assignments:
-            history = TrainResult.get_history(task_assignment.train_result_id, db=self.db, encryption=self.encryption)
-
-            train_data = {
-                'worker_id': task_assignment.worker_id,
-                'assignment_id': task_assignment.asset_id,
-                'start_time': None,
-                'end_time': None,
-                'duration': None,
-                'weights_ipfs': None,
-                'error': None
-            }
-
-            for tr in history:
-                if tr.state not in (TrainResult.State.IN_PROGRESS, TrainResult.State.FINISHED):
-                    continue
-
-                train_data['state'] = tr.state
-                train_data['current_iteration'] = tr.current_iteration
-                train_data['progress'] = tr.progress
-                train_data['spent_tflops'] = tr.tflops
-                train_data['cost'] = tr.tflops * settings.TFLOPS_COST
-                train_data['loss'] = tr.loss
-                train_data['accuracy'] = tr.accuracy
-
-                if tr.state == TrainResult.State.IN_PROGRESS and train_data['start_time'] is None:
-                    train_data['start_time'] = tr.modified_at
-                    # update start time of iteration
-                    if data['history'].get(tr.current_iteration) and (
-                            data['history'][tr.current_iteration]['start_time'] is None or
-                            data['history'][tr.current_iteration]['start_time'] > train_data['start_time']):
-
-                        data['history'][tr.current_iteration]['start_time'] = train_data['start_time']
-
-                if tr.state == TrainResult.State.FINISHED:
-                    train_data['end_time'] = tr.modified_at
-                    train_data['weights_ipfs'] = tr.weights_ipfs
-                    train_data['error'] = tr.error
-
-                    # update tflops
-                    if data['history'].get(tr.current_iteration):
-                        data['history'][tr.current_iteration]['spent_tflops'] += train_data['spent_tflops']
-                        data['history'][tr.current_iteration]['cost'] += train_data['cost']
-
-                end_time = train_data['end_time'] or datetime.datetime.utcnow().replace(
-                    tzinfo=tr.modified_at.tzinfo)
-
-                train_data['duration'] = (end_time - train_data['start_time']).total_seconds()
-
-                if tr.state == TrainResult.State.FINISHED:
-                    # save train data and refresh for next iteration
-                    if train_info.get(train_data['current_iteration']) is None:
-                        train_info[train_data['current_iteration']] = [train_data]
-                    else:
-                        train_info[train_data['current_iteration']].append(train_data)
-
-                    train_data = {
-                        'worker_id': task_assignment.worker_id,
-                        'assignment_id': task_assignment.asset_id,
-                        'start_time': None,
-                        'end_time': None,
-                        'duration': None,
-                        'weights_ipfs': None,
-                        'error': None
-                    }
-
-            if train_data.get('state') and train_data['state'] != TrainResult.State.FINISHED:
-                if train_info.get(train_data['current_iteration']) is None:
-                    train_info[train_data['current_iteration']] = [train_data]
-                else:
-                    train_info[train_data['current_iteration']].append(train_data)
-
-    def _add_verification_info(self, data):
-        verification_assignments = self.get_verification_assignments(
-            states=(VerificationAssignment.State.VERIFYING, VerificationAssignment.State.FINISHED,
-                    VerificationAssignment.State.TIMEOUT, VerificationAssignment.State.FORGOTTEN)
-        )
-
-        verification_info = data['verifiers']
-
-        for verification_assignment in verification_assignments:
-            history = VerificationResult.get_history(
-                asset_id=verification_assignment.verification_result_id,
-                db=self.db,
-                encryption=self.encryption
-            )
-
-            verification_data = {
-                'verifier_id': verification_assignment.verifier_id,
-                'assignment_id': verification_assignment.asset_id,
-                'start_time': None,
-                'end_time': None,
-                'duration': None,
-                'results': [],
-                'weights_ipfs': None,
-                'error': None
-            }
-
-            for vr in history:
-                if vr.state not in (VerificationResult.State.IN_PROGRESS,
-                                    VerificationResult.State.VERIFICATION_FINISHED,
-                                    VerificationResult.State.FINISHED):
-                    continue
-
-                verification_data['state'] = vr.state
-                verification_data['current_iteration'] = vr.current_iteration
-                verification_data['progress'] = vr.progress
-                verification_data['spent_tflops'] = vr.tflops
-                verification_data['cost'] = vr.tflops * settings.TFLOPS_COST
-
-                if vr.state == VerificationResult.State.IN_PROGRESS and verification_data['start_time'] is None:
-                    verification_data['start_time'] = vr.modified_at
-
-                if vr.state == VerificationResult.State.VERIFICATION_FINISHED:
-                    results = vr.result
-
-                    # keep fake workers in result from previous iteration retry
-                    for prev_result in verification_data['results']:
-                        found = False
-                        for current_result in results:
-                            if prev_result['worker_id'] == current_result['worker_id']:
-                                found = True
-                                break
-                        if not found:
-                            results.append(prev_result)
-
-                    verification_data['results'] = results
-                    verification_data['weights_ipfs'] = vr.weights_ipfs
-
-                if vr.state == VerificationResult.State.FINISHED:
-                    verification_data['end_time'] = vr.modified_at
-
-                    # update end time of iteration
-                    if data['history'].get(vr.current_iteration) and (
-                            data['history'][vr.current_iteration]['end_time'] is None or
-                            data['history'][vr.current_iteration]['end_time'] < verification_data['end_time']):
-
-                        data['history'][vr.current_iteration]['end_time'] = verification_data['end_time']
-
-                end_time = verification_data['end_time'] or datetime.datetime.utcnow().replace(
-                    tzinfo=vr.modified_at.tzinfo)
-
-                verification_data['duration'] = (end_time - verification_data['start_time']).total_seconds()
-
-                if vr.state == VerificationResult.State.FINISHED:
-                    # save train data and refresh for next iteration
-
-                    if verification_info.get(verification_data['current_iteration']) is None:
-                        verification_info[verification_data['current_iteration']] = [verification_data]
-                    else:
-                        verification_info[verification_data['current_iteration']].append(verification_data)
-
-                    verification_data = {
-                        'verifier_id': verification_assignment.verifier_id,
-                        'assignment_id': verification_assignment.asset_id,
-                        'start_time': None,
-                        'end_time': None,
-                        'duration': None,
-                        'results': [],
-                        'weights_ipfs': vr.weights_ipfs,
-                        'error': vr.error
-                    }
-
-            if verification_data.get('state') and verification_data['state'] != VerificationResult.State.FINISHED:
-                if verification_info.get(verification_data['current_iteration']) is None:
-                    verification_info[verification_data['current_iteration']] = [verification_data]
-                else:
-                    verification_info[verification_data['current_iteration']].append(verification_data)
+    def update_progress_snapshot(self) -> ProgressSnapshot:
+        """
+        Fold transactions committed since previous save into persisted progress snapshot, snapshot is not saved
+        :return: updated snapshot
+        """
+        snapshot = ProgressSnapshot.load(self.asset_id)
+        snapshot.update(self)
+        return snapshot
+
+    def save_progress_snapshot(self) -> ProgressSnapshot:
+        """
+        Update persisted progress snapshot and save it
+        :return: updated snapshot
+        """
+        snapshot = self.update_progress_snapshot()
+        snapshot.save()
+        return snapshot
 
     @property
     def progress_info(self):
+        return self.get_progress_info(snapshot=self.update_progress_snapshot())
+
+    def get_progress_info(self, snapshot: ProgressSnapshot):
+        """
+        Build progress info from already updated snapshot
+        :param snapshot: progress snapshot of this task declaration
+        :return: progress info
+        """
         data = {
             'asset_id': self.asset_id,
             'dataset': self.dataset.name,
@@ -507,10 +296,7 @@ class TaskDeclaration(models.Model):
             'weights_ipfs': self.weights_ipfs
         }
 
-        self._add_history_info(data)
-        self._add_estimation_info(data)
-        self._add_train_info(data)
-        self._add_verification_info(data)
+        snapshot.fill(data)
 
         # update duration of iterations
         for iteration, iteration_data in data['history'].items():
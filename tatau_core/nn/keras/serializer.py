@@ -10,6 +10,10 @@ class WeightsSerializer(serializer.WeightsSerializer):
         np.savez_compressed(path_npz, *weights)
         rename(path_npz, path)
 
+    @classmethod
+    def write(cls, weights, f):
+        np.savez_compressed(f, *weights)
+
     @classmethod
     def load(cls, path):
         weights_file = np.load(path)
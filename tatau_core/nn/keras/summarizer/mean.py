@@ -1,19 +1,11 @@
-from tatau_core.nn.tatau.summarizer import Summarizer
-import numpy as np
+from tatau_core.nn.tatau.summarizer import RunningMean
+from .weights import StreamingWeightsSummarizer
 
 
-class Mean(Summarizer):
+class Mean(StreamingWeightsSummarizer):
     """
-    Mean Weights Summarizer
+    Mean Weights Summarizer, weights are added to running sums when they are loaded
     """
 
-    def summarize(self, updates):
-        new_weights = list()
-        for weights_list_tuple in zip(*updates):
-            new_weights.append(
-                [
-                    np.mean(np.array(weights_), axis=0, dtype=self.dtype)
-                    for weights_ in zip(*weights_list_tuple)
-                ]
-            )
-        return new_weights
+    def create_aggregator(self):
+        return RunningMean()
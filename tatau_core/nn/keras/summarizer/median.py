@@ -1,22 +1,12 @@
-from tatau_core.nn.tatau.summarizer import Summarizer
-import numpy as np
+from tatau_core.nn.tatau.summarizer import OutOfCoreMedian
+from .weights import StreamingWeightsSummarizer
 
 
-class Median(Summarizer):
+class Median(StreamingWeightsSummarizer):
     """
-    Median Weights Summarizer
+    Median Weights Summarizer, weights are kept in scratch file, so weights of all workers do not have to fit into
+    memory
     """
 
-    def summarize(self, updates):
-        if not len(updates):
-            raise RuntimeError("No updates")
-
-        new_weights = list()
-        for weights_list_tuple in zip(*updates):
-            new_weights.append(
-                [
-                    np.median(a=np.array(weights_, dtype=self.dtype), axis=0)
-                    for weights_ in zip(*weights_list_tuple)
-                ]
-            )
-        return new_weights
+    def create_aggregator(self):
+        return OutOfCoreMedian()
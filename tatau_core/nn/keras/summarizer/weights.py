@@ -0,0 +1,33 @@
+from abc import abstractmethod
+
+from tatau_core.nn.tatau.summarizer import StreamingSummarizer, Aggregator
+
+
+class StreamingWeightsSummarizer(StreamingSummarizer):
+    """
+    Weights Summarizer which adds weights to aggregator when they are loaded, weights are not kept
+    """
+
+    @abstractmethod
+    def create_aggregator(self) -> Aggregator:
+        pass
+
+    def reset(self):
+        aggregator = getattr(self, '_aggregator', None)
+        if aggregator is not None:
+            aggregator.close()
+
+        self._shape = None
+        self._aggregator = self.create_aggregator()
+
+    def fold(self, weights):
+        self._shape = [len(layer) for layer in weights]
+        self._aggregator.add_all([((i, j), array) for i, layer in enumerate(weights) for j, array in enumerate(layer)])
+
+    def result(self):
+        if self._shape is None:
+            raise RuntimeError("No updates")
+
+        keys = [(i, j) for i, size in enumerate(self._shape) for j in range(size)]
+        results = iter(self._aggregator.results(keys, dtype=self.dtype))
+        return [[next(results) for _ in range(size)] for size in self._shape]
@@ -0,0 +1,109 @@
+import os
+
+import numpy as np
+
+
+class BatchTransform:
+    """
+    Transform of whole batch of samples, batch is numpy array NHWC. Datasets apply batch transforms by one call per
+    batch instead of call per sample.
+    """
+
+    def __init__(self):
+        self._random_state = None
+        self._pid = None
+
+    @property
+    def random_state(self):
+        # DataLoader workers are forked, each worker must have own random state
+        if self._pid != os.getpid():
+            self._random_state = np.random.RandomState()
+            self._pid = os.getpid()
+        return self._random_state
+
+    def __call__(self, batch: np.ndarray) -> np.ndarray:
+        raise NotImplementedError()
+
+    def __repr__(self):
+        # repr is fingerprint of transform in caches, so it contains all parameters
+        params = ', '.join('{}={!r}'.format(k, v) for k, v in sorted(self.__dict__.items()) if not k.startswith('_'))
+        return '{}({})'.format(type(self).__name__, params)
+
+
+class Compose(BatchTransform):
+    def __init__(self, transforms):
+        super(Compose, self).__init__()
+        self.transforms = transforms
+
+    def __call__(self, batch):
+        for transform in self.transforms:
+            batch = transform(batch)
+        return batch
+
+
+class RandomCrop(BatchTransform):
+    """
+    Crop every sample at random position, samples are padded by zeros before crop
+    """
+
+    def __init__(self, size, padding=0):
+        super(RandomCrop, self).__init__()
+        self.size = (size, size) if isinstance(size, int) else tuple(size)
+        self.padding = padding
+
+    def __call__(self, batch):
+        if self.padding:
+            pad = [(0, 0), (self.padding, self.padding), (self.padding, self.padding)] + [(0, 0)] * (batch.ndim - 3)
+            batch = np.pad(batch, pad, mode='constant')
+
+        n, h, w = batch.shape[:3]
+        th, tw = self.size
+        top = self.random_state.randint(0, h - th + 1, size=n)
+        left = self.random_state.randint(0, w - tw + 1, size=n)
+        rows = (top[:, None] + np.arange(th))[:, :, None]
+        cols = (left[:, None] + np.arange(tw))[:, None, :]
+        return batch[np.arange(n)[:, None, None], rows, cols]
+
+
+class RandomHorizontalFlip(BatchTransform):
+    def __init__(self, p=0.5):
+        super(RandomHorizontalFlip, self).__init__()
+        self.p = p
+
+    def __call__(self, batch):
+        batch = np.array(batch, copy=True)
+        flip = self.random_state.random_sample(len(batch)) < self.p
+        batch[flip] = batch[flip][:, :, ::-1]
+        return batch
+
+
+class ToCHW(BatchTransform):
+    """
+    Convert NHWC (or NHW) batch to float32 NCHW and scale it, as torchvision ToTensor does for uint8 images
+    """
+
+    def __init__(self, scale=1. / 255):
+        super(ToCHW, self).__init__()
+        self.scale = scale
+
+    def __call__(self, batch):
+        if batch.ndim == 3:
+            batch = batch[:, :, :, None]
+        batch = np.ascontiguousarray(batch.transpose(0, 3, 1, 2), dtype=np.float32)
+        if self.scale != 1:
+            batch *= self.scale
+        return batch
+
+
+class Normalize(BatchTransform):
+    """
+    Normalize NCHW batch by mean and std of channels
+    """
+
+    def __init__(self, mean, std):
+        super(Normalize, self).__init__()
+        self.mean = np.asarray(mean, dtype=np.float32).reshape(1, -1, 1, 1)
+        self.std = np.asarray(std, dtype=np.float32).reshape(1, -1, 1, 1)
+
+    def __call__(self, batch):
+        return (batch - self.mean) / self.std
@@ -1,17 +1,26 @@
 import abc
 import os
 import pickle
+import time
 from logging import getLogger
 
 import numpy as np
-from torch.utils.data import Dataset as TorchDataset, ConcatDataset, DataLoader
+import torch
+from PIL import Image
+from torch.utils.data import Dataset as TorchDataset, ConcatDataset, DataLoader, Sampler, BatchSampler
+from torch.utils.data.dataloader import default_collate
 from torchvision.datasets.folder import default_loader, find_classes, make_dataset, IMG_EXTENSIONS
 
+from tatau_core.nn.tatau.batch_transforms import BatchTransform
+from tatau_core.nn.tatau.loader_calibration import LoaderCalibration
+from tatau_core.utils.packed_chunk import PackedChunk, is_packed_chunk_dir, FILE_NAME as PACKED_CHUNK_FILE_NAME
+
 logger = getLogger(__name__)
 
 
 class ChunkedDataset(TorchDataset):
     def __init__(self, chunk_dir, transform=None):
+        self.chunk_dir = chunk_dir
         self._transform = transform
         self._x, self._y = self.open_chunk(chunk_dir)
 
@@ -27,17 +36,72 @@ class NumpyDataset(ChunkedDataset):
         super(NumpyDataset, self).__init__(chunk_dir=chunk_dir, transform=transform)
 
     def open_chunk(self, chunk_dir):
+        if is_packed_chunk_dir(chunk_dir):
+            chunk = PackedChunk(os.path.join(chunk_dir, PACKED_CHUNK_FILE_NAME), mmap_mode=self._mmap_mode)
+            return chunk.array('x'), chunk.array('y')
+
         x = np.load(os.path.join(chunk_dir, "x.npy"), mmap_mode=self._mmap_mode)
         y = np.load(os.path.join(chunk_dir, "y.npy"), mmap_mode=self._mmap_mode)
         return x, y
 
     def __getitem__(self, index):
-        x = self._x[index] if self._transform is None else self._transform(self._x[index])
+        if self._transform is None:
+            x = self._x[index]
+        elif isinstance(self._transform, BatchTransform):
+            x = self._transform(np.asarray(self._x[index])[None])[0]
+        else:
+            x = self._transform(self._x[index])
         return x, self._y[index]
 
     def __len__(self):
         return len(self._x)
 
+    def read_batch(self, indices):
+        """
+        Read samples by one fancy indexing call without transform
+        :return: x, y numpy arrays
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        return self._x[indices], self._y[indices]
+
+    def get_batch(self, indices):
+        return make_batch(*self.read_batch(indices), transform=self._transform)
+
+
+def make_batch(x, y, transform=None):
+    """
+    Apply transform to batch and convert it to tensors. Batch transform is applied to whole batch, other transform is
+    applied to each sample.
+    :return: x, y tensors
+    """
+    if isinstance(transform, BatchTransform):
+        x = transform(x)
+    elif transform is not None:
+        x = default_collate([transform(sample) for sample in x])
+
+    if not torch.is_tensor(x):
+        x = torch.from_numpy(np.ascontiguousarray(x))
+    return x, torch.from_numpy(np.ascontiguousarray(y))
+
+
+def _read_grouped_batch(items, get_chunk):
+    """
+    Read batch of (chunk index, index in chunk) items by one read per chunk, order of items is kept
+    """
+    chunk_indices = np.asarray([x[0] for x in items], dtype=np.int64)
+    indices = np.asarray([x[1] for x in items], dtype=np.int64)
+
+    xs, ys, positions = [], [], []
+    for chunk_index in np.unique(chunk_indices):
+        mask = chunk_indices == chunk_index
+        x, y = get_chunk(int(chunk_index)).read_batch(indices[mask])
+        xs.append(x)
+        ys.append(y)
+        positions.append(np.flatnonzero(mask))
+
+    order = np.argsort(np.concatenate(positions), kind='stable')
+    return np.concatenate(xs)[order], np.concatenate(ys)[order]
+
 
 class NumpyChunkedDataset(ConcatDataset):
     def __init__(self, chunk_dirs, mmap_mode='r', transform=None):
@@ -47,6 +111,262 @@ class NumpyChunkedDataset(ConcatDataset):
                 for chunk_dir in chunk_dirs
             ]
         )
+        self._transform = transform
+
+    def get_batch(self, indices):
+        """
+        Read batch by one fancy indexing call per chunk and apply transform to whole batch
+        :param indices: global indices of samples
+        :return: x, y tensors
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        chunk_indices = np.searchsorted(self.cumulative_sizes, indices, side='right')
+        offsets = np.concatenate([[0], self.cumulative_sizes[:-1]]).astype(np.int64)
+        items = zip(chunk_indices, indices - offsets[chunk_indices])
+        x, y = _read_grouped_batch(list(items), lambda chunk_index: self.datasets[chunk_index])
+        return make_batch(x, y, transform=self._transform)
+
+
+class StreamingChunkDirs(list):
+    """
+    List of chunk dirs which are still downloading, chunk dir appears when chunk is downloaded completely.
+    If download of chunk is failed, then file "<chunk dir>.failed" appears.
+    """
+    def __init__(self, chunk_dirs=(), seed=0):
+        super(StreamingChunkDirs, self).__init__(chunk_dirs)
+        self.seed = seed
+
+    @staticmethod
+    def failed_marker(chunk_dir):
+        return '{}.failed'.format(chunk_dir)
+
+    @classmethod
+    def wait_chunk_dir(cls, chunk_dir, timeout=None, poll_interval=0.1):
+        started_at = time.time()
+        while not os.path.exists(chunk_dir):
+            if os.path.exists(cls.failed_marker(chunk_dir)):
+                raise RuntimeError('Download of chunk {} is failed'.format(chunk_dir))
+
+            if timeout is not None and time.time() - started_at > timeout:
+                raise TimeoutError('Chunk {} is not downloaded in {}s'.format(chunk_dir, timeout))
+
+            time.sleep(poll_interval)
+
+
+class StreamingNumpyChunkedDataset(TorchDataset):
+    """
+    Numpy chunked dataset which grows while chunks are downloading.
+
+    Items are addressed by (chunk index, index in chunk), so items of chunk can be read by DataLoader workers which
+    were started before chunk was downloaded. Use with StreamingChunkSampler.
+    """
+    def __init__(self, chunk_dirs: StreamingChunkDirs, mmap_mode='r', transform=None):
+        self.chunk_dirs = chunk_dirs
+        self._mmap_mode = mmap_mode
+        self._transform = transform
+        self._chunks = {}
+
+    def get_chunk(self, chunk_index) -> NumpyDataset:
+        try:
+            return self._chunks[chunk_index]
+        except KeyError:
+            chunk_dir = self.chunk_dirs[chunk_index]
+            StreamingChunkDirs.wait_chunk_dir(chunk_dir)
+            self._chunks[chunk_index] = NumpyDataset(
+                chunk_dir=chunk_dir, mmap_mode=self._mmap_mode, transform=self._transform)
+            return self._chunks[chunk_index]
+
+    def __getitem__(self, item):
+        chunk_index, index = item
+        return self.get_chunk(chunk_index)[index]
+
+    def get_batch(self, items):
+        """
+        Read batch of (chunk index, index in chunk) items by one fancy indexing call per chunk
+        :return: x, y tensors
+        """
+        x, y = _read_grouped_batch(items, self.get_chunk)
+        return make_batch(x, y, transform=self._transform)
+
+    @property
+    def is_complete(self):
+        """
+        All chunks are opened, length of dataset is known
+        """
+        return len(self._chunks) == len(self.chunk_dirs)
+
+    def __len__(self):
+        """
+        Length of opened chunks, it is partial in first epoch, chunk lengths are not known before chunks are
+        downloaded. It is full length when is_complete.
+        """
+        return sum(len(x) for x in self._chunks.values())
+
+
+def streaming_chunk_order(count, seed):
+    """
+    Order of chunks in first epoch of StreamingChunkSampler, it is order of download of chunks
+    :param count: count of chunks
+    :param seed: seed of sampler, e.g. iteration
+    :return: array of chunk indices
+    """
+    return np.random.RandomState(seed=seed % (2 ** 32)).permutation(count)
+
+
+def iter_chunk_windows(lengths, window, random_state):
+    """
+    Locality-aware shuffle of chunked dataset. Chunks are shuffled, then samples are shuffled inside of each window of
+    "window" consecutive chunks, so reads touch only chunks of current window while every sample still can be moved
+    to any position of its window.
+    :param lengths: lengths of chunks
+    :param window: count of chunks in window
+    :param random_state: numpy RandomState
+    :return: iterator of (chunk index, index in chunk)
+    """
+    chunk_order = random_state.permutation(len(lengths))
+    for start in range(0, len(chunk_order), window):
+        chunk_indices = chunk_order[start:start + window]
+        window_lengths = [lengths[x] for x in chunk_indices]
+        offsets = np.cumsum([0] + window_lengths)
+        window_indices = random_state.permutation(int(offsets[-1]))
+        positions = np.searchsorted(offsets, window_indices, side='right') - 1
+        for item in zip(chunk_indices[positions].tolist(), (window_indices - offsets[positions]).tolist()):
+            yield item
+
+
+class ChunkWindowSampler(Sampler):
+    """
+    Deterministic locality-aware shuffling sampler of NumpyChunkedDataset, see iter_chunk_windows.
+    Order depends only on seed (iteration) and epoch.
+    """
+    def __init__(self, dataset: NumpyChunkedDataset, window=8, seed=0):
+        super(ChunkWindowSampler, self).__init__(data_source=dataset)
+        self.dataset = dataset
+        self.window = window
+        self.seed = seed
+        self.epoch = 0
+
+    def __iter__(self):
+        random_state = np.random.RandomState(seed=(self.seed * 1000 + self.epoch) % (2 ** 32))
+        self.epoch += 1
+
+        lengths = [len(x) for x in self.dataset.datasets]
+        offsets = [0] + self.dataset.cumulative_sizes[:-1]
+        for chunk_index, index in iter_chunk_windows(lengths, self.window, random_state):
+            yield offsets[chunk_index] + index
+
+    def __len__(self):
+        return len(self.dataset)
+
+
+class StreamingChunkSampler(Sampler):
+    """
+    Deterministic sampler of StreamingNumpyChunkedDataset.
+
+    First epoch reads chunks in order of streaming_chunk_order, chunks should be downloaded in this order. Samples are
+    shuffled inside of each window of "window" chunks, window is read as soon as its chunks are downloaded. If all
+    chunks are downloaded already, first epoch is shuffled as next epochs by iter_chunk_windows. Order depends only on
+    seed and epoch, not on order of download completion.
+    """
+    def __init__(self, dataset: StreamingNumpyChunkedDataset, window=8, seed=None):
+        super(StreamingChunkSampler, self).__init__(data_source=dataset)
+        self.dataset = dataset
+        self.window = window
+        self.seed = dataset.chunk_dirs.seed if seed is None else seed
+        self.epoch = 0
+
+    def _iter_first_epoch(self, random_state):
+        if all(os.path.exists(x) for x in self.dataset.chunk_dirs):
+            # chunks are in content store already
+            return self._iter_epoch(random_state)
+        return self._iter_downloading(random_state)
+
+    def _iter_downloading(self, random_state):
+        chunk_order = streaming_chunk_order(len(self.dataset.chunk_dirs), self.seed)
+        for start in range(0, len(chunk_order), self.window):
+            chunk_indices = chunk_order[start:start + self.window]
+            lengths = [len(self.dataset.get_chunk(x)) for x in chunk_indices]
+            for position, index in iter_chunk_windows(lengths, len(lengths), random_state):
+                yield int(chunk_indices[position]), index
+
+    def _iter_epoch(self, random_state):
+        lengths = [len(self.dataset.get_chunk(x)) for x in range(len(self.dataset.chunk_dirs))]
+        return iter_chunk_windows(lengths, self.window, random_state)
+
+    def __iter__(self):
+        random_state = np.random.RandomState(seed=(self.seed * 1000 + self.epoch) % (2 ** 32))
+        if self.epoch == 0:
+            iterator = self._iter_first_epoch(random_state)
+        else:
+            iterator = self._iter_epoch(random_state)
+        self.epoch += 1
+        return iterator
+
+    def __len__(self):
+        return len(self.dataset)
+
+
+class DecodedImageCache:
+    """
+    Cache of decoded images resized to "size" short side, images are stored as uint8 RGB pixels in one memory mapped
+    file, index keeps offset and shape of each image. Images are decoded on first access, so cache is filled during
+    first epoch by DataLoader workers, later epochs read raw pixels without decode.
+
+    Files next to chunk dir:
+        <chunk name>.pixels - pixels of all images
+        <chunk name>.pixels.filled - flag per image, image is decoded
+        <chunk name>.pixels.index.npy - offset, height and width of images
+    """
+
+    def __init__(self, cache_path, paths, size):
+        self.size = size
+        self._pixels_path = cache_path
+        self._filled_path = '{}.filled'.format(cache_path)
+        self._index_path = '{}.index.npy'.format(cache_path)
+
+        if not os.path.exists(self._index_path):
+            self._create(paths)
+
+        self._index = np.load(self._index_path)
+        self._pixels = np.memmap(self._pixels_path, dtype=np.uint8, mode='r+')
+        self._filled = np.memmap(self._filled_path, dtype=np.uint8, mode='r+')
+
+    def resized_shape(self, width, height):
+        if width < height:
+            return int(self.size * height / width), self.size
+        return self.size, int(self.size * width / height)
+
+    def _create(self, paths):
+        logger.info('Create decoded images cache: {}'.format(self._pixels_path))
+        index = np.zeros((len(paths), 3), dtype=np.int64)
+        offset = 0
+        for i, path in enumerate(paths):
+            # only header is read
+            with Image.open(path) as img:
+                height, width = self.resized_shape(*img.size)
+            index[i] = (offset, height, width)
+            offset += height * width * 3
+
+        with open(self._pixels_path, 'wb') as f:
+            f.truncate(max(offset, 1))
+        with open(self._filled_path, 'wb') as f:
+            f.truncate(max(len(paths), 1))
+
+        # index is written last, cache exists when index exists
+        tmp_path = '{}.tmp.npy'.format(self._index_path[:-len('.npy')])
+        np.save(tmp_path, index)
+        os.rename(tmp_path, self._index_path)
+
+    def get(self, index, path, loader):
+        offset, height, width = (int(x) for x in self._index[index])
+        pixels = self._pixels[offset:offset + height * width * 3].reshape(height, width, 3)
+        if self._filled[index]:
+            return Image.fromarray(np.array(pixels))
+
+        img = loader(path).convert('RGB').resize((width, height), Image.BILINEAR)
+        pixels[:] = np.asarray(img, dtype=np.uint8)
+        self._filled[index] = 1
+        return img
 
 
 class CachedFolderDataset(TorchDataset):
@@ -69,6 +389,8 @@ class CachedFolderDataset(TorchDataset):
             E.g, ``transforms.RandomCrop`` for images.
         target_transform (callable, optional): A function/transform that takes
             in the target and transforms it.
+        decoded_size (int, optional): If set, images are decoded once, resized to this
+            short side and cached as raw pixels next to root, see DecodedImageCache.
 
      Attributes:
         classes (list): List of the class names.
@@ -76,7 +398,7 @@ class CachedFolderDataset(TorchDataset):
         samples (list): List of (sample path, class_index) tuples
     """
 
-    def __init__(self, root, loader, extensions, transform=None, target_transform=None):
+    def __init__(self, root, loader, extensions, transform=None, target_transform=None, decoded_size=None):
         chunk_name = os.path.basename(root)
         chunk_dir = os.path.dirname(root)
         self._cache_path = os.path.join(chunk_dir, "{}.cache".format(chunk_name))
@@ -118,6 +440,14 @@ class CachedFolderDataset(TorchDataset):
         self.transform = transform
         self.target_transform = target_transform
 
+        self.decoded_cache = None
+        if decoded_size is not None:
+            self.decoded_cache = DecodedImageCache(
+                cache_path=os.path.join(chunk_dir, "{}.{}.pixels".format(chunk_name, decoded_size)),
+                paths=[x[0] for x in samples],
+                size=decoded_size
+            )
+
     def __getitem__(self, index):
         """
         Args:
@@ -127,7 +457,10 @@ class CachedFolderDataset(TorchDataset):
             tuple: (sample, target) where target is class_index of the target class.
         """
         path, target = self.samples[index]
-        sample = self.loader(path)
+        if self.decoded_cache is not None:
+            sample = self.decoded_cache.get(index, path, self.loader)
+        else:
+            sample = self.loader(path)
         if self.transform is not None:
             sample = self.transform(sample)
         if self.target_transform is not None:
@@ -150,7 +483,7 @@ class CachedFolderDataset(TorchDataset):
 
 
 class CachedImageFolder(CachedFolderDataset):
-    def __init__(self, root, transform=None, target_transform=None, loader=default_loader):
+    def __init__(self, root, transform=None, target_transform=None, loader=default_loader, decoded_size=None):
         """A generic data loader where the images are arranged in this way: ::
 
             root/dog/xxx.png
@@ -168,6 +501,8 @@ class CachedImageFolder(CachedFolderDataset):
             target_transform (callable, optional): A function/transform that takes in the
                 target and transforms it.
             loader (callable, optional): A function to load an image given its path.
+            decoded_size (int, optional): Short side of images in decoded images cache,
+                cache is not used if None.
 
          Attributes:
             classes (list): List of the class names.
@@ -176,15 +511,64 @@ class CachedImageFolder(CachedFolderDataset):
         """
         super(CachedImageFolder, self).__init__(root, loader, IMG_EXTENSIONS,
                                                 transform=transform,
-                                                target_transform=target_transform)
+                                                target_transform=target_transform,
+                                                decoded_size=decoded_size)
         self.imgs = self.samples
 
 
 class AutoDataLoader(DataLoader):
     """
-    Basic data loader with automatic tune num_workers
+    Basic data loader with automatic tune num_workers and pin_memory by calibration on dataset, see LoaderCalibration
     """
-    def __init__(self, *args, **kwargs):
-        kwargs['num_workers'] = os.cpu_count()
+    def __init__(self, *args, cache_key=None, **kwargs):
+        """
+        :param cache_key: key of calibration cache, e.g. hash of model code
+        """
+        if 'num_workers' not in kwargs:
+            kwargs.update(LoaderCalibration().get_params(args, kwargs, cache_key=cache_key))
         logger.info("Data Loader use {} workers".format(kwargs['num_workers']))
         super(AutoDataLoader, self).__init__(*args, **kwargs)
+
+
+class SortedBatchSampler(BatchSampler):
+    """
+    Batch sampler which sorts indices of each batch, so batch is read from chunks and files sequentially.
+    Order of samples inside of batch does not affect training.
+    """
+    def __iter__(self):
+        for batch in super(SortedBatchSampler, self).__iter__():
+            yield sorted(batch)
+
+
+class _BatchFetchDataset(TorchDataset):
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def __getitem__(self, indices):
+        return self.dataset.get_batch(indices)
+
+    @property
+    def is_complete(self):
+        return getattr(self.dataset, 'is_complete', True)
+
+    def __len__(self):
+        return len(self.dataset)
+
+
+def _unpack_batch(batch):
+    return batch[0]
+
+
+class BatchFetchDataLoader(AutoDataLoader):
+    """
+    Data loader of dataset with get_batch method, every batch is read by one get_batch call in worker, so there are
+    no per sample reads and collate.
+    """
+    def __init__(self, dataset, sampler, batch_size, drop_last=False, **kwargs):
+        super(BatchFetchDataLoader, self).__init__(
+            dataset=_BatchFetchDataset(dataset),
+            sampler=SortedBatchSampler(sampler, batch_size=batch_size, drop_last=drop_last),
+            batch_size=1,
+            collate_fn=_unpack_batch,
+            **kwargs
+        )
@@ -0,0 +1,154 @@
+import hashlib
+import os
+import shutil
+from logging import getLogger
+
+import numpy as np
+from torch.utils.data import SequentialSampler
+
+from tatau_core import settings
+from tatau_core.nn.tatau.dataset import NumpyDataset, BatchFetchDataLoader
+from tatau_core.utils.misc import get_dir_size
+
+logger = getLogger('tatau_core')
+
+
+class EvalInputCache:
+    """
+    Host-wide cache of test chunks after eval transform.
+
+    Test chunks and eval transform are the same on every iteration, so transformed samples are written once to
+    x.npy and y.npy of cache entry and next evaluations read them by mmap without transform. Entry is keyed by content
+    of chunk (multihash of chunk in content store), hash of model code and fingerprint of transform. Only transforms
+    with stable repr and without random operations or lambdas are cached. Least recently used entries are removed when size of cache exceeds
+    budget.
+    """
+
+    def __init__(self, root_dir=None, budget=None):
+        self.root_dir = root_dir or settings.EVAL_CACHE_DIR
+        self.budget = budget if budget is not None else settings.EVAL_CACHE_BUDGET_MB * 1024 * 1024
+        self._entries_dir = os.path.join(self.root_dir, 'entries')
+        self._tmp_dir = os.path.join(self.root_dir, 'tmp')
+        for path in [self._entries_dir, self._tmp_dir]:
+            os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def transform_fingerprint(transform):
+        """
+        :return: fingerprint of transform, None if transform can't be cached
+        """
+        if transform is None:
+            return None
+
+        description = repr(transform)
+        # default repr contains address of object, it is different in every process, random transforms give
+        # different samples on every evaluation, repr of Lambda does not describe its function
+        if ' at 0x' in description or 'Random' in description or 'Lambda' in description:
+            return None
+        return hashlib.sha1(description.encode()).hexdigest()
+
+    @staticmethod
+    def content_id(chunk_dir):
+        """
+        Chunk of content store is identified by multihash, other dir is identified by path and stat of its files
+        """
+        path = os.path.realpath(chunk_dir)
+        if os.path.basename(os.path.dirname(path)) == 'objects':
+            return os.path.basename(path)
+
+        stats = [path]
+        for name in sorted(os.listdir(path)):
+            stat = os.stat(os.path.join(path, name))
+            stats.append('{}:{}:{}'.format(name, stat.st_size, stat.st_mtime))
+        return hashlib.sha1('\n'.join(stats).encode()).hexdigest()
+
+    def _build(self, chunk_dir, transform, entry_dir, batch_size, cache_key):
+        logger.info('Build eval cache of {}'.format(chunk_dir))
+        dataset = NumpyDataset(chunk_dir=chunk_dir, transform=transform)
+        loader = BatchFetchDataLoader(
+            dataset=dataset, sampler=SequentialSampler(dataset), batch_size=batch_size, pin_memory=False,
+            cache_key=cache_key)
+
+        tmp_dir = os.path.join(self._tmp_dir, '{}.{}'.format(os.path.basename(entry_dir), os.getpid()))
+        os.makedirs(tmp_dir, exist_ok=True)
+        try:
+            x_cache, y_cache = None, None
+            position = 0
+            for x, y in loader:
+                x, y = x.numpy(), y.numpy()
+                if x_cache is None:
+                    x_cache = np.lib.format.open_memmap(
+                        os.path.join(tmp_dir, 'x.npy'), mode='w+', dtype=x.dtype, shape=(len(dataset),) + x.shape[1:])
+                    y_cache = np.lib.format.open_memmap(
+                        os.path.join(tmp_dir, 'y.npy'), mode='w+', dtype=y.dtype, shape=(len(dataset),) + y.shape[1:])
+                x_cache[position:position + len(x)] = x
+                y_cache[position:position + len(y)] = y
+                position += len(x)
+
+            if x_cache is None:
+                return False
+
+            x_cache.flush()
+            y_cache.flush()
+            del x_cache, y_cache
+
+            try:
+                os.rename(tmp_dir, entry_dir)
+            except OSError:
+                # entry is built by another process
+                pass
+            return True
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def get(self, chunk_dirs, transform, batch_size, cache_key=None):
+        """
+        :param cache_key: hash of model code, transform of the same repr can be defined differently by other model
+        :return: dirs of transformed chunks, None if transform can't be cached
+        """
+        fingerprint = self.transform_fingerprint(transform)
+        if fingerprint is None or cache_key is None:
+            return None
+
+        cached_dirs = []
+        for chunk_dir in chunk_dirs:
+            key = hashlib.sha1(
+                '{}:{}:{}'.format(self.content_id(chunk_dir), cache_key, fingerprint).encode()).hexdigest()
+            entry_dir = os.path.join(self._entries_dir, key)
+            if os.path.exists(entry_dir):
+                logger.info('Eval cache of {} is found'.format(chunk_dir))
+            elif not self._build(chunk_dir, transform, entry_dir, batch_size, cache_key):
+                # empty chunk
+                continue
+
+            os.utime(entry_dir)
+            cached_dirs.append(entry_dir)
+
+        self.evict(keep=cached_dirs)
+        return cached_dirs
+
+    def evict(self, keep=()):
+        """
+        Remove least recently used entries while size of cache exceeds budget
+        """
+        entries = []
+        total_size = 0
+        for name in os.listdir(self._entries_dir):
+            path = os.path.join(self._entries_dir, name)
+            try:
+                accessed_at = os.path.getmtime(path)
+                size = get_dir_size(path)
+            except FileNotFoundError:
+                continue
+            entries.append((accessed_at, path, size))
+            total_size += size
+
+        for accessed_at, path, size in sorted(entries):
+            if total_size <= self.budget:
+                break
+            if path in keep:
+                continue
+
+            logger.info('Evict {} from eval cache'.format(path))
+            shutil.rmtree(path, ignore_errors=True)
+            total_size -= size
@@ -0,0 +1,220 @@
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+from logging import getLogger
+
+import torch
+from torch.utils.data import DataLoader
+
+from tatau_core import settings
+
+logger = getLogger('tatau_core')
+
+
+def available_cpu_count():
+    """
+    CPUs which are available to process and are not loaded by other processes of host
+    """
+    try:
+        cpu_count = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpu_count = os.cpu_count()
+
+    try:
+        load = int(round(os.getloadavg()[0]))
+    except OSError:
+        load = 0
+
+    return max(1, cpu_count - load)
+
+
+class LoaderCalibration:
+    """
+    Chooses num_workers and pin_memory of DataLoader by measuring of batches/sec on actual dataset.
+
+    Batches are read once before measuring to warm up caches, then each candidate reads the same batches after
+    workers are started. Smallest num_workers which gives at least "tolerance" of best throughput is chosen, so workers
+    do not take CPU from compute threads when they do not make loading faster. Results are cached in json file per key:
+    model code hash, dataset and its chunks, transform, batch size and host.
+    Results of transform without stable repr are not cached.
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self, cache_path=None, max_batches=None, max_time=None, tolerance=0.9):
+        self.cache_path = cache_path or settings.DATA_LOADER_CALIBRATION_PATH
+        self.max_batches = max_batches or settings.DATA_LOADER_CALIBRATION_BATCHES
+        self.max_time = max_time or settings.DATA_LOADER_CALIBRATION_TIME
+        self.tolerance = tolerance
+
+    @staticmethod
+    def chunk_ids(dataset):
+        """
+        Chunk of content store is identified by multihash, other chunk is identified by path
+        """
+        chunk_dirs = getattr(dataset, 'chunk_dirs', None)
+        if chunk_dirs is None:
+            chunk_dirs = [getattr(x, 'chunk_dir', None) for x in getattr(dataset, 'datasets', [dataset])]
+
+        ids = []
+        for chunk_dir in chunk_dirs:
+            if chunk_dir is None:
+                ids.append(None)
+                continue
+            path = os.path.realpath(chunk_dir)
+            ids.append(os.path.basename(path) if os.path.basename(os.path.dirname(path)) == 'objects' else path)
+        return ids
+
+    @classmethod
+    def make_key(cls, dataset, batch_size, cache_key=None):
+        """
+        :return: key of calibration cache, None if transform has no stable repr
+        """
+        dataset = getattr(dataset, 'dataset', dataset)
+        transform = getattr(dataset, '_transform', getattr(dataset, 'transform', None))
+        description = repr(transform)
+        # default repr contains address of object, it is different in every process
+        if ' at 0x' in description:
+            return None
+
+        data = json.dumps([
+            cache_key,
+            type(dataset).__name__,
+            cls.chunk_ids(dataset),
+            # length of streaming dataset is known when all chunks are downloaded
+            len(dataset) if getattr(dataset, 'is_complete', True) else None,
+            description,
+            batch_size,
+            socket.gethostname(),
+            os.cpu_count()
+        ])
+        return hashlib.sha1(data.encode()).hexdigest()
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save(self, key, params):
+        with self._lock:
+            cache = self._load_cache()
+            cache[key] = params
+            tmp_path = '{}.{}.tmp'.format(self.cache_path, os.getpid())
+            with open(tmp_path, 'w') as f:
+                json.dump(cache, f)
+            os.rename(tmp_path, self.cache_path)
+
+    @staticmethod
+    def candidates():
+        cpu_count = available_cpu_count()
+        num_workers = {0, cpu_count}
+        n = 1
+        while n < cpu_count:
+            num_workers.add(n)
+            n *= 2
+
+        pin_memory = [False, True] if torch.cuda.is_available() else [False]
+        return [{'num_workers': x, 'pin_memory': y} for x in sorted(num_workers) for y in pin_memory]
+
+    def _candidates(self, kwargs):
+        candidates = self.candidates()
+        # pin_memory which is set by caller is not tuned
+        if 'pin_memory' in kwargs:
+            candidates = [dict(x, pin_memory=kwargs['pin_memory']) for x in candidates if not x['pin_memory']]
+        return candidates
+
+    @staticmethod
+    def _sampler_chain(loader_kwargs):
+        sampler = loader_kwargs.get('batch_sampler') or loader_kwargs.get('sampler')
+        while sampler is not None:
+            yield sampler
+            sampler = getattr(sampler, 'sampler', None)
+
+    @staticmethod
+    def _restore(sampler_states):
+        for sampler, state in sampler_states:
+            sampler.__dict__.clear()
+            sampler.__dict__.update(state)
+
+    def _measure(self, args, kwargs, params):
+        loader = DataLoader(*args, **dict(kwargs, **params))
+        iterator = iter(loader)
+        try:
+            # exclude start of workers
+            next(iterator)
+        except StopIteration:
+            return None
+
+        batches = 0
+        started_at = time.time()
+        for _ in iterator:
+            batches += 1
+            if batches >= self.max_batches or time.time() - started_at > self.max_time:
+                break
+        elapsed = time.time() - started_at
+        del iterator
+
+        if batches == 0:
+            return None
+        return batches / max(elapsed, 1e-6)
+
+    def calibrate(self, args, kwargs):
+        """
+        :param args: positional arguments of DataLoader
+        :param kwargs: keyword arguments of DataLoader without num_workers and pin_memory
+        :return: best params
+        """
+        # samplers count epochs, every candidate reads the same epoch and calibration must not change their state,
+        # e.g. StreamingChunkSampler waits for all chunks in second epoch
+        sampler_states = [(x, dict(x.__dict__)) for x in self._sampler_chain(kwargs)]
+        candidates = self._candidates(kwargs)
+        results = []
+        try:
+            # first read of batches is slower: page cache is cold and decoded images are not cached yet, so batches
+            # are read once by the fastest candidate before measuring and first candidate is not penalized
+            self._restore(sampler_states)
+            self._measure(args, kwargs, candidates[-1])
+
+            for params in candidates:
+                self._restore(sampler_states)
+                rate = self._measure(args, kwargs, params)
+                logger.info('Data loader {}: {} batches/sec'.format(params, rate))
+                if rate is not None:
+                    results.append((rate, params))
+        finally:
+            self._restore(sampler_states)
+
+        if not len(results):
+            return None
+
+        best_rate = max(x[0] for x in results)
+        for rate, params in results:
+            if rate >= best_rate * self.tolerance:
+                return params
+
+    def get_params(self, args, kwargs, cache_key=None):
+        dataset = kwargs['dataset'] if 'dataset' in kwargs else args[0]
+        # batch sampler keeps batch size of batch fetch loader
+        batch_size = getattr(kwargs.get('sampler'), 'batch_size', kwargs.get('batch_size'))
+        key = self.make_key(dataset, batch_size, cache_key)
+
+        params = self._load_cache().get(key) if key is not None else None
+        if params is not None:
+            if 'pin_memory' in kwargs:
+                params['pin_memory'] = kwargs['pin_memory']
+            logger.info('Data loader params are loaded from calibration cache: {}'.format(params))
+            return params
+
+        params = self.calibrate(args, kwargs)
+        if params is None:
+            return {'num_workers': available_cpu_count(), 'pin_memory': kwargs.get('pin_memory', False)}
+
+        logger.info('Data loader params are calibrated: {}'.format(params))
+        if key is not None:
+            self._save(key, params)
+        return params
@@ -1,8 +1,13 @@
+import hashlib
 from abc import abstractmethod, ABC
 from collections import Iterable
 from logging import getLogger
 
-from tatau_core.nn.tatau.dataset import NumpyChunkedDataset, AutoDataLoader
+from torch.utils.data import SequentialSampler
+
+from tatau_core.nn.tatau.dataset import NumpyChunkedDataset, BatchFetchDataLoader, StreamingChunkDirs, \
+    StreamingNumpyChunkedDataset, StreamingChunkSampler, ChunkWindowSampler
+from tatau_core.nn.tatau.eval_cache import EvalInputCache
 from tatau_core.utils.class_loader import load_class
 from .progress import TrainProgress
 
@@ -20,6 +25,9 @@ class Model(ABC):
     transform_train = None
     transform_eval = None
 
+    # path of model code, it is set by load_model
+    code_path = None
+
     @classmethod
     def load_model(cls, path):
         """
@@ -37,6 +45,7 @@ class Model(ABC):
             spec.loader.exec_module(module)
             assert hasattr(module, 'Model')
             assert issubclass(module.Model, Model)
+            module.Model.code_path = path
             model = module.Model()
         except Exception as e:
             logger.exception(e)
@@ -77,10 +86,58 @@ class Model(ABC):
         """
         pass
 
-    def data_preprocessing(self, chunk_dirs: Iterable, batch_size, transform: callable) -> Iterable:
-        return AutoDataLoader(
-            dataset=NumpyChunkedDataset(chunk_dirs=chunk_dirs, transform=transform),
-            batch_size=batch_size, shuffle=True, pin_memory=False)
+    @classmethod
+    def code_hash(cls):
+        """
+        Hash of model code, it is None if code is not loaded from file
+        """
+        if cls.code_path is None:
+            return None
+
+        with open(cls.code_path, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+
+    @classmethod
+    def supports_streaming_chunks(cls):
+        """
+        Training can be started before all chunks are downloaded only by default data_preprocessing
+        """
+        return cls.data_preprocessing is Model.data_preprocessing
+
+    def data_preprocessing(self, chunk_dirs: Iterable, batch_size, transform: callable,
+                           current_iteration: int = None) -> Iterable:
+        """
+        :param current_iteration: seed of shuffling, every iteration reads samples in different order
+        """
+        if current_iteration is None:
+            current_iteration = getattr(chunk_dirs, 'seed', 0)
+
+        # batches are read by one call per chunk, transform can be batch transform
+        if isinstance(chunk_dirs, StreamingChunkDirs):
+            dataset = StreamingNumpyChunkedDataset(chunk_dirs=chunk_dirs, transform=transform)
+            return BatchFetchDataLoader(
+                dataset=dataset, sampler=StreamingChunkSampler(dataset, seed=current_iteration),
+                batch_size=batch_size, pin_memory=False, cache_key=self.code_hash())
+
+        dataset = NumpyChunkedDataset(chunk_dirs=chunk_dirs, transform=transform)
+        return BatchFetchDataLoader(
+            dataset=dataset, sampler=ChunkWindowSampler(dataset, seed=current_iteration),
+            batch_size=batch_size, pin_memory=False, cache_key=self.code_hash())
+
+    def eval_data_preprocessing(self, chunk_dirs: Iterable, batch_size, transform: callable) -> Iterable:
+        """
+        Data of evaluation, test chunks after deterministic transform are read from EvalInputCache
+        """
+        if self.supports_streaming_chunks():
+            cached_dirs = EvalInputCache().get(
+                chunk_dirs=chunk_dirs, transform=transform, batch_size=batch_size, cache_key=self.code_hash())
+            if cached_dirs is not None:
+                dataset = NumpyChunkedDataset(chunk_dirs=cached_dirs)
+                return BatchFetchDataLoader(
+                    dataset=dataset, sampler=SequentialSampler(dataset),
+                    batch_size=batch_size, pin_memory=False, cache_key=self.code_hash())
+
+        return self.data_preprocessing(chunk_dirs=chunk_dirs, batch_size=batch_size, transform=transform)
 
     @abstractmethod
     def optimizer_step(self, loss):
@@ -135,3 +192,6 @@ class Model(ABC):
 
     def save_weights(self, path: str):
         self.get_weights_serializer().save(weights=self.get_weights(), path=path)
+
+    def write_weights(self, f):
+        self.get_weights_serializer().write(weights=self.get_weights(), f=f)
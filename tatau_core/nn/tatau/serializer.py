@@ -6,6 +6,13 @@ class WeightsSerializer(ABC):
     def save(cls, weights, path):
         raise NotImplementedError()
 
+    @classmethod
+    def write(cls, weights, f):
+        """
+        Write weights to binary file object, file can be unseekable, e.g. pipe
+        """
+        raise NotImplementedError()
+
     @classmethod
     def load(cls, path):
         raise NotImplementedError()
@@ -0,0 +1,264 @@
+import gc
+import importlib
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+from contextlib import contextmanager
+from logging import getLogger
+
+import numpy as np
+import psutil
+
+from tatau_core import settings
+from tatau_core.utils.signleton import singleton
+
+logger = getLogger('tatau_core')
+
+# modules which are imported by warm worker before jobs
+PRELOAD_MODULES = [
+    'torch',
+    'tatau_core.nn.tatau.sessions.train',
+    'tatau_core.nn.tatau.sessions.eval_train',
+    'tatau_core.nn.tatau.sessions.eval_verification',
+    'tatau_core.nn.tatau.sessions.summarize',
+    'tatau_core.nn.tatau.sessions.estimation',
+]
+
+
+class WarmWorker:
+    """
+    Long-lived python process with preloaded modules, it runs session jobs one by one. Jobs are sent to worker and
+    results are received by pipes, stdout and stderr of worker are inherited.
+
+    Model code which is loaded by job stays in worker, so worker is bound to model code of its first job.
+    """
+
+    def __init__(self):
+        job_read, self._job_write = os.pipe()
+        self._result_read, result_write = os.pipe()
+        self._process = subprocess.Popen(
+            ['python', '-m', __name__, str(job_read), str(result_write)],
+            pass_fds=(job_read, result_write)
+        )
+        os.close(job_read)
+        os.close(result_write)
+
+        self._jobs = os.fdopen(self._job_write, 'w')
+        self._results = os.fdopen(self._result_read, 'r')
+        self.jobs_done = 0
+        self.rss = 0
+        # identity of model code which is loaded in worker
+        self.binding = None
+        logger.info('Started warm session worker PID: {}'.format(self.pid))
+
+    @property
+    def pid(self):
+        return self._process.pid
+
+    def is_alive(self):
+        return self._process.poll() is None
+
+    def run(self, session_class, uuid, args):
+        """
+        Run session in worker and wait for end
+        :return: exit code of session, None if worker is crashed
+        """
+        self._jobs.write(json.dumps({
+            'module': session_class.__module__,
+            'session_class': session_class.__name__,
+            'uuid': uuid,
+            'args': args
+        }) + '\n')
+        self._jobs.flush()
+
+        line = self._results.readline()
+        self.jobs_done += 1
+        if not line:
+            self._process.wait()
+            logger.info('Warm session worker {} is crashed, exit code: {}'.format(
+                self.pid, self._process.returncode))
+            return None
+
+        result = json.loads(line)
+        self.rss = result['rss']
+        return result['exit_code']
+
+    def stop(self):
+        logger.info('Stop warm session worker PID: {}'.format(self.pid))
+        for f in [self._jobs, self._results]:
+            try:
+                f.close()
+            except OSError:
+                pass
+
+        try:
+            self._process.wait(10)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+            self._process.wait()
+
+
+@singleton
+class SessionExecutor:
+    """
+    Pool of warm workers of node process. Worker is replaced by fresh interpreter after "max_jobs" jobs, when its
+    memory exceeds "max_rss" or when it is crashed, replacement is started right away, so next session starts warm.
+    Worker runs jobs of one model code only, idle worker of other model code is replaced when there is no worker
+    for job.
+    """
+
+    def __init__(self):
+        self.pool_size = settings.SESSION_EXECUTOR_POOL_SIZE
+        self.max_jobs = settings.SESSION_EXECUTOR_MAX_JOBS
+        self.max_rss = settings.SESSION_EXECUTOR_MAX_RSS_MB * 1024 * 1024
+        self._idle = []
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.pool_size > 0
+
+    def _is_reusable(self, worker: WarmWorker):
+        return worker.is_alive() and worker.jobs_done < self.max_jobs and worker.rss < self.max_rss
+
+    def _fill(self):
+        with self._lock:
+            while len(self._idle) < self.pool_size:
+                self._idle.append(WarmWorker())
+
+    def _take(self, binding):
+        # worker of the same model code is preferred to fresh one
+        for candidate_binding in [binding, None]:
+            for worker in self._idle:
+                if worker.binding == candidate_binding:
+                    self._idle.remove(worker)
+                    return worker
+        return None
+
+    @contextmanager
+    def acquire(self, binding=None) -> WarmWorker:
+        """
+        :param binding: identity of model code of job, e.g. hash of model.py, modules and global state of model code
+        must not leak to jobs of other models
+        """
+        stale = None
+        with self._lock:
+            self._idle = [x for x in self._idle if x.is_alive()]
+            worker = self._take(binding)
+            if worker is None and len(self._idle):
+                stale = self._idle.pop(0)
+
+        if stale is not None:
+            logger.info('Warm session worker {} is bound to other model code'.format(stale.pid))
+            stale.stop()
+
+        if worker is None:
+            worker = WarmWorker()
+
+        try:
+            yield worker
+        finally:
+            if worker.binding is None:
+                worker.binding = binding
+
+            if self._is_reusable(worker):
+                with self._lock:
+                    if len(self._idle) < self.pool_size:
+                        self._idle.append(worker)
+                        worker = None
+
+            if worker is not None:
+                worker.stop()
+            self._fill()
+
+    def shutdown(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.stop()
+
+
+def _cuda_initialized(torch):
+    # torch.cuda.is_initialized is absent in torch 0.4
+    return getattr(torch.cuda, '_initialized', False)
+
+
+def _save_global_state():
+    """
+    Process-wide state which can be changed by model code, it is restored after every job
+    """
+    state = {
+        'random': random.getstate(),
+        'numpy': np.random.get_state()
+    }
+
+    torch = sys.modules.get('torch')
+    if torch is not None:
+        cudnn = torch.backends.cudnn
+        state.update(
+            torch_threads=torch.get_num_threads(),
+            torch_rng=torch.get_rng_state(),
+            cudnn=(cudnn.enabled, cudnn.benchmark, cudnn.deterministic)
+        )
+        if _cuda_initialized(torch):
+            state['cuda_rng'] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def _restore_global_state(state):
+    random.setstate(state['random'])
+    np.random.set_state(state['numpy'])
+
+    torch = sys.modules.get('torch')
+    if torch is None or 'torch_threads' not in state:
+        return
+
+    torch.set_num_threads(state['torch_threads'])
+    torch.set_rng_state(state['torch_rng'])
+    cudnn = torch.backends.cudnn
+    cudnn.enabled, cudnn.benchmark, cudnn.deterministic = state['cudnn']
+
+    if _cuda_initialized(torch):
+        if 'cuda_rng' in state:
+            torch.cuda.set_rng_state_all(state['cuda_rng'])
+        # memory which is cached by allocator is returned to GPU, so idle worker keeps only CUDA context
+        torch.cuda.empty_cache()
+
+
+def _run_job(job):
+    module = importlib.import_module(job['module'])
+    session_class = getattr(module, job['session_class'])
+
+    # session reads its arguments from argv as in separate process
+    sys.argv = [module.__file__, job['uuid']] + job['args']
+    state = _save_global_state()
+    try:
+        session_class.run()
+        return 0
+    except SystemExit as ex:
+        return ex.code if isinstance(ex.code, int) else 1
+    finally:
+        gc.collect()
+        _restore_global_state(state)
+
+
+def serve(job_fd, result_fd):
+    for name in PRELOAD_MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception as ex:
+            logger.info('Failed to preload {}: {}'.format(name, ex))
+
+    process = psutil.Process()
+    with os.fdopen(job_fd, 'r') as jobs, os.fdopen(result_fd, 'w') as results:
+        for line in jobs:
+            exit_code = _run_job(json.loads(line))
+            results.write(json.dumps({'exit_code': exit_code, 'rss': process.memory_info().rss}) + '\n')
+            results.flush()
+
+
+if __name__ == '__main__':
+    serve(int(sys.argv[1]), int(sys.argv[2]))
@@ -1,15 +1,17 @@
+import hashlib
 import os
 import pickle
 import shutil
 import subprocess
 import sys
-import tempfile
 import traceback
 from abc import ABCMeta
 from logging import getLogger
 from uuid import uuid4
 
+from tatau_core import settings
 from tatau_core.metrics import MetricsCollector
+from tatau_core.nn.tatau.sessions.executor import SessionExecutor
 
 logger = getLogger(__name__)
 
@@ -72,7 +74,7 @@ class Session(metaclass=SessionBase):
 
     @property
     def base_dir(self):
-        session_dir = os.path.join(tempfile.gettempdir(), self.uuid)
+        session_dir = os.path.join(settings.SESSION_DIR, self.uuid)
         if not os.path.exists(session_dir):
             os.mkdir(session_dir)
         return session_dir
@@ -86,6 +88,17 @@ class Session(metaclass=SessionBase):
         logger.info('Base dir {} is removed'.format(self.base_dir))
         self._metrics_collector.clean()
 
+    def model_code_hash(self):
+        """
+        Hash of model code of session, it is None if model is not downloaded yet
+        """
+        model_path = self.model_path
+        if model_path is None:
+            return None
+
+        with open(model_path, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+
     def process_assignment(self, assignment):
         raise NotImplementedError()
 
@@ -98,13 +111,23 @@ class Session(metaclass=SessionBase):
             subprocess.Popen(args_list)
             return
 
+        executor = SessionExecutor()
         self._metrics_collector.start_and_wait_signal()
-        with subprocess.Popen(args_list) as process:
-            self._metrics_collector.set_pid(process.pid)
-            with self._metrics_collector:
-                process.wait()
+        if executor.enabled:
+            with executor.acquire(binding=self.model_code_hash()) as worker:
+                self._metrics_collector.set_pid(worker.pid)
+                with self._metrics_collector:
+                    exit_code = worker.run(type(self), self.uuid, args_list[4:])
+        else:
+            with subprocess.Popen(args_list) as process:
+                self._metrics_collector.set_pid(process.pid)
+                with self._metrics_collector:
+                    exit_code = process.wait()
 
         exception = self.exception
+        if exception is None and exit_code != 0:
+            raise RuntimeError('Session {} is failed, exit code: {}'.format(self.uuid, exit_code))
+
         if exception:
             raise RuntimeError('{}'.format(exception))
 
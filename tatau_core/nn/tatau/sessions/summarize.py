@@ -1,4 +1,3 @@
-import os
 from collections import deque
 from logging import getLogger
 
@@ -12,7 +11,7 @@ logger = getLogger('tatau_core')
 
 class SummarizeSession(Session):
     results_list = SessionValue()
-    summarized_weights_path = SessionValue()
+    summarized_weights_ipfs = SessionValue()
 
     def __init__(self, uuid=None):
         super(SummarizeSession, self).__init__(module=__name__, uuid=uuid)
@@ -34,7 +33,7 @@ class SummarizeSession(Session):
             downloader.add_to_download_list(worker_result['result'], file_name)
             downloaded_results.append(downloader.resolve_path(file_name))
 
-            ipfs_weights.append(worker_result['result'])
+            ipfs_weights.append((worker_result['result'], file_name))
 
         if not len(downloaded_results):
             logger.error('list of weights_ipfs is empty')
@@ -47,11 +46,10 @@ class SummarizeSession(Session):
 
         self._run()
 
-        ipfs = IPFS()
-        verification_result.weights_ipfs = ipfs.add_file(self.summarized_weights_path).multihash
+        verification_result.weights_ipfs = self.summarized_weights_ipfs
 
-        for multihash in ipfs_weights:
-            downloader.remove_from_storage(multihash)
+        for multihash, file_name in ipfs_weights:
+            downloader.remove_from_storage(multihash, file_names=[file_name])
 
     def main(self):
         logger.info('Run Summarizer')
@@ -66,10 +64,8 @@ class SummarizeSession(Session):
             summarizer.update(weights=weights)
 
         weights = summarizer.commit()
-        summarized_weights_path = os.path.join(self.base_dir, 'summarized_weights')
-        serializer.save(path=summarized_weights_path, weights=weights)
-
-        self.summarized_weights_path = summarized_weights_path
+        # weights are streamed to IPFS without temporary file
+        self.summarized_weights_ipfs = IPFS().add_stream(lambda f: serializer.write(weights=weights, f=f)).multihash
 
 
 if __name__ == '__main__':
@@ -1,9 +1,11 @@
 import os
 import sys
+import threading
 from collections import deque
 from logging import getLogger
 
 from tatau_core.models import TaskAssignment
+from tatau_core.nn.tatau.dataset import StreamingChunkDirs, streaming_chunk_order
 from tatau_core.nn.tatau.model import Model
 from tatau_core.nn.tatau.progress import TrainProgress
 from tatau_core.utils import configure_logging
@@ -18,10 +20,46 @@ class TrainSession(Session):
     train_history = SessionValue()
     init_weights_path = SessionValue()
     chunk_dirs = SessionValue()
-    train_weights_path = SessionValue()
+    train_weights_ipfs = SessionValue()
+    eval_chunk_dirs = SessionValue()
+    eval_results = SessionValue()
 
-    def __init__(self, uuid=None):
+    def __init__(self, uuid=None, with_eval=False):
         super(TrainSession, self).__init__(module=__name__, uuid=uuid)
+        self._with_eval = with_eval
+
+    def _add_eval_chunks(self, assignment: TaskAssignment, downloader: Downloader):
+        """
+        Eval of initial weights on test chunks is done in train process before training, initial weights are weights
+        of previous iteration
+        """
+        train_data = assignment.train_data
+        if not self._with_eval or train_data.current_iteration <= 1 or train_data.weights_ipfs is None \
+                or len(train_data.test_chunks_ipfs) == 0:
+            return
+
+        eval_chunk_dirs = deque()
+        for index, chunk_ipfs in enumerate(train_data.test_chunks_ipfs):
+            dir_name = '{}_chunk_test_{}'.format(train_data.current_iteration - 1, index)
+            downloader.add_to_download_list(chunk_ipfs, dir_name)
+            eval_chunk_dirs.append(downloader.resolve_path(dir_name))
+        self.eval_chunk_dirs = eval_chunk_dirs
+
+    def _save_eval_results(self, assignment: TaskAssignment):
+        eval_results = self.eval_results
+        if eval_results is None:
+            return
+
+        iteration = assignment.train_data.current_iteration - 1
+        logger.info('loss: {}, accuracy: {}'.format(eval_results['loss'], eval_results['acc']))
+
+        if assignment.train_result.eval_results is None:
+            assignment.train_result.eval_results = {}
+
+        assignment.train_result.eval_results[str(iteration)] = {
+            'loss': eval_results['loss'],
+            'accuracy': eval_results['acc']
+        }
 
     def process_assignment(self, assignment: TaskAssignment, *args, **kwargs):
         logger.info('Train Task: {}'.format(assignment))
@@ -41,17 +79,23 @@ class TrainSession(Session):
         else:
             logger.info('Initial weights are not set')
 
+        self._add_eval_chunks(assignment, downloader)
+
         batch_size = assignment.train_data.batch_size
         epochs = assignment.train_data.epochs
 
+        downloader.download_all()
+        logger.info('Model is downloaded')
+
+        chunks_downloader = Downloader(assignment.task_declaration_id)
         chunk_dirs = deque()
-        for index, chunk_ipfs in enumerate(assignment.train_data.train_chunks_ipfs):
-            dir_name = 'chunk_{}'.format(index)
-            downloader.add_to_download_list(chunk_ipfs, dir_name)
-            chunk_dirs.append(downloader.resolve_path(dir_name))
+        for index in range(len(assignment.train_data.train_chunks_ipfs)):
+            chunk_dirs.append(chunks_downloader.resolve_path('chunk_{}'.format(index)))
 
-        downloader.download_all()
-        logger.info('Dataset downloaded')
+        # chunks are downloaded in order of first epoch of sampler
+        train_chunks_ipfs = assignment.train_data.train_chunks_ipfs
+        for index in streaming_chunk_order(len(train_chunks_ipfs), assignment.train_data.current_iteration):
+            chunks_downloader.add_to_download_list(train_chunks_ipfs[index], 'chunk_{}'.format(index))
 
         self.model_path = downloader.resolve_path('model.py')
         self.init_weights_path = None if initial_weight_file_name is None \
@@ -59,19 +103,49 @@ class TrainSession(Session):
 
         self.chunk_dirs = chunk_dirs
 
+        # training is started while chunks are downloading, train process waits for chunks which it reads
+        download_errors = []
+        download_thread = threading.Thread(
+            target=self._download_chunks, args=(chunks_downloader, chunk_dirs, download_errors))
+        download_thread.start()
+
         logger.info('Start training')
 
-        self._run(batch_size, epochs, assignment.train_data.current_iteration)
+        try:
+            self._run(batch_size, epochs, assignment.train_data.current_iteration)
+        finally:
+            download_thread.join()
+
+        if len(download_errors):
+            raise download_errors[0]
+
+        self._save_eval_results(assignment)
 
         train_result.train_history = self.train_history
         train_result.loss = train_result.train_history['loss'][-1]
         train_result.accuracy = train_result.train_history['acc'][-1]
 
-        ipfs = IPFS()
-        ipfs_file = ipfs.add_file(self.train_weights_path)
-        logger.info('Result weights_ipfs are uploaded')
-
-        train_result.weights_ipfs = ipfs_file.multihash
+        train_result.weights_ipfs = self.train_weights_ipfs
+
+    @staticmethod
+    def _download_chunks(downloader: Downloader, chunk_dirs, errors: list):
+        for chunk_dir in chunk_dirs:
+            try:
+                os.remove(StreamingChunkDirs.failed_marker(chunk_dir))
+            except FileNotFoundError:
+                pass
+
+        try:
+            for file_names in downloader.download_iter():
+                logger.info('Chunk {} is downloaded'.format(file_names))
+            logger.info('Dataset downloaded')
+        except Exception as ex:
+            logger.exception(ex)
+            errors.append(ex)
+            # notify train process
+            for chunk_dir in chunk_dirs:
+                if not os.path.exists(chunk_dir):
+                    open(StreamingChunkDirs.failed_marker(chunk_dir), 'w').close()
 
     def main(self):
         logger.info('Start training')
@@ -86,16 +160,32 @@ class TrainSession(Session):
         else:
             logger.info('Initial weights are not set')
 
+        eval_chunk_dirs = self.eval_chunk_dirs
+        if eval_chunk_dirs is not None:
+            logger.info('Run evaluation')
+            loss, acc = model.eval(chunk_dirs=eval_chunk_dirs)
+            self.eval_results = {
+                'loss': loss,
+                'acc': acc
+            }
+
+        chunk_dirs = StreamingChunkDirs(self.chunk_dirs, seed=current_iteration)
+        if not model.supports_streaming_chunks():
+            logger.info('Wait for download of dataset')
+            for chunk_dir in chunk_dirs:
+                StreamingChunkDirs.wait_chunk_dir(chunk_dir)
+            chunk_dirs = self.chunk_dirs
+
         progress = TrainProgress()
         train_history = model.train(
-            chunk_dirs=self.chunk_dirs,
+            chunk_dirs=chunk_dirs,
             batch_size=batch_size, nb_epochs=nb_epochs,
             train_progress=progress, current_iteration=current_iteration
         )
 
-        train_weights_path = os.path.join(self.base_dir, 'result_weights')
-        model.save_weights(train_weights_path)
-        self.train_weights_path = train_weights_path
+        # weights are streamed to IPFS without temporary file
+        self.train_weights_ipfs = IPFS().add_stream(model.write_weights).multihash
+        logger.info('Result weights_ipfs are uploaded')
         self.train_history = train_history
 
 
@@ -1 +1,3 @@
 from .summarizer import Summarizer
+from .streaming import Aggregator, RunningMean, StreamingSummarizer
+from .median import OutOfCoreMedian
@@ -0,0 +1,113 @@
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+
+from tatau_core import settings
+from .streaming import Aggregator, parallel_map
+
+
+class OutOfCoreMedian(Aggregator):
+    """
+    Coordinate-wise median of arrays by keys which does not keep arrays in memory.
+
+    Every added array is flattened and appended to scratch file. Median of key is computed by blocks of coordinates:
+    block of every array is read from memory-mapped scratch file, so block of all arrays is (arrays, block) matrix
+    which fits into block_size bytes, and middle elements are selected by np.partition instead of full sort. Blocks
+    are reduced by thread pool, block_size is shared by its threads.
+    """
+
+    # offsets of arrays in scratch file are aligned
+    alignment = 64
+
+    def __init__(self, scratch_dir=None, block_size=None):
+        self._scratch_dir = scratch_dir or settings.SUMMARIZER_SCRATCH_DIR
+        self.block_size = block_size or settings.SUMMARIZER_BLOCK_SIZE_MB * 1024 * 1024
+        self._file = None
+        self._map = None
+        self._size = 0
+        # key -> dtype, shape, offsets of arrays
+        self._entries = OrderedDict()
+
+    def add(self, key, array):
+        array = np.asarray(array)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = (array.dtype, array.shape, [])
+        elif entry[0] != array.dtype or entry[1] != array.shape:
+            raise ValueError('Array {} has dtype {} and shape {}, expected {} and {}'.format(
+                key, array.dtype, array.shape, entry[0], entry[1]))
+
+        if array.nbytes == 0:
+            entry[2].append(0)
+            return
+
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(dir=self._scratch_dir)
+
+        padding = -self._size % self.alignment
+        self._map = None
+        self._file.seek(self._size + padding)
+        # shape is taken before, ascontiguousarray makes 0-d arrays 1-d
+        np.ascontiguousarray(array).tofile(self._file)
+        entry[2].append(self._size + padding)
+        self._size += padding + array.nbytes
+
+    def keys(self):
+        return self._entries.keys()
+
+    def _rows(self, key):
+        dtype, shape, offsets = self._entries[key]
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        if nbytes == 0:
+            return [np.empty(0, dtype=dtype) for _ in offsets]
+
+        if self._map is None:
+            self._file.flush()
+            self._map = np.memmap(self._file, dtype=np.uint8, mode='r', shape=(self._size,))
+        return [self._map[offset:offset + nbytes].view(dtype) for offset in offsets]
+
+    @staticmethod
+    def _reduce_block(rows, kth, result, start, end):
+        block = np.empty((len(rows), end - start), dtype=rows[0].dtype)
+        for i, row in enumerate(rows):
+            block[i] = row[start:end]
+
+        block.partition(kth, axis=0)
+        # mean of middle elements as np.median does
+        result[start:end] = np.mean(block[kth], axis=0)
+
+    def result(self, key, dtype=None):
+        return self.results([key], dtype=dtype)[0]
+
+    def results(self, keys, dtype=None):
+        """
+        Medians of keys, blocks of all keys are reduced in parallel, so large tensor is split between threads too.
+        Every thread reads block of block_size / pool size bytes.
+        """
+        block_size = max(1, self.block_size // settings.SUMMARIZER_POOL_SIZE)
+        tasks = []
+        results = []
+        for key in keys:
+            entry_dtype, shape, offsets = self._entries[key]
+            rows = self._rows(key)
+            count = int(np.prod(shape))
+            result = np.empty(count, dtype=dtype or self.result_dtype(entry_dtype))
+
+            middle = len(rows) // 2
+            kth = [middle] if len(rows) % 2 else [middle - 1, middle]
+            step = max(1, block_size // (len(rows) * entry_dtype.itemsize))
+            for start in range(0, count, step):
+                tasks.append((rows, kth, result, start, min(start + step, count)))
+            results.append(result.reshape(shape))
+
+        parallel_map(lambda task: self._reduce_block(*task), tasks)
+        return results
+
+    def close(self):
+        self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._entries.clear()
+        self._size = 0
@@ -0,0 +1,88 @@
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from tatau_core.nn.tatau.summarizer.median import OutOfCoreMedian
+
+
+class OutOfCoreMedianTest(unittest.TestCase):
+    def setUp(self):
+        self.scratch_dir = tempfile.mkdtemp()
+        self.random_state = np.random.RandomState(0)
+
+    def tearDown(self):
+        shutil.rmtree(self.scratch_dir)
+
+    def _median(self, arrays, block_size=None, dtype=None):
+        median = OutOfCoreMedian(scratch_dir=self.scratch_dir, block_size=block_size)
+        try:
+            for array in arrays:
+                median.add('key', array)
+            return median.result('key', dtype=dtype)
+        finally:
+            median.close()
+
+    def _assert_median(self, arrays, block_size=None):
+        result = self._median(arrays, block_size=block_size)
+        expected = np.median(np.stack(arrays), axis=0)
+        self.assertEqual(result.shape, expected.shape)
+        np.testing.assert_allclose(result, expected, rtol=1e-6)
+        return result
+
+    def test_odd_and_even_count(self):
+        for count in [1, 2, 3, 4, 7, 8]:
+            arrays = [self.random_state.rand(5, 7).astype(np.float32) for _ in range(count)]
+            result = self._assert_median(arrays)
+            self.assertEqual(result.dtype, np.float32)
+
+    def test_tiny_blocks(self):
+        for block_size in [1, 8, 24, 100]:
+            for count in [3, 4]:
+                arrays = [self.random_state.rand(3, 11) for _ in range(count)]
+                self._assert_median(arrays, block_size=block_size)
+
+    def test_0d(self):
+        for count in [3, 4]:
+            arrays = [np.float32(x) for x in self.random_state.rand(count)]
+            self.assertEqual(self._assert_median(arrays).shape, ())
+
+    def test_int(self):
+        for count in [3, 4]:
+            arrays = [self.random_state.randint(-100, 100, size=(4, 3)) for _ in range(count)]
+            result = self._assert_median(arrays)
+            self.assertEqual(result.dtype, np.float64)
+
+        result = self._median([np.array([1, 2]), np.array([2, 5])], dtype=np.float32)
+        self.assertEqual(result.dtype, np.float32)
+        np.testing.assert_array_equal(result, [1.5, 3.5])
+
+    def test_empty(self):
+        arrays = [np.empty((0, 3), dtype=np.float32) for _ in range(3)]
+        result = self._median(arrays)
+        self.assertEqual(result.shape, (0, 3))
+        self.assertEqual(result.dtype, np.float32)
+
+    def test_keys(self):
+        median = OutOfCoreMedian(scratch_dir=self.scratch_dir, block_size=16)
+        arrays = {
+            'a': [self.random_state.rand(6) for _ in range(3)],
+            'b': [self.random_state.rand(2, 2).astype(np.float32) for _ in range(3)],
+            'c': [np.float64(x) for x in self.random_state.rand(3)],
+        }
+        for i in range(3):
+            median.add_all([(key, values[i]) for key, values in arrays.items()])
+
+        self.assertEqual(list(median.keys()), ['a', 'b', 'c'])
+        for key, result in zip(['c', 'a', 'b'], median.results(['c', 'a', 'b'])):
+            np.testing.assert_allclose(result, np.median(np.stack(arrays[key]), axis=0), rtol=1e-6)
+
+        with self.assertRaises(ValueError):
+            median.add('a', np.zeros(7))
+        median.close()
+        self.assertEqual(list(median.keys()), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+from abc import abstractmethod, ABC
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+
+from tatau_core import settings
+from .summarizer import Summarizer
+
+
+def parallel_map(fn, items, pool_size=None):
+    """
+    Map items by thread pool, numpy reductions release GIL, so they are run on all cores. Order of results is order of
+    items.
+    """
+    items = list(items)
+    pool_size = min(pool_size or settings.SUMMARIZER_POOL_SIZE, len(items))
+    if pool_size <= 1:
+        return [fn(x) for x in items]
+
+    with ThreadPool(pool_size) as p:
+        return p.map(fn, items)
+
+
+class Aggregator(ABC):
+    """
+    Coordinate-wise reduction of arrays by keys, arrays of key are added one by one
+    """
+
+    @abstractmethod
+    def add(self, key, array):
+        pass
+
+    @abstractmethod
+    def keys(self):
+        pass
+
+    @abstractmethod
+    def result(self, key, dtype=None):
+        """
+        :param dtype: dtype of result, by default float arrays keep their dtype and others are float64 as in numpy
+        """
+        pass
+
+    def add_all(self, items):
+        """
+        :param items: list of (key, array)
+        """
+        for key, array in items:
+            self.add(key, array)
+
+    def results(self, keys, dtype=None):
+        """
+        Results of keys which are computed in parallel
+        :return: list of results in order of keys
+        """
+        return parallel_map(lambda key: self.result(key, dtype=dtype), keys)
+
+    def close(self):
+        pass
+
+    @staticmethod
+    def result_dtype(dtype):
+        return dtype if np.issubdtype(dtype, np.floating) else np.float64
+
+
+class RunningMean(Aggregator):
+    """
+    Mean of arrays by keys, arrays are added to running sums in float64, so memory does not depend on count of arrays
+    """
+
+    def __init__(self):
+        self._sums = OrderedDict()
+        self._counts = dict()
+        self._dtypes = dict()
+
+    def add(self, key, array):
+        array = np.asarray(array)
+        total = self._sums.get(key)
+        if total is None:
+            self._sums[key] = np.array(array, dtype=np.float64)
+            self._counts[key] = 1
+            self._dtypes[key] = array.dtype
+            return
+
+        np.add(total, array, out=total)
+        self._counts[key] += 1
+
+    def add_all(self, items):
+        # new keys change dicts and are added first, sums of other keys are updated in parallel
+        existing = [x for x in items if x[0] in self._sums]
+        for key, array in items:
+            if key not in self._sums:
+                self.add(key, array)
+        parallel_map(lambda item: self.add(*item), existing)
+
+    def keys(self):
+        return self._sums.keys()
+
+    def result(self, key, dtype=None):
+        result = self._sums[key] / self._counts[key]
+        return result.astype(dtype or self.result_dtype(self._dtypes[key]), copy=False)
+
+
+class StreamingSummarizer(Summarizer):
+    """
+    Summarizer which folds every update into its state when update is added, updates are not kept, so update can be
+    freed right after it is added
+    """
+
+    def __init__(self):
+        super(StreamingSummarizer, self).__init__()
+        self.reset()
+
+    @abstractmethod
+    def reset(self):
+        pass
+
+    @abstractmethod
+    def fold(self, weights):
+        pass
+
+    @abstractmethod
+    def result(self):
+        pass
+
+    def update(self, weights):
+        self.fold(weights)
+
+    def summarize(self, updates):
+        for weights in updates:
+            self.fold(weights)
+        return self.result()
+
+    def commit(self):
+        try:
+            return self.result()
+        finally:
+            self.reset()
@@ -0,0 +1,66 @@
+import unittest
+
+import numpy as np
+
+from tatau_core.nn.tatau.summarizer.streaming import RunningMean, parallel_map
+
+
+class RunningMeanTest(unittest.TestCase):
+    def setUp(self):
+        self.random_state = np.random.RandomState(0)
+
+    def _mean(self, arrays, dtype=None):
+        mean = RunningMean()
+        for array in arrays:
+            mean.add('key', array)
+        return mean.result('key', dtype=dtype)
+
+    def _assert_mean(self, arrays):
+        result = self._mean(arrays)
+        expected = np.mean(np.stack(arrays), axis=0)
+        self.assertEqual(result.shape, expected.shape)
+        np.testing.assert_allclose(result, expected, rtol=1e-6)
+        return result
+
+    def test_float(self):
+        for count in [1, 2, 3, 4]:
+            arrays = [self.random_state.rand(5, 7).astype(np.float32) for _ in range(count)]
+            self.assertEqual(self._assert_mean(arrays).dtype, np.float32)
+
+    def test_0d(self):
+        arrays = [np.float32(x) for x in self.random_state.rand(3)]
+        self.assertEqual(self._assert_mean(arrays).shape, ())
+
+    def test_int(self):
+        arrays = [self.random_state.randint(-100, 100, size=(4, 3)) for _ in range(4)]
+        self.assertEqual(self._assert_mean(arrays).dtype, np.float64)
+
+        result = self._mean([np.array([1, 2]), np.array([2, 5])], dtype=np.float32)
+        self.assertEqual(result.dtype, np.float32)
+        np.testing.assert_array_equal(result, [1.5, 3.5])
+
+    def test_empty(self):
+        result = self._mean([np.empty((0, 3), dtype=np.float32) for _ in range(3)])
+        self.assertEqual(result.shape, (0, 3))
+        self.assertEqual(result.dtype, np.float32)
+
+    def test_add_all(self):
+        mean = RunningMean()
+        arrays = {key: [self.random_state.rand(6) for _ in range(3)] for key in ['a', 'b', 'c']}
+        for i in range(3):
+            mean.add_all([(key, values[i]) for key, values in sorted(arrays.items())])
+
+        self.assertEqual(list(mean.keys()), ['a', 'b', 'c'])
+        for key, result in zip(['c', 'a', 'b'], mean.results(['c', 'a', 'b'])):
+            np.testing.assert_allclose(result, np.mean(np.stack(arrays[key]), axis=0))
+
+
+class ParallelMapTest(unittest.TestCase):
+    def test_order(self):
+        for pool_size in [1, 4]:
+            self.assertEqual(parallel_map(lambda x: x * 2, range(10), pool_size=pool_size), list(range(0, 20, 2)))
+        self.assertEqual(parallel_map(lambda x: x, [], pool_size=4), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
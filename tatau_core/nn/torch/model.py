@@ -101,7 +101,14 @@ class Model(model.Model, metaclass=ABCMeta):
 
         # dataset = self.data_preprocessing(chunk_dirs=chunk_dirs, transforms=self.transforms_train)
 
-        loader = self.data_preprocessing(chunk_dirs=chunk_dirs, batch_size=batch_size, transform=self.transform_train)
+        if self.supports_streaming_chunks():
+            # data_preprocessing of model can be overridden with signature without current_iteration
+            loader = self.data_preprocessing(
+                chunk_dirs=chunk_dirs, batch_size=batch_size, transform=self.transform_train,
+                current_iteration=current_iteration)
+        else:
+            loader = self.data_preprocessing(
+                chunk_dirs=chunk_dirs, batch_size=batch_size, transform=self.transform_train)
         # DataLoader(dataset, batch_size=batch_size, shuffle=False, num_workers=0, pin_memory=False)
 
         train_history = {'loss': [], 'acc': []}
@@ -111,6 +118,9 @@ class Model(model.Model, metaclass=ABCMeta):
             self.adjust_learning_rate(nb_epoch)
             epoch_loss = 0.0
             correct = 0
+            # length of streaming dataset is partial until all chunks are downloaded, so seen samples are counted
+            samples = 0
+            batches = 0
             batch_started_at = time.time()
             for batch_idx, (input_, target) in enumerate(loader, 0):
                 # noinspection PyUnresolvedReferences
@@ -125,22 +135,25 @@ class Model(model.Model, metaclass=ABCMeta):
                 # noinspection PyUnresolvedReferences
                 _, predicted = torch.max(output.data, 1)
                 correct += predicted.eq(target).sum().item()
+                samples += len(input_)
+                batches += 1
                 self.optimizer_step(loss)
                 batch_finished_at = time.time()
                 batch_time = batch_finished_at - batch_started_at
                 batch_started_at = batch_finished_at
+                total_it = len(loader.dataset) if getattr(loader.dataset, 'is_complete', True) else None
                 logger.info(
-                    'Train Epoch: {epoch} [{it}/{total_it} ({progress:.0f}%)]\tLoss: {loss:.4f}\tTime: {time:.2f} secs'.format(
+                    'Train Epoch: {epoch} [{it}/{total_it} ({progress})]\tLoss: {loss:.4f}\tTime: {time:.2f} secs'.format(
                         epoch=epoch,
-                        it=(batch_idx + 1) * len(input_),
-                        total_it=len(loader.dataset),
-                        progress=100. * batch_idx / len(loader),
-                        loss=epoch_loss / (batch_idx + 1),
+                        it=samples,
+                        total_it=total_it or '?',
+                        progress='{:.0f}%'.format(100. * samples / total_it) if total_it else '?',
+                        loss=epoch_loss / batches,
                         time=batch_time
                     ))
             epoch_time = time.time() - epoch_started_at
-            epoch_loss = epoch_loss / len(loader)
-            epoch_acc = correct / len(loader.dataset)
+            epoch_loss = epoch_loss / batches
+            epoch_acc = correct / samples
             logger.info("Epoch #{}: Loss: {:.4f} Acc: {:.2f} Time: {:.2f} secs".format(
                 nb_epoch, epoch_loss, 100 * epoch_acc, epoch_time))
             train_history['loss'].append(epoch_loss)
@@ -157,7 +170,7 @@ class Model(model.Model, metaclass=ABCMeta):
         # dataset = self.data_preprocessing(x_path_list, y_path_list, self.transforms_eval)
         # loader = DataLoader(dataset, batch_size=128, shuffle=False, num_workers=0)
 
-        loader = self.data_preprocessing(chunk_dirs=chunk_dirs, batch_size=128, transform=self.transform_eval)
+        loader = self.eval_data_preprocessing(chunk_dirs=chunk_dirs, batch_size=128, transform=self.transform_eval)
 
         with torch.no_grad():
             for input_, target in loader:
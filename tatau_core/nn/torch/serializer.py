@@ -16,6 +16,17 @@ class WeightsSerializer(serializer.WeightsSerializer):
         from torch import save as torch_save
         torch_save(weights, path)
 
+    @classmethod
+    def write(cls, weights: dict, f):
+        """
+        Write model state to binary file object
+        :param weights: state
+        :param f: file object
+        :return: None
+        """
+        from torch import save as torch_save
+        torch_save(weights, f)
+
     @classmethod
     def load(cls, path: str):
         """
@@ -1,10 +1,14 @@
-from .model import ModelSummarizer
+from tatau_core.nn.tatau.summarizer import RunningMean
+from .model import StreamingModelSummarizer
 import numpy as np
 
 
-class Mean(ModelSummarizer):
+class Mean(StreamingModelSummarizer):
     """
-    Median State Summarizer
+    Mean State Summarizer, every state is added to running sums when it is loaded, memory does not depend on count of
+    states
     """
-    def __init__(self):
-        super(Mean, self).__init__(np_sum_fn=np.mean)
\ No newline at end of file
+    np_sum_fn = staticmethod(np.mean)
+
+    def create_aggregator(self):
+        return RunningMean()
@@ -1,10 +1,13 @@
-from .model import ModelSummarizer
+from tatau_core.nn.tatau.summarizer import OutOfCoreMedian
+from .model import StreamingModelSummarizer
 import numpy as np
 
 
-class Median(ModelSummarizer):
+class Median(StreamingModelSummarizer):
     """
-    Median State Summarizer
+    Median State Summarizer, states are kept in scratch file, so states of all workers do not have to fit into memory
     """
-    def __init__(self):
-        super(Median, self).__init__(np_sum_fn=np.median)
+    np_sum_fn = staticmethod(np.median)
+
+    def create_aggregator(self):
+        return OutOfCoreMedian()
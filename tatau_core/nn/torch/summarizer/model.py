@@ -1,4 +1,10 @@
-from tatau_core.nn.tatau.summarizer import Summarizer
+from abc import abstractmethod
+from collections import OrderedDict, deque
+
+import numpy as np
+import torch
+
+from tatau_core.nn.tatau.summarizer import Summarizer, StreamingSummarizer, Aggregator
 from .opt import OptimizerSummarizer
 from .weights import WeightsSummarizer
 
@@ -28,3 +34,77 @@ class ModelSummarizer(Summarizer):
         }
         return new_state
 
+
+
+class StreamingModelSummarizer(StreamingSummarizer):
+    """
+    State Summarizer which adds tensors of every state to aggregators when state is loaded, states are not kept
+    """
+    # reduction of optimizer param groups, values of param groups are small and are kept
+    np_sum_fn = None
+
+    @abstractmethod
+    def create_aggregator(self) -> Aggregator:
+        pass
+
+    def reset(self):
+        for aggregator in [getattr(self, '_weights', None), getattr(self, '_optimizer_state', None)]:
+            if aggregator is not None:
+                aggregator.close()
+
+        self._count = 0
+        self._weights = self.create_aggregator()
+        self._optimizer_state = self.create_aggregator()
+        self._state_nums = OrderedDict()
+        self._param_groups = OrderedDict()
+
+    def fold(self, weights):
+        self._weights.add_all([
+            (key, value.detach().cpu().numpy()) for key, value in weights['weights'].items() if torch.is_tensor(value)
+        ])
+
+        optimizer = weights['optimizer']
+        assert len(optimizer['param_groups']) == 1
+        param_groups = optimizer['param_groups'][0]
+
+        optimizer_state = []
+        for num, param_key in enumerate(param_groups['params']):
+            self._state_nums[num] = True
+            for name, value in optimizer['state'][param_key].items():
+                optimizer_state.append(((num, name), value.detach().cpu().numpy()))
+        self._optimizer_state.add_all(optimizer_state)
+
+        for name, value in param_groups.items():
+            if name == 'params':
+                continue
+            if name not in self._param_groups:
+                self._param_groups[name] = deque()
+            self._param_groups[name].append(value)
+
+        self._count += 1
+
+    def result(self):
+        if not self._count:
+            raise RuntimeError("No updates")
+
+        # tensors are reduced in parallel, order of keys is kept
+        keys = list(self._weights.keys())
+        weights = OrderedDict(zip(keys, [torch.tensor(x) for x in self._weights.results(keys)]))
+
+        states = OrderedDict((num, dict()) for num in self._state_nums)
+        keys = list(self._optimizer_state.keys())
+        for (num, name), value in zip(keys, self._optimizer_state.results(keys)):
+            states[num][name] = torch.tensor(value)
+
+        params = dict()
+        for name, values in self._param_groups.items():
+            params[name] = self.np_sum_fn(np.asarray(values), axis=0)
+        params['params'] = list(states.keys())
+
+        return {
+            'optimizer': dict(
+                state=states,
+                param_groups=[params]
+            ),
+            'weights': weights
+        }
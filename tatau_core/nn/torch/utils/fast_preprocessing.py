@@ -1,25 +1,76 @@
+import multiprocessing
+import queue
+import threading
+
 import torch
 import numpy as np
 
 
-def fast_collate(batch):
-    images = [img[0] for img in batch]
-    # noinspection PyCallingNonCallable,PyUnresolvedReferences
-    targets = torch.tensor([target[1] for target in batch], dtype=torch.int64)
-    w = images[0].size[0]
-    h = images[0].size[1]
-    # noinspection PyUnresolvedReferences
-    tensor = torch.zeros((len(images), 3, h, w), dtype=torch.uint8)
-    for i, img in enumerate(images):
-        nump_array = np.asarray(img, dtype=np.uint8)
-        if nump_array.ndim < 3:
-            nump_array = np.expand_dims(nump_array, axis=-1)
-        nump_array = np.rollaxis(nump_array, 2)
+class FastCollate:
+    """
+    Collate of images (PIL or HWC numpy arrays) to uint8 NCHW batch tensor.
+
+    Images are copied directly to channel-first view of batch buffer without zeroing and extra passes. In main process
+    buffers can be pinned and recycled from ring of "ring_size" buffers. Recycling is off by default: ring must be
+    larger than count of batches which are used at the same time (prefetched or kept by caller) and must not be shared
+    between loaders, so FastCollate with ring is created per loader. In DataLoader worker process batch is allocated
+    in shared memory, so it is passed to main process without copy, buffers of workers are not recycled because they
+    are still used by main process.
+    """
+
+    def __init__(self, ring_size=0, pin_memory=False):
+        self.ring_size = ring_size
+        self.pin_memory = pin_memory
+        self._ring = []
+        self._ring_index = 0
 
+    @staticmethod
+    def _in_worker():
+        return multiprocessing.current_process().name != 'MainProcess'
+
+    def _allocate(self, shape, in_worker):
         # noinspection PyUnresolvedReferences
-        tensor[i] += torch.from_numpy(nump_array)
+        buffer = torch.empty(shape, dtype=torch.uint8)
+        if in_worker:
+            return buffer.share_memory_()
+        if self.pin_memory and torch.cuda.is_available():
+            return buffer.pin_memory()
+        return buffer
+
+    def _get_buffer(self, shape):
+        in_worker = self._in_worker()
+        if in_worker or self.ring_size <= 0:
+            return self._allocate(shape, in_worker)
+
+        if len(self._ring) < self.ring_size:
+            self._ring.append(self._allocate(shape, in_worker))
+            return self._ring[-1]
+
+        self._ring_index = (self._ring_index + 1) % self.ring_size
+        if tuple(self._ring[self._ring_index].shape) != tuple(shape):
+            self._ring[self._ring_index] = self._allocate(shape, in_worker)
+        return self._ring[self._ring_index]
+
+    def __call__(self, batch):
+        arrays = [np.asarray(item[0], dtype=np.uint8) for item in batch]
+        # noinspection PyCallingNonCallable
+        targets = torch.tensor([item[1] for item in batch], dtype=torch.int64)
+
+        h, w = arrays[0].shape[:2]
+        tensor = self._get_buffer((len(arrays), 3, h, w))
+        # channel last view of channel first buffer
+        out = tensor.numpy().transpose(0, 2, 3, 1)
+        for i, array in enumerate(arrays):
+            if array.ndim < 3:
+                array = array[:, :, None]
+            # gray images are broadcasted to 3 channels
+            np.copyto(out[i], array)
 
-    return tensor, targets
+        return tensor, targets
+
+
+# shared by loaders, so buffers are not recycled
+fast_collate = FastCollate()
 
 
 class DataPrefetcher:
@@ -83,3 +134,83 @@ class DataPrefetcher:
 
     def __len__(self):
         return len(self._loader)
+
+
+class BackgroundPrefetcher:
+    """
+    Device agnostic prefetcher with interface of DataPrefetcher. Background thread reads next "depth" batches from
+    loader, converts input to float (or half) and normalizes it, so data preparation overlaps compute on CPU hosts.
+    """
+
+    _end = object()
+
+    def __init__(self, loader, normalize_mean=None, normalize_std=None, is_fp16=False, depth=2, device='cpu'):
+        self._loader = loader
+        self.dataset = loader.dataset
+        self._is_fp16 = is_fp16
+        self._depth = depth
+        self._device = device
+        self._dtype = torch.float16 if is_fp16 else torch.float32
+        self._mean = None
+        self._std = None
+        if normalize_mean is not None:
+            # noinspection PyCallingNonCallable
+            self._mean = torch.tensor(normalize_mean, dtype=self._dtype, device=device).view(1, 3, 1, 1)
+        if normalize_std is not None:
+            # noinspection PyCallingNonCallable
+            self._std = torch.tensor(normalize_std, dtype=self._dtype, device=device).view(1, 3, 1, 1)
+
+    def _prepare(self, input_, target):
+        input_ = input_.to(self._device).to(self._dtype)
+        if self._mean is not None:
+            input_ = input_.sub_(self._mean)
+        if self._std is not None:
+            input_ = input_.div_(self._std)
+        return input_, target.to(self._device)
+
+    def _produce(self, batches: queue.Queue, stop: threading.Event):
+        def put(item):
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        try:
+            for input_, target in self._loader:
+                if not put(self._prepare(input_, target)):
+                    return
+            put(self._end)
+        except Exception as ex:
+            put(ex)
+
+    def __iter__(self):
+        batches = queue.Queue(maxsize=self._depth)
+        stop = threading.Event()
+        thread = threading.Thread(target=self._produce, args=(batches, stop), daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = batches.get()
+                if item is self._end:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            thread.join()
+
+    def __len__(self):
+        return len(self._loader)
+
+
+def create_prefetcher(loader, normalize_mean=None, normalize_std=None, is_fp16=False):
+    """
+    DataPrefetcher on CUDA, BackgroundPrefetcher on CPU
+    """
+    if torch.cuda.is_available():
+        return DataPrefetcher(loader, normalize_mean=normalize_mean, normalize_std=normalize_std, is_fp16=is_fp16)
+    return BackgroundPrefetcher(loader, normalize_mean=normalize_mean, normalize_std=normalize_std, is_fp16=is_fp16)
@@ -1,15 +1,13 @@
 import hashlib
 import os
-import shutil
-import tempfile
 from logging import getLogger
-from multiprocessing import Process
+from multiprocessing import Process, active_children
 
 from tatau_core import web3
 from tatau_core.db import DB
 from tatau_core.settings import ROOT_DIR
 from tatau_core.utils.encryption import Encryption
-from tatau_core.utils.ipfs import IPFS
+from tatau_core.utils.ipfs import Downloader
 
 logger = getLogger('tatau_core')
 
@@ -33,6 +31,8 @@ class Node:
             self.db.generate_keypair(seed=seed)
 
         self.asset = self._create_info_asset(account_address=account_address)
+        # files which were prefetched in background
+        self._prefetched = set()
 
     def __str__(self):
         return self.asset.__str__()
@@ -76,21 +76,30 @@ class Node:
                 encryption=self.encryption
             )
 
-    def _ipfs_prefetch_async(self, multihash):
+    def _ipfs_prefetch_async(self, storage_name, multihashes):
+        """
+        Download files of task to content store in background process, each list of files is prefetched once
+        """
+        multihashes = tuple(x for x in multihashes if x)
+        if not len(multihashes) or (storage_name, multihashes) in self._prefetched:
+            return
+
+        self._prefetched.add((storage_name, multihashes))
+        # join finished prefetch processes
+        active_children()
         Process(
             target=self._ipfs_prefetch,
-            args=(multihash,)
+            args=(storage_name, multihashes),
+            daemon=True
         ).start()
 
-    def _ipfs_prefetch(self, multihash):
-        ipfs = IPFS()
-        target_dir = tempfile.mkdtemp()
+    def _ipfs_prefetch(self, storage_name, multihashes):
         try:
-            logger.info('Download {}'.format(multihash))
-            ipfs.download(multihash, target_dir)
-            logger.info('End download {}'.format(multihash))
-        finally:
-            shutil.rmtree(target_dir)
+            logger.info('Prefetch {}'.format(multihashes))
+            Downloader(storage_name).prefetch(multihashes)
+            logger.info('End prefetch {}'.format(multihashes))
+        except Exception as ex:
+            logger.info('Prefetch is failed: {}'.format(ex))
 
     def _run_session(self, assignment, session):
         failed = False
@@ -0,0 +1,173 @@
+import bisect
+import fcntl
+import hashlib
+import json
+import os
+import socket
+import time
+from contextlib import contextmanager
+from logging import getLogger
+
+from tatau_core import settings
+
+logger = getLogger('tatau_core')
+
+
+class LeaseManager:
+    """
+    Splits task declarations between producer processes which share one identity.
+
+    Each process is a member of consistent hashing ring, membership is confirmed by heartbeat file. Task declaration
+    is processed only by member which holds the lease of declaration, lease is given only to member which owns
+    declaration in the ring. When member dies its heartbeat and leases expire and declarations move to other
+    members, when new member appears previous owners release leases of declarations which are moved to it.
+
+    State is kept in local files, so all processes must share lease_dir (same host or shared volume). Leases are
+    updated under flock of one lock file which is never removed, so lease file can be removed under the lock.
+    """
+
+    virtual_nodes = 64
+
+    def __init__(self, lease_dir=None, ttl=None, member_id=None):
+        self.lease_dir = lease_dir or settings.PRODUCER_LEASE_DIR
+        self.ttl = ttl or settings.PRODUCER_LEASE_TTL
+        self.member_id = member_id or '{}-{}'.format(socket.gethostname(), os.getpid())
+
+        self._members_dir = os.path.join(self.lease_dir, 'members')
+        self._leases_dir = os.path.join(self.lease_dir, 'leases')
+        self._lock_path = os.path.join(self.lease_dir, 'leases.lock')
+        os.makedirs(self._members_dir, exist_ok=True)
+        os.makedirs(self._leases_dir, exist_ok=True)
+
+        self._ring = []
+        self._ring_members = []
+
+    @staticmethod
+    def _hash(key):
+        return int(hashlib.sha256(key.encode()).hexdigest()[:16], 16)
+
+    @staticmethod
+    def _write_json(path, data):
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _read_json(path):
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def heartbeat(self):
+        """
+        Confirm membership and rebuild ring from alive members, should be called on every pass of processing loop
+        """
+        self._write_json(
+            os.path.join(self._members_dir, self.member_id),
+            {'member_id': self.member_id, 'expires_at': time.time() + self.ttl}
+        )
+
+        members = []
+        now = time.time()
+        for name in os.listdir(self._members_dir):
+            if name.endswith('.tmp'):
+                continue
+
+            data = self._read_json(os.path.join(self._members_dir, name))
+            if data is None:
+                continue
+
+            if data['expires_at'] < now:
+                logger.info('Producer member {} is expired'.format(name))
+                try:
+                    os.remove(os.path.join(self._members_dir, name))
+                except FileNotFoundError:
+                    pass
+                continue
+
+            members.append(data['member_id'])
+
+        members.sort()
+        if members != self._ring_members:
+            logger.info('Producer members: {}'.format(members))
+
+        ring = []
+        for member_id in members:
+            for index in range(self.virtual_nodes):
+                ring.append((self._hash('{}#{}'.format(member_id, index)), member_id))
+        ring.sort()
+
+        self._ring = ring
+        self._ring_members = members
+
+    def get_owner(self, key):
+        if not len(self._ring):
+            return None
+
+        index = bisect.bisect(self._ring, (self._hash(key), ''))
+        if index == len(self._ring):
+            index = 0
+        return self._ring[index][1]
+
+    def _lease_path(self, key):
+        return os.path.join(self._leases_dir, key)
+
+    @contextmanager
+    def _locked(self):
+        with open(self._lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _update_lease(self, key, acquire):
+        with self._locked():
+            lease = self._read_json(self._lease_path(key))
+            is_free = lease is None or lease['expires_at'] < time.time()
+            is_mine = lease is not None and lease['owner'] == self.member_id
+
+            if acquire:
+                if not is_free and not is_mine:
+                    return False
+
+                self._write_json(
+                    self._lease_path(key),
+                    {'owner': self.member_id, 'expires_at': time.time() + self.ttl}
+                )
+                return True
+
+            if is_mine:
+                os.remove(self._lease_path(key))
+            return True
+
+    def acquire(self, key):
+        """
+        Acquire or renew lease of key if key belongs to this member
+        :return: True if this member holds the lease
+        """
+        if self.get_owner(key) != self.member_id:
+            # key is moved to another member
+            self.release(key)
+            return False
+
+        return self._update_lease(key, acquire=True)
+
+    def release(self, key):
+        self._update_lease(key, acquire=False)
+
+    def remove(self, key):
+        """
+        Remove lease file of key which will not be processed anymore, e.g. of finished task declaration
+        """
+        if not os.path.exists(self._lease_path(key)):
+            return
+
+        with self._locked():
+            try:
+                os.remove(self._lease_path(key))
+            except FileNotFoundError:
+                pass
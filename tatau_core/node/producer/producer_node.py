@@ -3,6 +3,7 @@ import time
 from logging import getLogger
 
 from tatau_core import settings
+from tatau_core.contract import poa_wrapper
 from tatau_core.db.db import async_commit, use_async_commits
 from tatau_core.models import ProducerNode, TaskDeclaration, TaskAssignment, VerificationAssignment, \
     EstimationAssignment, TrainData, VerificationData
@@ -10,6 +11,7 @@ from tatau_core.models.estimation import EstimationData, EstimationResult
 from tatau_core.models.task import ListTaskAssignments, ListVerificationAssignments
 from tatau_core.node.node import Node
 from tatau_core.node.producer.estimator import Estimator
+from tatau_core.node.producer.lease import LeaseManager
 from tatau_core.node.producer.whitelist import WhiteList
 from tatau_core.utils.ipfs import Directory
 
@@ -865,10 +867,24 @@ class Producer(Node):
         logger.info('{} is finished tflops: {} estimated: {}'.format(
             task_declaration, task_declaration.tflops, task_declaration.estimated_tflops))
 
+    def _update_progress_snapshot(self, task_declaration: TaskDeclaration):
+        try:
+            task_declaration.save_progress_snapshot()
+        except Exception as ex:
+            # progress snapshot is not critical for train
+            logger.exception(ex)
+
     def _process_task_declaration(self, task_declaration: TaskDeclaration):
         if task_declaration.in_finished_state:
             return
 
+        state = task_declaration.state
+        self._process_task_declaration_state(task_declaration)
+
+        if task_declaration.state != state:
+            self._update_progress_snapshot(task_declaration)
+
+    def _process_task_declaration_state(self, task_declaration: TaskDeclaration):
         if task_declaration.state == TaskDeclaration.State.ESTIMATE_IS_REQUIRED:
             self._process_estimate_is_required(task_declaration)
             return
@@ -911,10 +927,36 @@ class Producer(Node):
             time.sleep(settings.PRODUCER_PROCESS_INTERVAL)
 
     def process_tasks(self):
+        # several producer processes may share one identity, each of them processes own part of task declarations
+        lease_manager = LeaseManager()
         while True:
             try:
+                lease_manager.heartbeat()
+                task_declarations = []
                 for task_declaration in TaskDeclaration.enumerate(db=self.db, encryption=self.encryption):
                     if task_declaration.in_finished_state:
+                        lease_manager.remove(task_declaration.asset_id)
+                        continue
+
+                    if not lease_manager.acquire(task_declaration.asset_id):
+                        continue
+
+                    task_declarations.append(task_declaration)
+
+                # balances of estimated jobs are checked on every pass, read them from contract by one batch
+                try:
+                    poa_wrapper.prefetch_jobs(
+                        [x for x in task_declarations if x.state == TaskDeclaration.State.ESTIMATED],
+                        methods=('getJobBalance', 'doesJobExist')
+                    )
+                except Exception as ex:
+                    logger.info('Failed to prefetch jobs: {}'.format(ex))
+
+                for task_declaration in task_declarations:
+                    # pass can be longer than ttl of lease, lease is renewed before every declaration
+                    lease_manager.heartbeat()
+                    if not lease_manager.acquire(task_declaration.asset_id):
+                        logger.info('Lease of {} is lost'.format(task_declaration))
                         continue
 
                     self._process_task_declaration(task_declaration)
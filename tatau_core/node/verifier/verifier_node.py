@@ -22,6 +22,13 @@ class Verifier(Node):
 
     asset_class = VerifierNode
 
+    def __init__(self, *args, **kwargs):
+        super(Verifier, self).__init__(*args, **kwargs)
+        # transactions of finished jobs, they are waited once per pass of task declarations
+        self._pending_transactions = []
+        # (task declaration, verification assignment, future of distribute), job is finished when distribute is mined
+        self._pending_distributes = []
+
     @use_async_commits
     def _process_task_declaration(self, task_declaration):
         if task_declaration.in_finished_state:
@@ -94,9 +101,14 @@ class Verifier(Node):
                 self._verify(verification_assignment)
                 return
 
+            # pay queued payments of previous iterations when latency threshold is reached
+            poa_wrapper.flush_payouts(verification_assignment.task_declaration, verification_assignment, wait=False)
+
     @use_async_commits
     def _distribute(self, verification_assignment):
         task_declaration = verification_assignment.task_declaration
+        # distribute of last iteration is waited, finish returns rest of balance to producer, so it is sent only
+        # when workers are payed
         poa_wrapper.distribute(task_declaration, verification_assignment)
         if task_declaration.last_iteration:
             poa_wrapper.finish_job(verification_assignment.task_declaration)
@@ -123,16 +135,20 @@ class Verifier(Node):
 
         # task canceled before train
         if len(verification_assignments) == 0:
-            poa_wrapper.finish_job(task_declaration)
+            self._pending_transactions.append(poa_wrapper.finish_job(task_declaration, wait=False))
             return
 
         # TODO: support multiple verification
         assert len(verification_assignments) == 1
         verification_assignment = verification_assignments[0]
 
-        # pay to workers if verification was failed
-        poa_wrapper.distribute(task_declaration, verification_assignment)
-        poa_wrapper.finish_job(task_declaration)
+        # pay to workers if verification was failed, job is finished when distribute is mined
+        future = poa_wrapper.distribute(task_declaration, verification_assignment, wait=False)
+        if future is not None:
+            self._pending_distributes.append((task_declaration, verification_assignment, future))
+            return
+
+        self._pending_transactions.append(poa_wrapper.finish_job(task_declaration, wait=False))
 
     @use_async_commits
     def _dump_error(self, assignment, ex: Exception):
@@ -166,7 +182,9 @@ class Verifier(Node):
 
         task_declaration = verification_assignment.task_declaration
         logger.info('Start of verification for {}'.format(task_declaration))
-        if task_declaration.balance_in_wei < task_declaration.iteration_cost_in_wei:
+        # queued payments are not subtracted from balance of job yet
+        balance_in_wei = task_declaration.balance_in_wei - poa_wrapper.get_unpaid_amount(verification_assignment)
+        if balance_in_wei < task_declaration.iteration_cost_in_wei:
             logger.info('Ignore {}, does not have enough balance.'.format(task_declaration))
             return
 
@@ -200,7 +218,17 @@ class Verifier(Node):
 
     @use_async_commits
     def _process_task_declarations(self):
-        task_declarations = TaskDeclaration.enumerate(created_by_user=False, db=self.db, encryption=self.encryption)
+        task_declarations = TaskDeclaration.list(created_by_user=False, db=self.db, encryption=self.encryption)
+
+        # every pass checks jobs of all finished task declarations, read them from contract by one batch
+        try:
+            poa_wrapper.prefetch_jobs(
+                [x for x in task_declarations if x.in_finished_state],
+                methods=('doesJobExist', 'doesJobFinished')
+            )
+        except Exception as ex:
+            logger.info('Failed to prefetch jobs: {}'.format(ex))
+
         for task_declaration in task_declarations:
             try:
                 self._process_task_declaration(task_declaration)
@@ -214,6 +242,26 @@ class Verifier(Node):
             except Exception as ex:
                 logger.exception(ex)
 
+        # jobs are finished concurrently, wait for all finish transactions which were sent during this pass
+        pending_transactions, self._pending_transactions = self._pending_transactions, []
+        pending_distributes, self._pending_distributes = self._pending_distributes, []
+        for task_declaration, verification_assignment, future in pending_distributes:
+            try:
+                poa_wrapper.wait_for_transactions([future])
+                # payments are recorded when distribute is mined, job is finished when all queued payments are payed
+                if poa_wrapper.flush_payouts(task_declaration, verification_assignment, force=True, wait=False) is None:
+                    pending_transactions.append(poa_wrapper.finish_job(task_declaration, wait=False))
+            except Exception as ex:
+                # job is finished on next pass
+                logger.info('Distribute of {} is failed: {}'.format(task_declaration, ex))
+
+        try:
+            poa_wrapper.wait_for_transactions(pending_transactions)
+        except TimeoutError as ex:
+            logger.info(ex)
+        except Exception as ex:
+            logger.exception(ex)
+
     @use_async_commits
     def _process_verification_assignments(self):
         for verification_assignment in VerificationAssignment.enumerate(db=self.db, encryption=self.encryption):
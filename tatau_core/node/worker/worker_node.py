@@ -77,9 +77,28 @@ class Worker(Node):
             task_assignment.save(recipients=task_assignment.producer.address)
             return
 
+        if task_assignment.state == TaskAssignment.State.ACCEPTED:
+            # model code and dataset are not shared until training is started, initial weights are public
+            self._ipfs_prefetch_async(
+                task_assignment.task_declaration_id, [task_assignment.task_declaration.weights_ipfs])
+            return
+
         if task_assignment.state == TaskAssignment.State.TRAINING:
             if not task_assignment.iteration_is_finished:
+                self._prefetch_train_data(task_assignment)
                 self._train(task_assignment)
+            else:
+                # weights of next iteration are available as soon as producer summarizes them
+                self._ipfs_prefetch_async(
+                    task_assignment.task_declaration_id, [task_assignment.task_declaration.weights_ipfs])
+
+    def _prefetch_train_data(self, task_assignment: TaskAssignment):
+        """
+        Download train chunks in background while eval session is running, train session finds them in content store
+        """
+        train_data = task_assignment.train_data
+        multihashes = [train_data.model_code_ipfs, train_data.weights_ipfs] + list(train_data.train_chunks_ipfs)
+        self._ipfs_prefetch_async(task_assignment.task_declaration_id, multihashes)
 
     @use_async_commits
     def _dump_error(self, assignment, ex: Exception):
@@ -108,11 +127,16 @@ class Worker(Node):
         task_assignment.train_result.current_iteration = task_assignment.train_data.current_iteration
         task_assignment.train_result.save()
 
-        failed, eval_tflops = self._run_eval_session(task_assignment)
+        if settings.WORKER_FUSED_EVAL:
+            # eval is done by train session, model and weights are loaded once
+            failed, eval_tflops = False, 0.0
+        else:
+            failed, eval_tflops = self._run_eval_session(task_assignment)
         if failed:
             return
 
-        failed, train_tflops = self._run_session(task_assignment, session=TrainSession())
+        session = TrainSession(with_eval=settings.WORKER_FUSED_EVAL)
+        failed, train_tflops = self._run_session(task_assignment, session=session)
         if failed:
             return
 
@@ -30,6 +30,10 @@ IPFS_HOST = os.getenv('TATAU_IPFS_HOST', 'ipfs')
 IPFS_PORT = int(os.getenv('TATAU_IPFS_PORT', 5001))
 
 PRODUCER_PROCESS_INTERVAL = int(os.getenv('PRODUCER_PROCESS_INTERVAL', 5))
+PRODUCER_LEASE_DIR = os.getenv('PRODUCER_LEASE_DIR', os.path.join(tempfile.gettempdir(), 'tatau_producer_leases'))
+# lease is renewed before every task declaration, so ttl must be longer than processing of one declaration, which
+# waits for contract transactions up to 120 seconds
+PRODUCER_LEASE_TTL = int(os.getenv('PRODUCER_LEASE_TTL', 300))
 WORKER_PROCESS_INTERVAL = int(os.getenv('WORKER_PROCESS_INTERVAL', 5))
 VERIFIER_PROCESS_INTERVAL = int(os.getenv('VERIFIER_PROCESS_INTERVAL', 5))
 
@@ -60,6 +64,14 @@ IPFS_DEFAULTS = {
 IPFS_GATEWAY_HOST = IPFS_DEFAULTS[NET]['IPFS_GATEWAY_HOST']
 
 CONTRACT_ADDRESS = POA_DEFAULTS[NET]['CONTRACT_ADDRESS']
+# seconds while read job state (balance, existence) is taken from cache
+CONTRACT_READ_CACHE_TTL = float(os.getenv('CONTRACT_READ_CACHE_TTL', 10))
+# seconds between checks of new blocks while there are transactions which are waiting for mining
+CONTRACT_BLOCK_POLL_INTERVAL = float(os.getenv('CONTRACT_BLOCK_POLL_INTERVAL', 0.5))
+# payments of several iterations are paid by one transaction when batch has PAYOUT_BATCH_SIZE payments or when
+# oldest payment waits PAYOUT_BATCH_LATENCY seconds, PAYOUT_BATCH_SIZE=1 pays every iteration immediately
+PAYOUT_BATCH_SIZE = int(os.getenv('PAYOUT_BATCH_SIZE', 10))
+PAYOUT_BATCH_LATENCY = int(os.getenv('PAYOUT_BATCH_LATENCY', 300))
 
 TFLOPS_COST = float(os.getenv('TFLOPS_COST', 0.002036400662))
 
@@ -71,6 +83,12 @@ WHITELIST_JSON_PATH = os.getenv(
 )
 
 DOWNLOAD_POOL_SIZE = int(os.getenv('DOWNLOAD_POOL_SIZE', 16))
+# files from http are downloaded by segments in parallel, connections are bounded for all downloads of process
+DOWNLOAD_SEGMENT_SIZE_MB = int(os.getenv('DOWNLOAD_SEGMENT_SIZE_MB', 16))
+DOWNLOAD_SEGMENT_CONNECTIONS = int(os.getenv('DOWNLOAD_SEGMENT_CONNECTIONS', 8))
+DOWNLOAD_MAX_CONNECTIONS = int(os.getenv('DOWNLOAD_MAX_CONNECTIONS', 32))
+DOWNLOAD_RETRIES = int(os.getenv('DOWNLOAD_RETRIES', 5))
+DOWNLOAD_TIMEOUT = int(os.getenv('DOWNLOAD_TIMEOUT', 60))
 
 WAIT_ESTIMATE_TIMEOUT = int(os.getenv('WAIT_ESTIMATE_TIMEOUT', 600))
 WAIT_TRAIN_TIMEOUT = int(os.getenv('WAIT_TRAIN_TIMEOUT', 1800))
@@ -78,6 +96,45 @@ WAIT_VERIFY_TIMEOUT = int(os.getenv('WAIT_VERIFY_TIMEOUT', 1800))
 
 
 TATAU_STORAGE_BASE_DIR = os.path.join(tempfile.gettempdir(), 'tatau')
+# downloaded files are shared by all tasks and node processes of host, unused files are evicted when size of store
+# exceeds budget
+TATAU_CONTENT_STORE_DIR = os.getenv('TATAU_CONTENT_STORE_DIR', os.path.join(tempfile.gettempdir(), 'tatau_content'))
+TATAU_CONTENT_STORE_BUDGET_MB = int(os.getenv('TATAU_CONTENT_STORE_BUDGET_MB', 20 * 1024))
+
+# chunks of dataset which are uploaded to ipfs are recorded here, so interrupted upload is resumed
+TATAU_DATASET_UPLOAD_DIR = os.getenv(
+    'TATAU_DATASET_UPLOAD_DIR', os.path.join(tempfile.gettempdir(), 'tatau_dataset_upload'))
+DATASET_UPLOAD_POOL_SIZE = int(os.getenv('DATASET_UPLOAD_POOL_SIZE', 4))
+# decoded blocks of compressed packed chunks are cached by every process in memory of this size
+PACKED_CHUNK_CACHE_MB = int(os.getenv('PACKED_CHUNK_CACHE_MB', 256))
+
+PROGRESS_SNAPSHOTS_DIR = os.getenv('PROGRESS_SNAPSHOTS_DIR', os.path.join(tempfile.gettempdir(), 'tatau_progress'))
+
+# num_workers of data loader is calibrated once per model code, dataset and host
+DATA_LOADER_CALIBRATION_PATH = os.getenv(
+    'DATA_LOADER_CALIBRATION_PATH', os.path.join(tempfile.gettempdir(), 'tatau_data_loader_calibration.json'))
+DATA_LOADER_CALIBRATION_BATCHES = int(os.getenv('DATA_LOADER_CALIBRATION_BATCHES', 20))
+DATA_LOADER_CALIBRATION_TIME = float(os.getenv('DATA_LOADER_CALIBRATION_TIME', 3))
+
+# test chunks after eval transform are cached between evaluations
+EVAL_CACHE_DIR = os.getenv('EVAL_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'tatau_eval_cache'))
+EVAL_CACHE_BUDGET_MB = int(os.getenv('EVAL_CACHE_BUDGET_MB', 10 * 1024))
+
+# worker evaluates weights of previous iteration in train session instead of separate eval session
+WORKER_FUSED_EVAL = os.getenv('WORKER_FUSED_EVAL', 'true').lower() == 'true'
+
+# values of sessions are passed by files in memory, if shared memory is available
+SESSION_DIR = os.getenv('SESSION_DIR', '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir())
+
+# median summarizer keeps weights of workers in scratch file and reads them by blocks, block size is shared by threads
+SUMMARIZER_SCRATCH_DIR = os.getenv('SUMMARIZER_SCRATCH_DIR', tempfile.gettempdir())
+SUMMARIZER_BLOCK_SIZE_MB = int(os.getenv('SUMMARIZER_BLOCK_SIZE_MB', 64))
+SUMMARIZER_POOL_SIZE = int(os.getenv('SUMMARIZER_POOL_SIZE', os.cpu_count() or 1))
+
+# warm session workers of node, 0 disables them and each session is started in new process
+SESSION_EXECUTOR_POOL_SIZE = int(os.getenv('SESSION_EXECUTOR_POOL_SIZE', 1))
+SESSION_EXECUTOR_MAX_JOBS = int(os.getenv('SESSION_EXECUTOR_MAX_JOBS', 20))
+SESSION_EXECUTOR_MAX_RSS_MB = int(os.getenv('SESSION_EXECUTOR_MAX_RSS_MB', 4096))
 
 PERFORM_BENCHMARK = False
 
@@ -0,0 +1,194 @@
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from logging import getLogger
+
+from tatau_core import settings
+from tatau_core.utils.misc import get_dir_size
+
+logger = getLogger('tatau_core')
+
+
+class ContentStore:
+    """
+    Host-wide content addressed store of downloaded IPFS objects.
+
+    Objects are stored once per host by multihash and shared by all tasks and all node processes of host. Each task
+    (Downloader storage) holds reference to objects which it uses, objects without references are evicted in LRU order
+    when size of store exceeds budget. Concurrent processes are synchronized by file locks, object is filled in
+    temporary dir and renamed to store, so partially downloaded objects are never visible.
+
+    Layout of root dir:
+        objects/<multihash> - downloaded file or directory
+        meta/<multihash> - size of object, mtime is time of last access
+        refs/<multihash>/<ref> - references of tasks to object
+        locks/<multihash> - lock of object
+    """
+
+    def __init__(self, root_dir=None, budget=None):
+        self.root_dir = root_dir or settings.TATAU_CONTENT_STORE_DIR
+        self.budget = budget if budget is not None else settings.TATAU_CONTENT_STORE_BUDGET_MB * 1024 * 1024
+
+        self._objects_dir = os.path.join(self.root_dir, 'objects')
+        self._meta_dir = os.path.join(self.root_dir, 'meta')
+        self._refs_dir = os.path.join(self.root_dir, 'refs')
+        self._locks_dir = os.path.join(self.root_dir, 'locks')
+        self._tmp_dir = os.path.join(self.root_dir, 'tmp')
+        for path in [self._objects_dir, self._meta_dir, self._refs_dir, self._locks_dir, self._tmp_dir]:
+            os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def make_ref(name):
+        return hashlib.sha1(name.encode()).hexdigest()
+
+    @contextmanager
+    def _lock(self, name, blocking=True):
+        with open(os.path.join(self._locks_dir, name), 'a') as lock_file:
+            flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            try:
+                fcntl.flock(lock_file, flags)
+            except BlockingIOError:
+                yield False
+                return
+
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def object_path(self, multihash):
+        return os.path.join(self._objects_dir, multihash)
+
+    def _meta_path(self, multihash):
+        return os.path.join(self._meta_dir, multihash)
+
+    def _touch(self, multihash):
+        try:
+            os.utime(self._meta_path(multihash))
+        except FileNotFoundError:
+            pass
+
+    def _has_refs(self, multihash):
+        try:
+            return len(os.listdir(os.path.join(self._refs_dir, multihash))) > 0
+        except FileNotFoundError:
+            return False
+
+    def get(self, multihash, ref, fetch):
+        """
+        Get object from store, object is fetched if it is absent
+        :param multihash: multihash of object
+        :param ref: reference of task which uses object
+        :param fetch: function fetch(target_dir) which downloads object to target_dir and returns its path
+        :return: path of object in store
+        """
+        target_path = self.object_path(multihash)
+        with self._lock(multihash):
+            if os.path.exists(target_path):
+                logger.debug('{} is found in content store'.format(multihash))
+            else:
+                tmp_dir = os.path.join(self._tmp_dir, '{}.{}.{}'.format(multihash, os.getpid(), threading.get_ident()))
+                os.makedirs(tmp_dir, exist_ok=True)
+                try:
+                    downloaded_path = fetch(tmp_dir)
+                    if os.path.isdir(downloaded_path):
+                        size = get_dir_size(downloaded_path)
+                    else:
+                        size = os.path.getsize(downloaded_path)
+
+                    # meta is written first, so object is always accounted in size of store
+                    with open(self._meta_path(multihash), 'w') as f:
+                        json.dump({'size': size}, f)
+                    os.rename(downloaded_path, target_path)
+                finally:
+                    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+            refs_dir = os.path.join(self._refs_dir, multihash)
+            os.makedirs(refs_dir, exist_ok=True)
+            open(os.path.join(refs_dir, ref), 'a').close()
+            self._touch(multihash)
+
+        self.evict()
+        return target_path
+
+    def release(self, ref, multihash=None):
+        """
+        Remove reference of task to object, if multihash is None then all references of task are removed
+        """
+        multihashes = [multihash] if multihash is not None else os.listdir(self._refs_dir)
+        for multihash in multihashes:
+            try:
+                os.remove(os.path.join(self._refs_dir, multihash, ref))
+            except FileNotFoundError:
+                pass
+
+    def _read_size(self, multihash):
+        try:
+            with open(self._meta_path(multihash), 'r') as f:
+                return json.load(f)['size']
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _remove(self, multihash):
+        logger.info('Evict {} from content store'.format(multihash))
+        path = self.object_path(multihash)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+        try:
+            os.remove(self._meta_path(multihash))
+        except FileNotFoundError:
+            pass
+
+        try:
+            os.rmdir(os.path.join(self._refs_dir, multihash))
+        except OSError:
+            pass
+
+    def evict(self):
+        """
+        Remove least recently used objects without references while size of store exceeds budget
+        """
+        with self._lock('.evict', blocking=False) as locked:
+            if not locked:
+                # another process is evicting
+                return
+
+            entries = []
+            total_size = 0
+            for multihash in os.listdir(self._meta_dir):
+                size = self._read_size(multihash)
+                try:
+                    accessed_at = os.path.getmtime(self._meta_path(multihash))
+                except FileNotFoundError:
+                    continue
+                entries.append((accessed_at, multihash, size))
+                total_size += size
+
+            if total_size <= self.budget:
+                return
+
+            for accessed_at, multihash, size in sorted(entries):
+                if total_size <= self.budget:
+                    break
+
+                with self._lock(multihash, blocking=False) as locked:
+                    # object is being filled or referenced right now
+                    if not locked or self._has_refs(multihash):
+                        continue
+
+                    self._remove(multihash)
+                    total_size -= size
+
+            if total_size > self.budget:
+                logger.info('Content store uses {:.0f}Mb, budget {:.0f}Mb, all objects are referenced'.format(
+                    total_size / 1024. / 1024., self.budget / 1024. / 1024.))
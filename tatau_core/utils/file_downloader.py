@@ -1,25 +1,227 @@
-
-import urllib.request
+import hashlib
+import json
+import os
+import threading
 from logging import getLogger
 from multiprocessing.pool import ThreadPool
 
+import requests
+from requests.adapters import HTTPAdapter
+
 from tatau_core import settings
 
 logger = getLogger('tatau_core')
 
 
+# bounds count of concurrent connections of all downloads of process
+_connections = threading.BoundedSemaphore(settings.DOWNLOAD_MAX_CONNECTIONS)
+
+
+class SegmentedDownload:
+    """
+    Download of file by concurrent HTTP Range requests.
+
+    File is split into segments, segments are downloaded in parallel and written to "<target_path>.part" by offset.
+    Completed segments are recorded in "<target_path>.part.json", so interrupted download is resumed from completed
+    segments and failed segment is resumed from its last written byte. Server without Range support is downloaded by
+    single stream. Size and optionally sha256 of file are verified before file is moved to target_path.
+    """
+
+    chunk_size = 1024 * 1024
+
+    def __init__(self, url, target_path, sha256=None, segment_size=None, connections=None, retries=None):
+        self.url = url
+        self.target_path = target_path
+        self.sha256 = sha256
+        self.segment_size = segment_size or settings.DOWNLOAD_SEGMENT_SIZE_MB * 1024 * 1024
+        self.connections = connections or settings.DOWNLOAD_SEGMENT_CONNECTIONS
+        self.retries = retries if retries is not None else settings.DOWNLOAD_RETRIES
+
+        self._part_path = target_path + '.part'
+        self._state_path = target_path + '.part.json'
+        self._state_lock = threading.Lock()
+        self._done = set()
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.connections)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+    def _probe(self):
+        """
+        :return: size of file and validator of its version, size is None if server does not support ranges
+        """
+        with _connections:
+            response = self._session.get(
+                self.url, headers={'Range': 'bytes=0-0'}, stream=True, timeout=settings.DOWNLOAD_TIMEOUT)
+            response.close()
+
+        response.raise_for_status()
+        validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+        content_range = response.headers.get('Content-Range')
+        if response.status_code != 206 or content_range is None or content_range.endswith('/*'):
+            return None, validator
+
+        return int(content_range.rsplit('/', 1)[1]), validator
+
+    def _load_state(self, size, validator):
+        if not os.path.exists(self._part_path) or os.path.getsize(self._part_path) != size:
+            return
+
+        try:
+            with open(self._state_path, 'r') as f:
+                state = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+
+        if state['size'] == size and state['validator'] == validator and state['segment_size'] == self.segment_size:
+            self._done = set(state['done'])
+            logger.info('Resume download of {}, {} segments are downloaded'.format(self.url, len(self._done)))
+
+    def _save_state(self, size, validator):
+        tmp_path = self._state_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'size': size,
+                'validator': validator,
+                'segment_size': self.segment_size,
+                'done': sorted(self._done)
+            }, f)
+        os.rename(tmp_path, self._state_path)
+
+    def _download_segment(self, fd, start, end):
+        """
+        Download bytes [start, end] to file by offset, on failure request is resumed from last written byte
+        """
+        position = start
+        for attempt in range(self.retries):
+            try:
+                with _connections:
+                    response = self._session.get(
+                        self.url,
+                        headers={'Range': 'bytes={}-{}'.format(position, end)},
+                        stream=True,
+                        timeout=settings.DOWNLOAD_TIMEOUT
+                    )
+                    try:
+                        response.raise_for_status()
+                        if response.status_code != 206:
+                            raise IOError('Server ignored range request for {}'.format(self.url))
+
+                        for data in response.iter_content(self.chunk_size):
+                            os.pwrite(fd, data, position)
+                            position += len(data)
+                    finally:
+                        response.close()
+
+                if position != end + 1:
+                    raise IOError('Segment {}-{} of {} is incomplete'.format(start, end, self.url))
+                return
+            except Exception as ex:
+                logger.info('Failed to download segment {}-{} of {}, attempt {}: {}'.format(
+                    start, end, self.url, attempt + 1, ex))
+                if attempt == self.retries - 1:
+                    raise
+
+    def _download_segments(self, size, validator):
+        self._load_state(size, validator)
+        if not len(self._done):
+            with open(self._part_path, 'wb') as f:
+                f.truncate(size)
+
+        segments = [x for x in range(0, size, self.segment_size) if x not in self._done]
+        fd = os.open(self._part_path, os.O_WRONLY)
+        try:
+            def download(start):
+                self._download_segment(fd, start, min(start + self.segment_size, size) - 1)
+                with self._state_lock:
+                    self._done.add(start)
+                    self._save_state(size, validator)
+
+            with ThreadPool(min(self.connections, max(len(segments), 1))) as p:
+                p.map(download, segments)
+        finally:
+            os.close(fd)
+
+    def _download_stream(self):
+        for attempt in range(self.retries):
+            try:
+                with _connections:
+                    response = self._session.get(self.url, stream=True, timeout=settings.DOWNLOAD_TIMEOUT)
+                    try:
+                        response.raise_for_status()
+                        with open(self._part_path, 'wb') as f:
+                            for data in response.iter_content(self.chunk_size):
+                                f.write(data)
+                    finally:
+                        response.close()
+                return
+            except Exception as ex:
+                logger.info('Failed to download {}, attempt {}: {}'.format(self.url, attempt + 1, ex))
+                if attempt == self.retries - 1:
+                    raise
+
+    def _verify(self, size):
+        if size is not None and os.path.getsize(self._part_path) != size:
+            raise IOError('Size of {} is {}, expected {}'.format(
+                self.url, os.path.getsize(self._part_path), size))
+
+        if self.sha256 is not None:
+            sha256 = hashlib.sha256()
+            with open(self._part_path, 'rb') as f:
+                for data in iter(lambda: f.read(self.chunk_size), b''):
+                    sha256.update(data)
+
+            if sha256.hexdigest() != self.sha256:
+                # corrupted file can't be resumed
+                self._remove_part()
+                raise IOError('Hash of {} is {}, expected {}'.format(self.url, sha256.hexdigest(), self.sha256))
+
+    def _remove_part(self):
+        for path in [self._part_path, self._state_path]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def run(self):
+        """
+        :return: target path
+        """
+        size, validator = self._probe()
+        if size is None:
+            logger.debug('Range requests are not supported for {}'.format(self.url))
+            self._download_stream()
+        elif size == 0:
+            open(self._part_path, 'wb').close()
+        else:
+            self._download_segments(size, validator)
+
+        self._verify(size)
+        os.rename(self._part_path, self.target_path)
+        self._remove_part()
+        self._session.close()
+        return self.target_path
+
+
 class FileDownloader:
     class Params:
-        def __init__(self, url, target_path):
+        def __init__(self, url, target_path, sha256=None):
             self.url = url
             self.target_path = target_path
+            self.sha256 = sha256
 
     @staticmethod
     def _download(download_params: Params):
         logger.info('Start of downloading {} to {}'.format(download_params.url, download_params.target_path))
         for i in range(3):
             try:
-                urllib.request.urlretrieve(download_params.url, download_params.target_path)
+                # partial file is kept between attempts, so next attempt resumes download
+                SegmentedDownload(
+                    url=download_params.url,
+                    target_path=download_params.target_path,
+                    sha256=download_params.sha256
+                ).run()
                 break
             except Exception as ex:
                 logger.exception(ex)
@@ -31,4 +233,4 @@ class FileDownloader:
     @classmethod
     def download_all(cls, list_download_params, pool_size=settings.DOWNLOAD_POOL_SIZE):
         with ThreadPool(pool_size) as p:
-            return p.map(cls._download, list_download_params)
\ No newline at end of file
+            return p.map(cls._download, list_download_params)
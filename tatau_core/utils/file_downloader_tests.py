@@ -0,0 +1,119 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+
+from tatau_core.utils.file_downloader import SegmentedDownload
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class FileHandler(BaseHTTPRequestHandler):
+    """
+    Serves server.data, Range requests are supported if server.ranges. Response of range which starts at one of
+    server.broken_offsets is cut in the middle.
+    """
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        data = self.server.data
+        header = self.headers.get('Range')
+        with self.server.lock:
+            self.server.requests.append(header)
+
+        if not self.server.ranges or header is None:
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+
+        start, end = header.split('=')[1].split('-')
+        start, end = int(start), min(int(end), len(data) - 1)
+        self.send_response(206)
+        self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, end, len(data)))
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('ETag', '"test"')
+        self.end_headers()
+
+        if start in self.server.broken_offsets:
+            self.wfile.write(data[start:start + (end - start + 1) // 2])
+            self.close_connection = True
+            return
+
+        self.wfile.write(data[start:end + 1])
+
+
+class SegmentedDownloadTest(unittest.TestCase):
+    segment_size = 64 * 1024
+
+    def setUp(self):
+        self.data = os.urandom(10 * self.segment_size + 123)
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FileHandler)
+        self.server.data = self.data
+        self.server.ranges = True
+        self.server.broken_offsets = set()
+        self.server.requests = []
+        self.server.lock = threading.Lock()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.url = 'http://127.0.0.1:{}/file'.format(self.server.server_address[1])
+        self.dir_path = tempfile.mkdtemp()
+        self.target_path = os.path.join(self.dir_path, 'file')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.dir_path)
+
+    def _download(self, retries=2):
+        return SegmentedDownload(
+            url=self.url, target_path=self.target_path, segment_size=self.segment_size, connections=4,
+            retries=retries
+        ).run()
+
+    def _read_target(self):
+        with open(self.target_path, 'rb') as f:
+            return f.read()
+
+    def test_segmented(self):
+        self.assertEqual(self._download(), self.target_path)
+        self.assertEqual(self._read_target(), self.data)
+        # probe and one request per segment
+        self.assertEqual(len(self.server.requests), 1 + 11)
+        self.assertFalse(os.path.exists(self.target_path + '.part'))
+        self.assertFalse(os.path.exists(self.target_path + '.part.json'))
+
+    def test_resume(self):
+        broken_offset = 3 * self.segment_size
+        self.server.broken_offsets = {broken_offset}
+        with self.assertRaises(Exception):
+            self._download(retries=1)
+        self.assertTrue(os.path.exists(self.target_path + '.part'))
+        self.assertFalse(os.path.exists(self.target_path))
+
+        self.server.broken_offsets = set()
+        self.server.requests = []
+        self._download()
+        self.assertEqual(self._read_target(), self.data)
+        # only broken segment is downloaded again
+        self.assertEqual(self.server.requests, [
+            'bytes=0-0', 'bytes={}-{}'.format(broken_offset, broken_offset + self.segment_size - 1)])
+
+    def test_without_ranges(self):
+        self.server.ranges = False
+        self._download()
+        self.assertEqual(self._read_target(), self.data)
+        # probe and single stream
+        self.assertEqual(len(self.server.requests), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
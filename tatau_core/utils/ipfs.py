@@ -1,7 +1,9 @@
+import io
+import json
 import os
 import shutil
 import tempfile
-import urllib.request
+import threading
 from logging import getLogger
 from multiprocessing.pool import ThreadPool
 
@@ -9,6 +11,8 @@ import ipfsapi
 
 from tatau_core import settings
 from tatau_core.settings import IPFS_GATEWAY_HOST
+from tatau_core.utils.content_store import ContentStore
+from tatau_core.utils.file_downloader import SegmentedDownload
 from tatau_core.utils.signleton import singleton
 from tatau_core.utils.misc import get_dir_size
 
@@ -68,6 +72,18 @@ class Directory(File):
         return dirs, files
 
 
+class _StreamReader:
+    """
+    File object without name, add API takes name of file from it
+    """
+
+    def __init__(self, f):
+        self._f = f
+
+    def read(self, size=-1):
+        return self._f.read(size)
+
+
 @singleton
 class IPFS:
     def __init__(self, host=settings.IPFS_HOST, port=settings.IPFS_PORT):
@@ -87,9 +103,8 @@ class IPFS:
         target_path = os.path.join(target_dir, multihash)
         if not os.path.exists(target_path):
             logger.warning('IPFS download failed, try using gateway')
-            result = urllib.request.urlretrieve(
-                url='http://{}/ipfs/{}'.format(IPFS_GATEWAY_HOST, multihash), filename=target_path)
-            logger.debug('URL Retrieve: {}'.format(result))
+            SegmentedDownload(
+                url='http://{}/ipfs/{}'.format(IPFS_GATEWAY_HOST, multihash), target_path=target_path).run()
 
         if os.path.isfile(target_path):
             logger.debug(
@@ -119,6 +134,39 @@ class IPFS:
         logger.info('Upload complete: {}'.format(file_path))
         return result
 
+    def add_stream(self, write):
+        """
+        Upload data without temporary file, data which is written by write(f) to binary file object is streamed to
+        add API by pipe
+        :param write: function write(f)
+        :return: File
+        """
+        read_fd, write_fd = os.pipe()
+        errors = []
+
+        def writer():
+            try:
+                with os.fdopen(write_fd, 'wb') as f:
+                    write(f)
+            except Exception as ex:
+                errors.append(ex)
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:
+            with os.fdopen(read_fd, 'rb') as f:
+                data = self.api.add(_StreamReader(f))
+        finally:
+            thread.join()
+
+        if len(errors):
+            # uploaded data is incomplete
+            raise errors[0]
+
+        result = File(ipfs_data=data)
+        logger.info('Upload of stream complete: {}'.format(result.multihash))
+        return result
+
     def add_dir(self, dir_path, recursive=False):
         logger.debug('Uploading directory {}'.format(dir_path))
         if not os.path.isdir(dir_path):
@@ -131,6 +179,25 @@ class IPFS:
 
         raise Exception('WTF? Where is my dir?')
 
+    def make_dir(self, links: dict):
+        """
+        Create directory from already uploaded objects by one object put, directory is pinned
+        :param links: name -> multihash of file or directory
+        :return: Directory
+        """
+        names = sorted(links.keys())
+        with ThreadPool(settings.DOWNLOAD_POOL_SIZE) as p:
+            sizes = p.map(lambda name: self.api.object_stat(links[name])['CumulativeSize'], names)
+
+        node = {
+            # unixfs data of directory
+            'Data': '\u0008\u0001',
+            'Links': [{'Name': name, 'Hash': links[name], 'Size': size} for name, size in zip(names, sizes)]
+        }
+        multihash = self.api.object_put(io.BytesIO(json.dumps(node).encode()))['Hash']
+        self.api.pin_add(multihash)
+        return Directory(multihash=multihash)
+
     def start_listen_messages(self, topic, callback_function):
         with self.api.pubsub_sub(topic=topic) as channel:
             # TODO: move to another thread and add stop condition
@@ -165,6 +232,9 @@ class IPFS:
 
 
 class Downloader:
+    """
+    Downloads files of task, storage dir of task contains only symlinks to files in host-wide ContentStore
+    """
 
     def __init__(self, storage_name, base_dir=None, pool_size=None):
         self.base_dir = base_dir or settings.TATAU_STORAGE_BASE_DIR
@@ -179,6 +249,8 @@ class Downloader:
         except FileExistsError:
             pass
         self.pool_size = pool_size or settings.DOWNLOAD_POOL_SIZE
+        self._content_store = ContentStore()
+        self._ref = ContentStore.make_ref(self.storage_dir_path)
         self._ipfs_instance = None
         self._download_data = {}
 
@@ -190,15 +262,17 @@ class Downloader:
         self._ipfs_instance = IPFS()
         return self._ipfs_instance
 
+    def _fetch_to_store(self, multihash):
+        def fetch(target_dir):
+            path = self._ipfs.download(multihash, target_dir)
+            self._ipfs.remove_from_storage(multihash)
+            return path
+
+        return self._content_store.get(multihash, ref=self._ref, fetch=fetch)
+
     def _download(self, multihash: str, file_names: list):
         logger.debug('Start download {}'.format(multihash))
-        target_path = os.path.join(self.storage_dir_path, multihash)
-
-        if os.path.exists(target_path):
-            logger.debug('Already exist: {}'.format(target_path))
-        else:
-            self._ipfs.download(multihash, self.storage_dir_path)
-            self._ipfs.remove_from_storage(multihash)
+        target_path = self._fetch_to_store(multihash)
 
         for file_name in file_names:
             link_path = self.resolve_path(file_name)
@@ -213,6 +287,7 @@ class Downloader:
 
     def _download_wrapper(self, kwargs: dict):
         self._download(**kwargs)
+        return kwargs['file_names']
 
     def add_to_download_list(self, multihash, file_name):
         try:
@@ -220,16 +295,37 @@ class Downloader:
         except KeyError:
             self._download_data[multihash] = [file_name]
 
+    def _get_download_list(self):
+        return [
+            {
+                'multihash': key,
+                'file_names': value
+            } for key, value in self._download_data.items()
+        ]
+
     def download_all(self):
         with ThreadPool(self.pool_size) as p:
-            return p.map(self._download_wrapper, [
-                {
-                    'multihash': key,
-                    'file_names': value
-                } for key, value in self._download_data.items()
-            ])
+            return p.map(self._download_wrapper, self._get_download_list())
+
+    def download_iter(self):
+        """
+        Download files in parallel, downloads are started in order of adding to download list
+        :return: generator of file names lists, list is yielded when its file is downloaded (in order of completion)
+        """
+        with ThreadPool(self.pool_size) as p:
+            for file_names in p.imap_unordered(self._download_wrapper, self._get_download_list()):
+                yield file_names
+
+    def prefetch(self, multihashes):
+        """
+        Download files to content store without linking them to storage, files are referenced by storage, so they
+        are kept until storage is removed. Downloads are started in order of multihashes.
+        """
+        with ThreadPool(self.pool_size) as p:
+            return p.map(self._fetch_to_store, multihashes)
 
     def remove_storage(self):
+        self._content_store.release(self._ref)
         try:
             shutil.rmtree(self.storage_dir_path)
         except FileNotFoundError:
@@ -238,13 +334,24 @@ class Downloader:
     def resolve_path(self, file_name):
         return os.path.join(self.storage_dir_path, file_name)
 
-    def remove_from_storage(self, multihash):
-        path_in_storage = self.resolve_path(multihash)
-        logger.debug('Removing {}'.format(path_in_storage))
+    def remove_from_storage(self, multihash, file_names=None):
+        """
+        Remove links of file from storage, file stays in content store until it is evicted
+        :param file_names: names of links, by default names of file in download list
+        """
+        if file_names is None:
+            file_names = self._download_data.get(multihash, [])
+        self._download_data.pop(multihash, None)
+        self._content_store.release(self._ref, multihash)
 
-        try:
-            shutil.rmtree(path_in_storage)
-        except NotADirectoryError:
-            os.remove(path_in_storage)
-        except FileNotFoundError:
-            pass
+        for file_name in file_names:
+            path_in_storage = self.resolve_path(file_name)
+            logger.debug('Removing {}'.format(path_in_storage))
+
+            try:
+                if os.path.islink(path_in_storage) or not os.path.isdir(path_in_storage):
+                    os.remove(path_in_storage)
+                else:
+                    shutil.rmtree(path_in_storage)
+            except FileNotFoundError:
+                pass
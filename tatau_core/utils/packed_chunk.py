@@ -0,0 +1,338 @@
+import json
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from logging import getLogger
+
+import numpy as np
+
+from tatau_core import settings
+
+try:
+    import lz4.block as lz4_block
+except ImportError:
+    lz4_block = None
+
+logger = getLogger('tatau_core')
+
+MAGIC = b'TPK1'
+FILE_NAME = 'chunk.tpk'
+
+_header_struct = struct.Struct('<4sQ')
+
+
+def _compress(data, compression):
+    if compression is None:
+        return data
+    if compression == 'zlib':
+        return zlib.compress(data, 1)
+    if compression == 'lz4':
+        if lz4_block is None:
+            raise ImportError('lz4 is not installed')
+        return lz4_block.compress(data, store_size=True)
+    raise ValueError('Unknown compression "{}"'.format(compression))
+
+
+def _decompress(data, compression):
+    if compression is None:
+        return data
+    if compression == 'zlib':
+        return zlib.decompress(data)
+    if compression == 'lz4':
+        if lz4_block is None:
+            raise ImportError('lz4 is not installed')
+        return lz4_block.decompress(data)
+    raise ValueError('Unknown compression "{}"'.format(compression))
+
+
+def default_compression():
+    return 'lz4' if lz4_block is not None else 'zlib'
+
+
+def _resolve_compression(compression):
+    return default_compression() if compression == 'auto' else compression
+
+
+def write_packed_chunk(path, arrays: OrderedDict, compression=None, block_size=256):
+    """
+    Write arrays of same length to one packed file.
+
+    File is "TPK1", header length (uint64), json header and data of arrays. Data of each array is split into blocks of
+    "block_size" samples, every block is compressed independently, header keeps dtype, sample shape and offsets of
+    blocks, so any sample can be read without decompression of whole file.
+    :param path: target file
+    :param arrays: name -> array, first dimension is sample index
+    :param compression: None, "zlib", "lz4" or "auto" - lz4 if it is installed, otherwise zlib
+    :param block_size: samples in block
+    """
+    lengths = set(len(x) for x in arrays.values())
+    if len(lengths) != 1:
+        raise ValueError('Arrays must have same length, got {}'.format(lengths))
+    count = lengths.pop()
+    compression = _resolve_compression(compression)
+
+    header = {
+        'count': count,
+        'compression': compression,
+        'block_size': block_size,
+        'arrays': OrderedDict()
+    }
+
+    blocks = []
+    offset = 0
+    for name, array in arrays.items():
+        array_blocks = []
+        for start in range(0, count, block_size):
+            data = _compress(np.ascontiguousarray(array[start:start + block_size]).tobytes(), compression)
+            array_blocks.append([offset, len(data)])
+            blocks.append(data)
+            offset += len(data)
+
+        header['arrays'][name] = {
+            'dtype': np.dtype(array.dtype).str,
+            'shape': list(array.shape[1:]),
+            'blocks': array_blocks
+        }
+
+    header_data = json.dumps(header).encode()
+    with open(path, 'wb') as f:
+        f.write(_header_struct.pack(MAGIC, len(header_data)))
+        f.write(header_data)
+        for data in blocks:
+            f.write(data)
+
+
+class BlockCache:
+    """
+    LRU cache of decoded blocks of all packed chunks of process, size of cached blocks is bounded by budget in bytes
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.pid = os.getpid()
+        self._blocks = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            block = self._blocks.get(key)
+            if block is not None:
+                self._blocks.move_to_end(key)
+            return block
+
+    def put(self, key, block):
+        if block.nbytes > self.budget:
+            return
+
+        with self._lock:
+            if key in self._blocks:
+                return
+
+            self._blocks[key] = block
+            self._size += block.nbytes
+            while self._size > self.budget:
+                _, evicted = self._blocks.popitem(last=False)
+                self._size -= evicted.nbytes
+
+    @property
+    def size(self):
+        return self._size
+
+
+_block_cache = None
+
+
+def get_block_cache() -> BlockCache:
+    """
+    Block cache of current process, forked DataLoader workers get empty cache
+    """
+    global _block_cache
+    if _block_cache is None or _block_cache.pid != os.getpid():
+        _block_cache = BlockCache(settings.PACKED_CHUNK_CACHE_MB * 1024 * 1024)
+    return _block_cache
+
+
+def is_packed_chunk_dir(chunk_dir):
+    return os.path.isfile(os.path.join(chunk_dir, FILE_NAME))
+
+
+class PackedChunk:
+    """
+    Reader of packed file. File is opened lazily in each process, so reader can be used by DataLoader workers.
+    Decoded blocks are kept in block cache of process which is shared by all chunks.
+    """
+
+    def __init__(self, path, mmap_mode='r'):
+        self.path = path
+        self._mmap_mode = mmap_mode
+
+        with open(path, 'rb') as f:
+            magic, header_length = _header_struct.unpack(f.read(_header_struct.size))
+            if magic != MAGIC:
+                raise ValueError('{} is not packed chunk'.format(path))
+            self.header = json.loads(f.read(header_length).decode())
+
+        self._data_offset = _header_struct.size + header_length
+        self._fd = None
+        self._pid = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.update(_fd=None, _pid=None)
+        return state
+
+    def __len__(self):
+        return self.header['count']
+
+    @property
+    def names(self):
+        return list(self.header['arrays'].keys())
+
+    @property
+    def compression(self):
+        return self.header['compression']
+
+    @property
+    def block_size(self):
+        return self.header['block_size']
+
+    def _read(self, offset, length):
+        if self._pid != os.getpid():
+            self._fd = os.open(self.path, os.O_RDONLY)
+            self._pid = os.getpid()
+        return os.pread(self._fd, length, self._data_offset + offset)
+
+    def _array_info(self, name):
+        info = self.header['arrays'][name]
+        return np.dtype(info['dtype']), tuple(info['shape']), info['blocks']
+
+    def _read_block(self, name, block_index):
+        cache = get_block_cache()
+        key = (self.path, name, block_index)
+        block = cache.get(key)
+        if block is not None:
+            return block
+
+        dtype, shape, blocks = self._array_info(name)
+        offset, length = blocks[block_index]
+        data = _decompress(self._read(offset, length), self.compression)
+        block = np.frombuffer(data, dtype=dtype).reshape((-1,) + shape)
+        cache.put(key, block)
+        return block
+
+    def array(self, name):
+        """
+        :return: array-like which supports indexing by int, slice and array of indices
+        """
+        if self.compression is None:
+            dtype, shape, blocks = self._array_info(name)
+            offset = self._data_offset + (blocks[0][0] if len(blocks) else 0)
+            if self._mmap_mode is None:
+                with open(self.path, 'rb') as f:
+                    f.seek(offset)
+                    return np.fromfile(f, dtype=dtype, count=len(self) * int(np.prod(shape))).reshape(
+                        (len(self),) + shape)
+
+            return np.memmap(self.path, dtype=dtype, mode=self._mmap_mode, offset=offset, shape=(len(self),) + shape)
+
+        return PackedArray(self, name)
+
+    def take(self, name, indices):
+        """
+        Read samples by indices, each block is decompressed once
+        """
+        dtype, shape, _ = self._array_info(name)
+        indices = np.asarray(indices, dtype=np.int64)
+        indices = np.where(indices < 0, indices + len(self), indices)
+        result = np.empty((len(indices),) + shape, dtype=dtype)
+
+        block_indices = indices // self.block_size
+        for block_index in np.unique(block_indices):
+            mask = block_indices == block_index
+            block = self._read_block(name, int(block_index))
+            result[mask] = block[indices[mask] - block_index * self.block_size]
+        return result
+
+
+class PackedArray:
+    """
+    Array of compressed packed chunk, it decompresses only blocks which are accessed
+    """
+
+    def __init__(self, chunk: PackedChunk, name):
+        self._chunk = chunk
+        self._name = name
+        self.dtype, shape, _ = chunk._array_info(name)
+        self.shape = (len(chunk),) + shape
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            if index < 0:
+                index += len(self)
+            if not 0 <= index < len(self):
+                raise IndexError('index {} is out of bounds for size {}'.format(index, len(self)))
+            block_size = self._chunk.block_size
+            return self._chunk._read_block(self._name, int(index) // block_size)[int(index) % block_size]
+
+        if isinstance(index, slice):
+            index = range(*index.indices(len(self)))
+
+        return self._chunk.take(self._name, index)
+
+    def __array__(self, dtype=None):
+        array = self[:]
+        return array if dtype is None else array.astype(dtype)
+
+
+def convert_chunk_dir(chunk_dir, compression='auto', block_size=256, remove_source=True):
+    """
+    Convert chunk dir with x.npy and y.npy to packed chunk
+    """
+    x_path = os.path.join(chunk_dir, 'x.npy')
+    y_path = os.path.join(chunk_dir, 'y.npy')
+    arrays = OrderedDict([
+        ('x', np.load(x_path, mmap_mode='r')),
+        ('y', np.load(y_path, mmap_mode='r'))
+    ])
+
+    write_packed_chunk(os.path.join(chunk_dir, FILE_NAME), arrays, compression=compression, block_size=block_size)
+    del arrays
+
+    if remove_source:
+        os.remove(x_path)
+        os.remove(y_path)
+
+
+def convert_dir(root_dir, compression='auto', block_size=256, remove_source=True):
+    """
+    Convert all chunk dirs of dataset dir to packed chunks
+    """
+    for name in sorted(os.listdir(root_dir)):
+        chunk_dir = os.path.join(root_dir, name)
+        if os.path.isfile(os.path.join(chunk_dir, 'x.npy')):
+            logger.info('Convert {}'.format(chunk_dir))
+            convert_chunk_dir(chunk_dir, compression=compression, block_size=block_size, remove_source=remove_source)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Convert chunks of numpy dataset to packed chunks')
+    parser.add_argument('root_dir', help='dir of chunk dirs with x.npy and y.npy')
+    parser.add_argument('--compression', default='auto', choices=['auto', 'zlib', 'lz4', 'none'])
+    parser.add_argument('--block-size', type=int, default=256)
+    parser.add_argument('--keep-source', action='store_true')
+    args = parser.parse_args()
+
+    convert_dir(
+        args.root_dir,
+        compression=None if args.compression == 'none' else args.compression,
+        block_size=args.block_size,
+        remove_source=not args.keep_source
+    )
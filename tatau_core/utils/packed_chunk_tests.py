@@ -0,0 +1,123 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from collections import OrderedDict
+
+import numpy as np
+
+from tatau_core.utils import packed_chunk
+from tatau_core.utils.packed_chunk import PackedChunk, BlockCache, convert_chunk_dir, is_packed_chunk_dir
+
+
+class PackedChunkTest(unittest.TestCase):
+    block_size = 4
+
+    def setUp(self):
+        self.dir_path = tempfile.mkdtemp()
+        random_state = np.random.RandomState(0)
+        self.x = random_state.rand(10, 3, 2).astype(np.float32)
+        self.y = random_state.randint(0, 10, size=10).astype(np.int64)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir_path)
+
+    def _convert(self, x, y, compression, name='chunk'):
+        chunk_dir = os.path.join(self.dir_path, '{}_{}'.format(name, compression))
+        os.mkdir(chunk_dir)
+        np.save(os.path.join(chunk_dir, 'x.npy'), x)
+        np.save(os.path.join(chunk_dir, 'y.npy'), y)
+        convert_chunk_dir(chunk_dir, compression=compression, block_size=self.block_size)
+
+        self.assertTrue(is_packed_chunk_dir(chunk_dir))
+        self.assertEqual(os.listdir(chunk_dir), [packed_chunk.FILE_NAME])
+        return PackedChunk(os.path.join(chunk_dir, packed_chunk.FILE_NAME))
+
+    def _compressions(self):
+        compressions = [None, 'zlib']
+        if packed_chunk.lz4_block is not None:
+            compressions.append('lz4')
+        return compressions
+
+    def test_round_trip(self):
+        for compression in self._compressions():
+            chunk = self._convert(self.x, self.y, compression)
+            self.assertEqual(len(chunk), 10)
+            self.assertEqual(chunk.names, ['x', 'y'])
+            self.assertEqual(chunk.compression, compression)
+
+            x, y = chunk.array('x'), chunk.array('y')
+            self.assertEqual(x.shape, self.x.shape)
+            self.assertEqual(x.dtype, self.x.dtype)
+            np.testing.assert_array_equal(np.asarray(x), self.x)
+            np.testing.assert_array_equal(np.asarray(y), self.y)
+
+    def test_indexing(self):
+        indices = [9, 0, 5, 5, -1, -10, 3]
+        for compression in self._compressions():
+            x = self._convert(self.x, self.y, compression).array('x')
+
+            for index in [0, 3, 4, 9, -1, -10, np.int64(7)]:
+                np.testing.assert_array_equal(x[index], self.x[index])
+
+            for index in [slice(None), slice(2, 7), slice(1, None, 3), slice(-3, None), slice(8, 2, -2), slice(5, 5)]:
+                np.testing.assert_array_equal(x[index], self.x[index])
+
+            np.testing.assert_array_equal(x[indices], self.x[indices])
+            np.testing.assert_array_equal(x[np.array(indices)], self.x[np.array(indices)])
+
+        x = self._convert(self.x, self.y, 'zlib', name='bounds').array('x')
+        for index in [10, -11]:
+            with self.assertRaises(IndexError):
+                x[index]
+
+    def test_empty(self):
+        for compression in self._compressions():
+            chunk = self._convert(self.x[:0], self.y[:0], compression)
+            self.assertEqual(len(chunk), 0)
+            self.assertEqual(np.asarray(chunk.array('x')).shape, (0, 3, 2))
+            self.assertEqual(len(chunk.take('y', [])), 0)
+
+    def test_pickle(self):
+        chunk = self._convert(self.x, self.y, 'zlib')
+        np.testing.assert_array_equal(chunk.take('x', [1, 2]), self.x[[1, 2]])
+
+        chunk = pickle.loads(pickle.dumps(chunk))
+        np.testing.assert_array_equal(chunk.take('x', [8, 1]), self.x[[8, 1]])
+
+    def test_write_lengths(self):
+        with self.assertRaises(ValueError):
+            packed_chunk.write_packed_chunk(
+                os.path.join(self.dir_path, 'invalid'), OrderedDict([('x', self.x), ('y', self.y[:5])]))
+
+
+class BlockCacheTest(unittest.TestCase):
+    def test_budget(self):
+        block = np.zeros(10, dtype=np.int64)
+        cache = BlockCache(budget=3 * block.nbytes)
+        for index in range(5):
+            cache.put(index, block.copy())
+            self.assertLessEqual(cache.size, cache.budget)
+
+        self.assertIsNone(cache.get(0))
+        self.assertIsNone(cache.get(1))
+        self.assertIsNotNone(cache.get(2))
+
+        # recently used block is kept
+        cache.put(5, block.copy())
+        self.assertIsNotNone(cache.get(2))
+        self.assertIsNone(cache.get(3))
+
+    def test_large_block(self):
+        cache = BlockCache(budget=8)
+        cache.put(0, np.zeros(2, dtype=np.int64))
+        self.assertIsNone(cache.get(0))
+        self.assertEqual(cache.size, 0)
+
+    def test_process_cache(self):
+        self.assertIs(packed_chunk.get_block_cache(), packed_chunk.get_block_cache())
+
+
+if __name__ == '__main__':
+    unittest.main()